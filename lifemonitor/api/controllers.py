@@ -19,15 +19,17 @@
 # SOFTWARE.
 
 import logging
-import tempfile
 from typing import Optional
 
 import connexion
-import werkzeug
-from flask import Response, current_app, redirect, render_template, request
+from flask import (Response, current_app, redirect, render_template, request,
+                   send_file)
 
 import lifemonitor.exceptions as lm_exceptions
 from lifemonitor.api import models, serializers
+from lifemonitor.api.pagination import (MAX_PAGE_DEPTH, build_key,
+                                        decode_cursor, paginate,
+                                        paginate_query, workflow_key)
 from lifemonitor.api.services import LifeMonitor
 from lifemonitor.auth import (EventType, authorized, current_registry,
                               current_user)
@@ -54,14 +56,14 @@ def _row_to_dict(row):
     return d
 
 
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def workflow_registries_get():
     registries = lm.get_workflow_registries()
     logger.debug("registries_get. Got %s registries", len(registries))
     return serializers.ListOfWorkflowRegistriesSchema().dump(registries)
 
 
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def workflow_registries_get_by_uuid(registry_uuid):
     registry = lm.get_workflow_registry_by_uuid(registry_uuid)
     logger.debug("registries_get. Got %s registry", registry)
@@ -69,7 +71,7 @@ def workflow_registries_get_by_uuid(registry_uuid):
 
 
 @authorized
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def registry_index(registry_uuid):
     if not current_user:
         return lm_exceptions.report_problem(401, "Unauthorized")
@@ -82,7 +84,7 @@ def registry_index(registry_uuid):
 
 
 @authorized
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def registry_index_workflow(registry_uuid, registry_workflow_identifier):
     if not current_user:
         return lm_exceptions.report_problem(401, "Unauthorized")
@@ -98,7 +100,7 @@ def registry_index_workflow(registry_uuid, registry_workflow_identifier):
 
 
 @authorized
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def workflow_registries_get_current():
     if current_registry:
         registry = current_registry
@@ -107,8 +109,29 @@ def workflow_registries_get_current():
     return lm_exceptions.report_problem(401, "Unauthorized")
 
 
-@cached(timeout=Timeout.REQUEST)
-def workflows_get(status=False, versions=False, subscriptions=False, only_subscriptions=False):
+def __list_of_workflows__(workflows, limit=None, cursor=None, **kwargs):
+    # paginate only when a page size is requested
+    if not limit:
+        return serializers.ListOfWorkflows(**kwargs).dump(workflows)
+    page = paginate(workflows, workflow_key, limit, cursor=cursor)
+    return page.response(serializers.ListOfWorkflows(**kwargs).dump(page.items))
+
+
+def __query_of_workflows__(query, limit=None, cursor=None, **kwargs):
+    # lists from a single source are paginated in SQL
+    if not limit:
+        return serializers.ListOfWorkflows(**kwargs).dump(query.all())
+    page = paginate_query(query, models.Workflow.id, limit, cursor=cursor)
+    return page.response(serializers.ListOfWorkflows(**kwargs).dump(page.items))
+
+
+@cached(timeout=Timeout.REQUEST, conditional=True)
+def workflows_get(status=False, versions=False, subscriptions=False, only_subscriptions=False,
+                  limit=None, cursor=None):
+    if (not current_user or current_user.is_anonymous) and not current_registry:
+        return __query_of_workflows__(lm.get_public_workflows_query(), limit=limit, cursor=cursor,
+                                      workflow_status=status, workflow_versions=versions,
+                                      subscriptionsOf=[current_user] if subscriptions else [])
     workflows = lm.get_public_workflows()
     if current_user and not current_user.is_anonymous:
         workflows.extend(lm.get_user_workflows(current_user,
@@ -117,10 +140,9 @@ def workflows_get(status=False, versions=False, subscriptions=False, only_subscr
     elif current_registry:
         workflows.extend(lm.get_registry_workflows(current_registry))
     logger.debug("workflows_get. Got %s workflows (user: %s)", len(workflows), current_user)
-    return serializers.ListOfWorkflows(workflow_status=status, workflow_versions=versions,
-                                       subscriptionsOf=[current_user] if subscriptions else []).dump(
-        list(dict.fromkeys(workflows))
-    )
+    return __list_of_workflows__(list(dict.fromkeys(workflows)), limit=limit, cursor=cursor,
+                                 workflow_status=status, workflow_versions=versions,
+                                 subscriptionsOf=[current_user] if subscriptions else [])
 
 
 def __get_workflow_version__(wf_uuid, wf_version=None) -> models.WorkflowVersion:
@@ -151,7 +173,7 @@ def __get_workflow_version__(wf_uuid, wf_version=None) -> models.WorkflowVersion
                                       detail=messages.unauthorized_workflow_access.format(wf_uuid))
 
 
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def workflows_get_by_id(wf_uuid, wf_version):
     response = __get_workflow_version__(wf_uuid, wf_version)
     return response if isinstance(response, Response) \
@@ -160,7 +182,7 @@ def workflows_get_by_id(wf_uuid, wf_version):
                                                else None, rocrate_metadata=True).dump(response)
 
 
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def workflows_get_latest_version_by_id(wf_uuid, previous_versions=False, ro_crate=False):
     response = __get_workflow_version__(wf_uuid, None)
     exclude = ['previous_versions'] if not previous_versions else []
@@ -171,7 +193,7 @@ def workflows_get_latest_version_by_id(wf_uuid, previous_versions=False, ro_crat
             subscriptionsOf=[current_user] if not current_user.is_anonymous else None).dump(response)
 
 
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def workflows_get_version_by_id(wf_uuid, wf_version, ro_crate=False):
     response = __get_workflow_version__(wf_uuid, wf_version)
     exclude = ['previous_versions']
@@ -182,21 +204,21 @@ def workflows_get_version_by_id(wf_uuid, wf_version, ro_crate=False):
             subscriptionsOf=[current_user] if not current_user.is_anonymous else None).dump(response)
 
 
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def workflows_get_versions_by_id(wf_uuid):
     response = __get_workflow_version__(wf_uuid, None)
     return response if isinstance(response, Response) \
         else serializers.ListOfWorkflowVersions().dump(response.workflow)
 
 
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def workflows_get_status(wf_uuid, version):
     response = __get_workflow_version__(wf_uuid, version)
     return response if isinstance(response, Response) \
         else serializers.WorkflowStatusSchema().dump(response)
 
 
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def workflows_rocrate_metadata(wf_uuid, wf_version):
     response = __get_workflow_version__(wf_uuid, wf_version)
     if isinstance(response, Response):
@@ -204,31 +226,37 @@ def workflows_rocrate_metadata(wf_uuid, wf_version):
     return response.crate_metadata
 
 
-@cached(timeout=Timeout.WORKFLOW, client_scope=False)
 def workflows_rocrate_download(wf_uuid, wf_version):
     response = __get_workflow_version__(wf_uuid, wf_version)
     if isinstance(response, Response):
         return response
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        local_zip = response.download(tmpdir)
-        logger.debug("ZIP Archive: %s", local_zip)
-        with open(local_zip, "rb") as f:
-            return werkzeug.Response(f.read(), headers={
-                'Content-Type': 'application/zip',
-                'Accept': 'application/json',
-                'Access-Control-Allow-Credentials': 'true',
-                'Access-Control-Allow-Origin': '*',
-                'Content-Disposition': f'attachment; filename=rocrate_{response.workflow.uuid}_v{response.version}.zip'
-            }, direct_passthrough=False)
+    filename = f'rocrate_{response.workflow.uuid}_v{response.version}.zip'
+    descriptor = response.get_archive_descriptor()
+    local_archive = response.get_local_archive()
+    if local_archive:
+        # stream the local archive (supporting conditional and range requests)
+        result = send_file(local_archive, mimetype='application/zip',
+                           as_attachment=True, download_name=filename,
+                           conditional=True, etag=descriptor['digest'])
+    else:
+        # redirect to the archive on the remote storage
+        url = response.get_archive_url(filename=filename)
+        if not url:
+            raise lm_exceptions.DownloadException(detail="RO-Crate unavailable", status=410)
+        logger.debug("Redirecting to the remote archive %r", descriptor['path'])
+        result = redirect(url, code=302)
+    result.headers['Access-Control-Allow-Credentials'] = 'true'
+    result.headers['Access-Control-Allow-Origin'] = '*'
+    return result
 
 
 @authorized
-@cached(timeout=Timeout.REQUEST)
-def registry_workflows_get(status=False, versions=False):
-    workflows = lm.get_registry_workflows(current_registry)
-    logger.debug("workflows_get. Got %s workflows (registry: %s)", len(workflows), current_registry)
-    return serializers.ListOfWorkflows(workflow_status=status, workflow_versions=versions).dump(workflows)
+@cached(timeout=Timeout.REQUEST, conditional=True)
+def registry_workflows_get(status=False, versions=False, limit=None, cursor=None):
+    logger.debug("workflows_get. Getting workflows (registry: %s)", current_registry)
+    return __query_of_workflows__(lm.get_registry_workflows_query(current_registry), limit=limit, cursor=cursor,
+                                  workflow_status=status, workflow_versions=versions)
 
 
 @authorized
@@ -240,7 +268,7 @@ def registry_workflows_post(body):
 
 
 @authorized
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def registry_user_workflows_get(user_id, status=False, versions=False):
     if not current_registry:
         return lm_exceptions.report_problem(401, "Unauthorized", detail=messages.no_registry_found)
@@ -266,17 +294,18 @@ def registry_user_workflows_post(user_id, body):
 
 
 @authorized
-@cached(timeout=Timeout.REQUEST)
-def user_workflows_get(status=False, versions=False, subscriptions=False, only_subscriptions: bool = False):
+@cached(timeout=Timeout.REQUEST, conditional=True)
+def user_workflows_get(status=False, versions=False, subscriptions=False, only_subscriptions: bool = False,
+                       limit=None, cursor=None):
     if not current_user or current_user.is_anonymous:
         return lm_exceptions.report_problem(401, "Unauthorized", detail=messages.no_user_in_session)
     workflows = lm.get_user_workflows(current_user,
                                       include_subscriptions=subscriptions,
                                       only_subscriptions=only_subscriptions)
     logger.debug("user_workflows_get. Got %s workflows (user: %s)", len(workflows), current_user)
-    return serializers.ListOfWorkflows(workflow_status=status,
-                                       workflow_versions=versions,
-                                       subscriptionsOf=[current_user] if subscriptions else None).dump(workflows)
+    return __list_of_workflows__(workflows, limit=limit, cursor=cursor,
+                                 workflow_status=status, workflow_versions=versions,
+                                 subscriptionsOf=[current_user] if subscriptions else None)
 
 
 @authorized
@@ -341,7 +370,7 @@ def user_workflow_unsubscribe(wf_uuid):
 
 
 @authorized
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def user_registry_workflows_get(registry_uuid, status=False, versions=False):
     if not current_user or current_user.is_anonymous:
         return lm_exceptions.report_problem(401, "Unauthorized", detail=messages.no_user_in_session)
@@ -651,12 +680,12 @@ def workflows_delete(wf_uuid):
         raise lm_exceptions.LifeMonitorException(title="Internal Error", detail=str(e))
 
 
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def workflows_get_issue_types():
     return serializers.ListOfWorkflowIssueTypesSchema().dump(models.WorkflowRepositoryIssue.all())
 
 
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def workflows_get_issue_types_as_html(back=None):
     return Response(
         render_template(
@@ -665,7 +694,7 @@ def workflows_get_issue_types_as_html(back=None):
         mimetype="text/html", status=200)
 
 
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def workflows_get_suites(wf_uuid, version='latest', status: bool = False, latest_builds: bool = False):
     workflow_version = __get_workflow_version__(wf_uuid, version)
     logger.debug("GET suites of workflow version: %r", workflow_version)
@@ -708,7 +737,7 @@ def _get_suite_or_problem(suite_uuid):
         return lm_exceptions.report_problem(404, "Not Found", detail=messages.suite_not_found.format(suite_uuid))
 
 
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def suites_get_by_uuid(suite_uuid, status: bool = False, latest_builds: bool = False):
     suite = _get_suite_or_problem(suite_uuid)
     try:
@@ -724,7 +753,7 @@ def suites_get_by_uuid(suite_uuid, status: bool = False, latest_builds: bool = F
                 i.save()
 
 
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def suites_get_status(suite_uuid):
     suite = _get_suite_or_problem(suite_uuid)
     try:
@@ -754,7 +783,7 @@ def __handle_testing_service_error__(e: Exception, instance_uuid: str = None, me
                                         extra_info=extra_info)
 
 
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def suites_get_instances(suite_uuid):
     response = _get_suite_or_problem(suite_uuid)
     return response if isinstance(response, Response) \
@@ -864,7 +893,7 @@ def _get_instances_or_problem(instance_uuid):
                                             detail=messages.instance_not_found.format(instance_uuid))
 
 
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def instances_get_by_id(instance_uuid):
     response = _get_instances_or_problem(instance_uuid)
     return response if isinstance(response, Response) \
@@ -907,8 +936,8 @@ def instances_delete_by_id(instance_uuid):
         raise lm_exceptions.LifeMonitorException(title="Internal Error", detail=str(e))
 
 
-@cached(timeout=Timeout.REQUEST)
-def instances_get_builds(instance_uuid, limit):
+@cached(timeout=Timeout.REQUEST, conditional=True)
+def instances_get_builds(instance_uuid, limit, cursor=None):
     # response = _get_instances_or_problem(instance_uuid)
     # logger.debug("Number of builds to load: %r", limit)
     # try:
@@ -931,11 +960,21 @@ def instances_get_builds(instance_uuid, limit):
     #                                         extra_info=extra_info)
     response = _get_instances_or_problem(instance_uuid)
     logger.info("Number of builds to load: %r", limit)
-    return response if isinstance(response, Response) \
-        else serializers.ListOfTestBuildsSchema().dump(response.get_test_builds(limit=limit))
+    if isinstance(response, Response):
+        return response
+    if not cursor:
+        builds = response.get_test_builds(limit=limit + 1)
+        page = paginate(builds, build_key, limit, reverse=True)
+    else:
+        # builds are listed by the testing service from the newest one:
+        # load the builds already served plus the ones of the next page
+        _, count = decode_cursor(cursor, max_count=MAX_PAGE_DEPTH)
+        builds = response.get_test_builds(limit=count + limit + 1)
+        page = paginate(builds, build_key, limit, cursor=cursor, reverse=True)
+    return page.response(serializers.ListOfTestBuildsSchema().dump(page.items))
 
 
-@cached(timeout=Timeout.REQUEST)
+@cached(timeout=Timeout.REQUEST, conditional=True)
 def instances_builds_get_by_id(instance_uuid, build_id):
     response = _get_instances_or_problem(instance_uuid)
     if isinstance(response, Response):
@@ -27,7 +27,7 @@ from lifemonitor.auth.models import User
 from .rocrate import ROCrate
 
 # 'status' module
-from .status import Status, AggregateTestStatus, WorkflowStatus, SuiteStatus
+from .status import Status, AggregateTestStatus, WorkflowStatus, SuiteStatus, get_build_state_token
 
 # 'registries' package
 from .registries import RegistryWorkflow, WorkflowRegistry, WorkflowRegistryClient, RegistrySettings
@@ -36,7 +36,7 @@ from .registries import RegistryWorkflow, WorkflowRegistry, WorkflowRegistryClie
 from .workflows import Workflow, WorkflowVersion
 
 # 'testsuites' package
-from .testsuites import TestSuite, TestInstance, ManagedTestInstance, BuildStatus, TestBuild
+from .testsuites import TestSuite, TestInstance, ManagedTestInstance, BuildStatus, TestBuild, TestBuildState
 
 # notifications
 from .notifications import WorkflowStatusNotification
@@ -56,6 +56,7 @@ __all__ = [
     "AggregateTestStatus",
     "BuildStatus",
     "db",
+    "get_build_state_token",
     "GithubTestBuild",
     "GithubTestingService",
     "JenkinsTestBuild",
@@ -65,6 +66,7 @@ __all__ = [
     "Status",
     "SuiteStatus",
     "TestBuild",
+    "TestBuildState",
     "TestingService",
     "TestingServiceToken",
     "TestingServiceTokenManager",
@@ -28,17 +28,21 @@ from enum import Enum
 from hashlib import sha1
 from importlib import import_module
 from pathlib import Path
-from typing import List, Optional, Type, Union
+from typing import Dict, List, Optional, Tuple, Type, Union
 
 import networkx as nx
 
 from lifemonitor.api.models import repositories
+from lifemonitor.cache import Timeout, cache
 
 # set module level logger
 logger = logging.getLogger(__name__)
 
 ROOT_ISSUE = 'r'
 
+# prefix of the cached outcomes of the issue checks
+ISSUE_CHECK_RESULTS_PREFIX = "issue-check-results:"
+
 
 class IssueMessage:
 
@@ -77,6 +81,9 @@ class WorkflowRepositoryIssue():
     def __init__(self):
         self._changes = []
         self._messages: List[IssueMessage] = []
+        # set on the issues restored from the check results cache:
+        # their changes are rebuilt by re-running the check only when required
+        self._deferred_changes = False
 
     @property
     def id(self) -> str:
@@ -111,10 +118,15 @@ class WorkflowRepositoryIssue():
         self._changes.remove(file)
 
     def get_changes(self, repo: repositories.WorkflowRepository) -> List[repositories.RepositoryFile]:
+        if self._deferred_changes:
+            self._deferred_changes = False
+            self._changes = []
+            self._messages = []
+            self.check(repo)
         return self._changes
 
     def has_changes(self) -> bool:
-        return bool(self._changes) and len(self._changes) > 0
+        return self._deferred_changes or (bool(self._changes) and len(self._changes) > 0)
 
     def add_message(self, message: IssueMessage):
         self._messages.append(message)
@@ -228,7 +240,118 @@ def get_issue_graph(path: Optional[str] = None) -> nx.DiGraph:
 
 
 def find_issue_types(path: Optional[str] = None) -> List[Type[WorkflowRepositoryIssue]]:
-    return [i for i in get_issue_graph(path).nodes if i != ROOT_ISSUE]
+    graph = get_issue_graph(path) if path else IssueCheckEngine.get_instance().graph
+    return [i for i in graph.nodes if i != ROOT_ISSUE]
+
+
+class IssueCheckEngine():
+    """
+    Run the issue checks on workflow repositories.
+
+    The issue graph is compiled once per process and topologically ordered,
+    so that every issue is checked after the issues it depends on.
+    The outcomes of the checks are cached by repository URL, commit SHA
+    and version of the issue types, so re-checking an unchanged commit costs a cache lookup.
+    """
 
+    __instance__: Optional[IssueCheckEngine] = None
 
-__all__ = ["WorkflowRepositoryIssue"]
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.graph = get_issue_graph(path)
+        self.order: List[Type[WorkflowRepositoryIssue]] = [
+            i for i in nx.lexicographical_topological_sort(
+                self.graph, key=lambda i: i if i == ROOT_ISSUE else i.get_identifier())
+            if i != ROOT_ISSUE]
+        self.types: Dict[str, Type[WorkflowRepositoryIssue]] = {i.get_identifier(): i for i in self.order}
+        self.version = self.__compute_version__(self.order)
+        logger.debug("Issue graph compiled (version: %s): %r", self.version, self.order)
+
+    @classmethod
+    def get_instance(cls) -> IssueCheckEngine:
+        if cls.__instance__ is None:
+            cls.__instance__ = cls()
+        return cls.__instance__
+
+    @staticmethod
+    def __compute_version__(issue_types: List[Type[WorkflowRepositoryIssue]]) -> str:
+        # the version changes whenever an issue type is added, removed or modified
+        h = sha1()
+        for issue_type in sorted(issue_types, key=lambda i: i.get_identifier()):
+            h.update(issue_type.get_identifier().encode())
+            try:
+                h.update(inspect.getsource(issue_type).encode())
+            except (OSError, TypeError):
+                logger.debug("Unable to get the source of the issue type %r", issue_type)
+        return h.hexdigest()
+
+    def _results_key(self, repo: repositories.WorkflowRepository, fail_fast: bool,
+                     include: Optional[List[str]], exclude: Optional[List[str]]) -> Optional[str]:
+        # results are not cached by processes without a cache back-end (e.g., the CLI)
+        if not cache.is_initialized() or not cache.cache_enabled:
+            return None
+        commit_sha = repo.commit_sha
+        if not commit_sha or not repo.remote_url:
+            return None
+        key = f"{repo.remote_url}|{commit_sha}|{self.version}|{fail_fast}|{include}|{exclude}"
+        return f"{ISSUE_CHECK_RESULTS_PREFIX}{sha1(key.encode()).hexdigest()}"
+
+    def _restore(self, results: List[Dict]) -> Optional[Tuple[List[WorkflowRepositoryIssue], List[WorkflowRepositoryIssue]]]:
+        checked, found_issues = [], []
+        for r in results:
+            issue_type = self.types.get(r['issue'])
+            if issue_type is None:
+                return None
+            issue = issue_type()
+            issue._messages = [IssueMessage(IssueMessage.TYPE(t), text) for t, text in r['messages']]
+            issue._deferred_changes = r['changes']
+            checked.append(issue)
+            if r['failed']:
+                found_issues.append(issue)
+        return checked, found_issues
+
+    def check(self, repo: repositories.WorkflowRepository, fail_fast: bool = True,
+              include: Optional[List[str]] = None,
+              exclude: Optional[List[str]] = None) -> Tuple[List[WorkflowRepositoryIssue], List[WorkflowRepositoryIssue]]:
+        key = self._results_key(repo, fail_fast, include, exclude)
+        if key:
+            results = cache.get(key)
+            restored = self._restore(results) if results is not None else None
+            if restored is not None:
+                logger.debug("Issue check results of %r restored from cache", repo)
+                return restored
+
+        checked, found_issues, results = [], [], []
+        passed = {ROOT_ISSUE}
+        errors = False
+        for issue_type in self.order:
+            if not repo._issue_name_included(issue_type.__name__, include, exclude) \
+                    or not any(p in passed for p in self.graph.predecessors(issue_type)):
+                continue
+            issue = issue_type()
+            try:
+                failed = issue.check(repo)
+            except Exception as e:
+                logger.error("Issue %s failed to run.  It raised an exception: %s",
+                             issue_type.__name__, e)
+                errors = True
+                continue  # skip this issue by not marking it as passed (otherwise it shows as "passed")
+            checked.append(issue)
+            results.append({
+                'issue': issue_type.get_identifier(),
+                'failed': bool(failed),
+                'messages': [(m.type.value, m.text) for m in issue.get_messages()],
+                'changes': issue.has_changes()
+            })
+            if not failed:
+                passed.add(issue_type)
+            else:
+                found_issues.append(issue)
+                if fail_fast:
+                    break
+        # the outcomes of checks interrupted by errors are not reusable
+        if key and not errors:
+            cache.set(key, results, timeout=Timeout.WORKFLOW)
+        return checked, found_issues
+
+
+__all__ = ["WorkflowRepositoryIssue", "IssueCheckEngine"]
@@ -401,6 +401,16 @@ class WorkflowRegistry(auth_models.HostingService):
     def get_workflows(self) -> List[models.Workflow]:
         return list({w.workflow_version.workflow for w in self.workflow_versions})
 
+    def get_workflows_query(self):
+        # select the workflow ids on the subclass tables only,
+        # to avoid joining the shared resource table twice
+        versions = models.WorkflowVersion.__table__
+        registry_versions = RegistryWorkflowVersion.__table__
+        workflow_ids = db.select(versions.c.workflow_id)\
+            .join(registry_versions, registry_versions.c.workflow_version_id == versions.c.id)\
+            .where(registry_versions.c.registry_id == self.id)
+        return models.Workflow.query.filter(models.Workflow.id.in_(workflow_ids))
+
     def get_workflow_by_external_id(self, identifier) -> models.Workflow:
         try:
             w = next((w for w in self.workflow_versions if w.identifier == identifier), None)
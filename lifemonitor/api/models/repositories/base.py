@@ -20,8 +20,6 @@
 
 from __future__ import annotations
 
-import filecmp
-import io
 import json
 import logging
 import os
@@ -38,6 +36,7 @@ from lifemonitor.test_metadata import get_roc_suites, get_workflow_authors
 from lifemonitor.utils import get_current_username, to_camel_case
 
 from .files import RepositoryFile, WorkflowFile
+from .manifest import RepositoryManifest
 
 # set module level logger
 logger = logging.getLogger(__name__)
@@ -149,36 +148,16 @@ class WorkflowRepository():
 
         return issue_name not in [to_camel_case(_) for _ in exclude_list]
 
+    @property
+    def commit_sha(self) -> Optional[str]:
+        '''The SHA of the commit of the repository contents; None if they are not bound to a commit'''
+        return None
+
     def check(self, fail_fast: bool = True,
               include=None, exclude=None) -> IssueCheckResult:
-        found_issues = []
-        issue_graph = issues.get_issue_graph()
-
-        checked = set()
-        visited = set()
-        queue = [i for i in issue_graph.neighbors(issues.ROOT_ISSUE)
-                 if self._issue_name_included(i.__name__, include, exclude)]
-        while queue:
-            issue_type = queue.pop()
-            if issue_type not in visited:
-                issue = issue_type()
-                try:
-                    failed = issue.check(self)
-                except Exception as e:
-                    logger.error("Issue %s failed to run.  It raised an exception: %s",
-                                 issue_type.__name__, e)
-                    continue  # skip this issue by not marking it as visited (otherwise it shows as "passed")
-                visited.add(issue_type)
-                checked.add(issue)
-                if not failed:
-                    neighbors = [i for i in issue_graph.neighbors(issue_type)
-                                 if self._issue_name_included(i.__name__, include, exclude)]
-                    queue.extend(neighbors)
-                else:
-                    found_issues.append(issue)
-                    if fail_fast:
-                        break
-        return IssueCheckResult(self, list(checked), found_issues)
+        checked, found_issues = issues.IssueCheckEngine.get_instance().check(
+            self, fail_fast=fail_fast, include=include, exclude=exclude)
+        return IssueCheckResult(self, checked, found_issues)
 
     @classmethod
     def __contains__(cls, files, file) -> bool:
@@ -191,56 +170,19 @@ class WorkflowRepository():
                 return f
         return None
 
-    @classmethod
-    def __file_pointer__(cls, f: RepositoryFile):
-        fp = None
-        if os.path.exists(f.path):
-            fp = open(f.path, 'rb')
-        else:
-            content = f.get_content(binary_mode=True)
-            if content:
-                logger.debug("Reading file content: %r bytes", len(content))
-                fp = io.BytesIO(content)
-            else:
-                logger.debug("Reading file content: %s", "<empty content>")
-                fp = io.BytesIO(b"")
-        return fp
-
-    @classmethod
-    def __compare_files__(cls, f1: RepositoryFile, f2: RepositoryFile):
-        bufsize = filecmp.BUFSIZE
-        with cls.__file_pointer__(f1) as fp1, cls.__file_pointer__(f2) as fp2:
-            while True:
-                b1 = fp1.read(bufsize)
-                b2 = fp2.read(bufsize)
-                if b1 != b2:
-                    return False
-                if not b1:
-                    return True
+    @property
+    def manifest(self) -> RepositoryManifest:
+        return RepositoryManifest(self.files)
 
     @classmethod
     def __compare__(cls, left_files, right_files, exclude: Optional[List[str]] = None):
-        missing_left = [_ for _ in right_files
-                        if not cls.__contains__(left_files, _) and (not exclude or _.name not in exclude)]
-        logger.debug("Missing Left: %r", missing_left)
-        to_check = [(f, cls.__find_file__(right_files, f)) for f in left_files if not exclude or f.name not in exclude]
-        logger.debug("To Check: %r", to_check)
-        missing_right = [_ for _ in left_files
-                         if not cls.__contains__(right_files, _) and (not exclude or _.name not in exclude)]
-        logger.debug("Missing Right: %r", missing_right)
-        differences = []
-        for lf, rf in to_check:
-            logger.warning("Comparing: %r %r", lf, rf)
-            if lf and rf and not cls.__compare_files__(lf, rf):
-                differences.append((lf, rf))
-        logger.debug("Differences: %r", differences)
-        return missing_left, missing_right, differences
+        return RepositoryManifest(left_files).diff(RepositoryManifest(right_files), exclude=exclude)
 
     def compare_to(self, repo: WorkflowRepository, exclude: Optional[List[str]] = None) -> Tuple[List[RepositoryFile],
                                                                                                  List[RepositoryFile],
                                                                                                  List[Tuple[RepositoryFile, RepositoryFile]]]:
         assert repo and isinstance(repo, WorkflowRepository), repo
-        return self.__compare__(self.files, repo.files, exclude=exclude)
+        return self.manifest.diff(repo.manifest, exclude=exclude)
 
     @property
     def config(self) -> Optional[WorkflowRepositoryConfig]:
@@ -0,0 +1,119 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import annotations
+
+import logging
+import re
+from typing import Dict, Iterable, List, Optional
+
+from .files import RepositoryFile, WorkflowFile
+
+# set module level logger
+logger = logging.getLogger(__name__)
+
+
+class FileCatalogue():
+    """
+    Index of the files of a repository snapshot.
+
+    Files are indexed by name, by directory, by extension and by name stem,
+    so that lookups only visit the candidate files instead of scanning the whole list.
+    Lookups return the first matching file in the order of the snapshot.
+    """
+
+    def __init__(self, files: Iterable[RepositoryFile]) -> None:
+        self._files: List[RepositoryFile] = list(files)
+        self._by_name: Dict[str, List[int]] = {}
+        self._by_dir: Dict[str, List[int]] = {}
+        self._by_ext: Dict[str, List[int]] = {}
+        self._by_stem: Dict[str, List[int]] = {}
+        self._searches: Dict[str, List[int]] = {}
+        self._workflow: Optional[WorkflowFile] = None
+        self._workflow_checked = False
+        for i, f in enumerate(self._files):
+            stem, ext = f.splitext()
+            self._by_name.setdefault(f.name, []).append(i)
+            self._by_dir.setdefault(f.dir, []).append(i)
+            self._by_ext.setdefault(ext, []).append(i)
+            self._by_stem.setdefault(stem, []).append(i)
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    @property
+    def files(self) -> List[RepositoryFile]:
+        return list(self._files)
+
+    def by_name(self, name: str) -> List[RepositoryFile]:
+        return [self._files[i] for i in self._by_name.get(name, [])]
+
+    def by_dir(self, dir: str) -> List[RepositoryFile]:
+        return [self._files[i] for i in self._by_dir.get(dir, [])]
+
+    def by_extension(self, extension: str) -> List[RepositoryFile]:
+        return [self._files[i] for i in self._by_ext.get(extension, [])]
+
+    def _search(self, search: str) -> List[int]:
+        # indexes of the files whose name matches the pattern, cached by pattern
+        result = self._searches.get(search)
+        if result is None:
+            matcher = re.compile(search)
+            result = sorted(i for name, indexes in self._by_name.items() if matcher.search(name) for i in indexes)
+            self._searches[search] = result
+        return result
+
+    def find_file_by_name(self, name: str, path: Optional[str] = None) -> Optional[RepositoryFile]:
+        return next((f for f in self.by_name(name)
+                     if not path or f.path == path or f.dir == f"./{path}"), None)
+
+    def find_file_by_pattern(self, search: str, path: Optional[str] = None) -> Optional[RepositoryFile]:
+        if not path:
+            indexes = self._search(search)
+            return self._files[indexes[0]] if indexes else None
+        matcher = re.compile(search)
+        candidates = sorted(self._by_dir.get(path, []) + self._by_dir.get(f"./{path}", []))
+        return next((self._files[i] for i in candidates if matcher.search(self._files[i].name)), None)
+
+    def find_workflow(self) -> Optional[WorkflowFile]:
+        if not self._workflow_checked:
+            first = None
+            # the first file matching any pattern is the workflow:
+            # visit only the candidates selected by the most selective index of each pattern
+            for pattern in WorkflowFile.__get_compiled_patterns__():
+                _, p_name, p_ext, p_dir = pattern
+                if p_ext:
+                    candidates = self._by_ext.get(p_ext, [])
+                elif p_name:
+                    candidates = self._by_stem.get(p_name, [])
+                elif p_dir:
+                    candidates = self._by_dir.get(p_dir, [])
+                else:
+                    candidates = range(len(self._files))
+                for i in candidates:
+                    if first is not None and i >= first:
+                        break
+                    f = self._files[i]
+                    if WorkflowFile.__match_pattern__(pattern, *f.splitext(), f.dir):
+                        first = i
+                        break
+            self._workflow = WorkflowFile.is_workflow(self._files[first]) if first is not None else None
+            self._workflow_checked = True
+        return self._workflow
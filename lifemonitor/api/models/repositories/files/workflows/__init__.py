@@ -36,6 +36,7 @@ logger = logging.getLogger(__name__)
 class WorkflowFile(RepositoryFile):
 
     __workflow_types__: Optional[Dict[str, Type]] = None
+    __compiled_patterns__: Dict[Type, Tuple[Tuple[Type, str, str, str], ...]] = {}
 
     def __init__(self, repository_path: str, name: str, type: Optional[str] = None, dir: str = ".",
                  content=None, raw_file: Optional[RepositoryFile] = None) -> None:
@@ -81,29 +82,39 @@ class WorkflowFile(RepositoryFile):
     def __get_file_patterns__(cls, subtype: Type = None) -> Optional[Tuple[Tuple[str, str, str]]]:
         return getattr(subtype or cls, "FILE_PATTERNS", None)
 
+    @classmethod
+    def __get_compiled_patterns__(cls) -> Tuple[Tuple[Type, str, str, str], ...]:
+        '''
+        Return the file patterns of the workflow types matched by this class,
+        flattened as (subtype, name, extension, dir) tuples in matching order
+        '''
+        compiled = cls.__compiled_patterns__.get(cls)
+        if compiled is None:
+            subtypes = cls.get_types() if cls == WorkflowFile else (cls,)
+            compiled = tuple((subtype, p_name, p_ext, p_dir)
+                             for subtype in subtypes
+                             for p_name, p_ext, p_dir in (cls.__get_file_patterns__(subtype=subtype) or ()))
+            logger.debug("Compiled patterns for workflow type %s: %r", cls.__name__, compiled)
+            cls.__compiled_patterns__[cls] = compiled
+        return compiled
+
+    @staticmethod
+    def __match_pattern__(pattern: Tuple[Type, str, str, str], f_name: str, f_ext: str, f_dir: str) -> bool:
+        _, p_name, p_ext, p_dir = pattern
+        return (not p_name or p_name == f_name) \
+            and (not p_ext or p_ext == f_ext) \
+            and (not p_dir or p_dir == f_dir)
+
     @classmethod
     def is_workflow(cls, file: RepositoryFile) -> Optional[WorkflowFile]:
         if not file:
             return None
-
-        subtypes = (cls,)
-        if cls == WorkflowFile:
-            subtypes = cls.get_types()
         # check file by pattern
         # a pattern is a triple (name, extension, dir)
-        for subtype in subtypes:
-            patterns = cls.__get_file_patterns__(subtype=subtype)
-            logger.debug("Default patterns for workflow type %s: %r", subtype.__name__, patterns)
-            if patterns:
-                f_name, f_ext, f_dir = file.splitext() + (file.dir,)
-                for p_name, p_ext, p_dir in patterns:
-                    if p_name and p_name != f_name:
-                        continue
-                    if p_ext and p_ext != f_ext:
-                        continue
-                    if p_dir and p_dir != f_dir:
-                        continue
-                    return subtype.__from_file__(file)
+        f_name, f_ext, f_dir = file.splitext() + (file.dir,)
+        for pattern in cls.__get_compiled_patterns__():
+            if cls.__match_pattern__(pattern, f_name, f_ext, f_dir):
+                return pattern[0].__from_file__(file)
         return None
 
     @classmethod
@@ -253,6 +253,12 @@ class InstallationGithubWorkflowRepository(GithubRepository, WorkflowRepository)
     def revision(self) -> GithubRepositoryRevision:
         return self.get_revision(self.ref)
 
+    @property
+    def commit_sha(self) -> Optional[str]:
+        if getattr(self, "_local_repo", None):
+            return self._local_repo.commit_sha
+        return self.rev
+
     def get_revision(self, branch_or_ref: str) -> GithubRepositoryRevision:
         rev_data = get_git_repo_revision(self.local_repo.local_path)
         main_ref = next((_ for _ in rev_data["refs"] if branch_or_ref in (_["shorthand"], _["ref"])), None)
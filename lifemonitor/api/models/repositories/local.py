@@ -24,18 +24,22 @@ from __future__ import annotations
 import base64
 import logging
 import os
-import re
 import shutil
 import tempfile
+import time
 import zipfile
 from io import BytesIO
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import git
 
 from lifemonitor.api.models.repositories.base import (
     WorkflowRepository, WorkflowRepositoryMetadata)
+from lifemonitor.api.models.repositories.catalogue import FileCatalogue
+from lifemonitor.api.models.repositories.manifest import (
+    ManifestEntry, RepositoryManifest, archive_digest, file_relpath,
+    get_archive_manifest, set_archive_manifest)
 from lifemonitor.api.models.repositories.files import (RepositoryFile,
                                                        WorkflowFile)
 from lifemonitor.config import BaseConfig
@@ -65,6 +69,9 @@ class LocalWorkflowRepository(WorkflowRepository):
                          license=license,
                          exclude=exclude)
         self._transient_files = {'add': {}, 'remove': {}}
+        self._snapshot: Optional[List[RepositoryFile]] = None
+        self._snapshot_mtime: Optional[int] = None
+        self._catalogue: Optional[FileCatalogue] = None
         # check if the local path is defined
         if not local_path:
             raise ValueError("Local path not set")
@@ -81,27 +88,54 @@ class LocalWorkflowRepository(WorkflowRepository):
     def _file_key_(cls, f: RepositoryFile) -> str:
         return f"{f.dir}/{f.name}"
 
+    def _get_snapshot(self) -> List[RepositoryFile]:
+        # the files on disk are listed once and listed again
+        # only when the repository is written or its root is modified
+        try:
+            mtime = os.stat(self.local_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if self._snapshot is None or mtime != self._snapshot_mtime:
+            snapshot = []
+            for root, _, files in walk(self.local_path, exclude=self.exclude):
+                dirname = root.replace(self.local_path, '.')
+                for name in files:
+                    snapshot.append(RepositoryFile(self.local_path, name, dir=dirname))
+            self._snapshot = snapshot
+            self._snapshot_mtime = mtime
+            self._catalogue = None
+        return self._snapshot
+
+    def invalidate_catalogue(self, snapshot: bool = True) -> None:
+        self._catalogue = None
+        if snapshot:
+            self._snapshot = None
+
+    @property
+    def catalogue(self) -> FileCatalogue:
+        snapshot = self._get_snapshot()
+        if self._catalogue is None:
+            skip = self._transient_files['remove'].keys()
+            files = [f for f in snapshot if self._file_key_(f) not in skip]
+            files.extend([v for k, v in self._transient_files['add'].items() if k not in skip])
+            self._catalogue = FileCatalogue(files)
+        return self._catalogue
+
     @property
     def files(self) -> List[RepositoryFile]:
-        result = []
-        skip = self._transient_files['remove'].keys()
-        for root, _, files in walk(self.local_path, exclude=self.exclude):
-            dirname = root.replace(self.local_path, '.')
-            for name in files:
-                if f"{dirname}/{name}" not in skip:
-                    result.append(RepositoryFile(self.local_path, name, dir=dirname))
-        result.extend([v for k, v in self._transient_files['add'].items() if k not in skip])
-        return result
+        return self.catalogue.files
 
     def add_file(self, file: RepositoryFile) -> None:
         assert isinstance(file, RepositoryFile), file
         self._transient_files['add'][self._file_key_(file)] = file
         self._transient_files['remove'].pop(self._file_key_(file), None)
+        self.invalidate_catalogue(snapshot=False)
 
     def remove_file(self, file: RepositoryFile):
         assert isinstance(file, RepositoryFile), file
         self._transient_files['remove'][self._file_key_(file)] = file
         self._transient_files['add'].pop(self._file_key_(file), None)
+        self.invalidate_catalogue(snapshot=False)
         if file.name == WorkflowRepositoryMetadata.DEFAULT_METADATA_FILENAME:
             self._metadata = None
 
@@ -114,10 +148,17 @@ class LocalWorkflowRepository(WorkflowRepository):
             logger.debug("Removing file: %r", f)
             shutil.copy(f.path, RepositoryFile(self.local_path, f.name, f.type, f.dir).path)
         self.reset()
+        self.invalidate_catalogue()
 
     def reset(self):
         self._transient_files['add'].clear()
         self._transient_files['remove'].clear()
+        self.invalidate_catalogue(snapshot=False)
+
+    def write(self, target_path: str, overwrite: bool = False) -> None:
+        super().write(target_path, overwrite=overwrite)
+        if os.path.abspath(target_path) == os.path.abspath(self.local_path):
+            self.invalidate_catalogue()
 
     def generate_metadata(self,
                           workflow_name: Optional[str] = None,
@@ -151,6 +192,8 @@ class LocalWorkflowRepository(WorkflowRepository):
             self._metadata = WorkflowRepositoryMetadata(self, init=True, exclude=self.exclude,
                                                         local_path=self.local_path)
             self._metadata.write(self.local_path)
+        # the crate generators write on the repository folder
+        self.invalidate_catalogue()
         self.add_file(self._metadata.repository_file)
         return self._metadata
 
@@ -166,20 +209,18 @@ class LocalWorkflowRepository(WorkflowRepository):
             else None
 
     def find_file_by_pattern(self, search: str, path: Optional[str] = None) -> Optional[RepositoryFile]:
-        logger.warning("Searching file: %r %r", search, path)
-        return next((f for f in self.files if re.search(search, f.name) and (not path or f.dir == path or f.dir == f"./{path}")), None)
+        logger.debug("Searching file: %r %r", search, path)
+        return self.catalogue.find_file_by_pattern(search, path=path)
 
     def find_file_by_name(self, name: str, path: Optional[str] = None) -> Optional[RepositoryFile]:
-        logger.warning("Searching file: %r %r", name, path)
-        return next((f for f in self.files if f.name == name and (not path or f.path == path or f.dir == f"./{path}")), None)
+        logger.debug("Searching file: %r %r", name, path)
+        return self.catalogue.find_file_by_name(name, path=path)
 
     def find_workflow(self) -> Optional[WorkflowFile]:
-        for file in self.files:
-            wf = WorkflowFile.is_workflow(file)
-            if wf:
-                logger.debug("Detected workflow: %r", wf)
-                return wf
-        return None
+        wf = self.catalogue.find_workflow()
+        if wf:
+            logger.debug("Detected workflow: %r", wf)
+        return wf
 
 
 class TemporaryLocalWorkflowRepository(LocalWorkflowRepository):
@@ -233,12 +274,47 @@ class ZippedWorkflowRepository(TemporaryLocalWorkflowRepository):
         try:
             extract_zip(archive_path, local_path)
             self.archive_path = archive_path
+            self._extracted_at = time.time_ns()
+            self._archive_digest: Optional[str] = None
             logger.debug("Local path: %r", self.local_path)
         except FileNotFoundError as e:
             if logger.isEnabledFor(logging.DEBUG):
                 logger.exception(e)
             raise LifeMonitorException('Unable to process the Workflow ROCrate locally', detail=str(e), status=404)
 
+    @property
+    def archive_digest(self) -> str:
+        if not self._archive_digest:
+            self._archive_digest = archive_digest(self.archive_path)
+        return self._archive_digest
+
+    def _is_extracted_file(self, file: RepositoryFile, entry: ManifestEntry) -> bool:
+        # files modified after the extraction are not described by the archive manifest
+        return file.repository_path == self.local_path \
+            and entry.mtime is not None and entry.mtime <= self._extracted_at
+
+    @property
+    def manifest(self) -> RepositoryManifest:
+        # the digests of the extracted files are cached by archive digest:
+        # they are computed lazily, when files are compared, and then shared
+        def known_digests(file: RepositoryFile, entry: ManifestEntry) -> Optional[str]:
+            if archive_manifest and self._is_extracted_file(file, entry):
+                size, digest = archive_manifest.get(file_relpath(file), (None, None))
+                return digest if size == entry.size else None
+            return None
+
+        def store_digests(manifest: RepositoryManifest):
+            # extend the cached manifest with the digests computed by the comparison
+            entries = manifest.entries
+            digests = {file_relpath(entries[k].file): (entries[k].size, d)
+                       for k, d in manifest.digests.items() if self._is_extracted_file(entries[k].file, entries[k])}
+            if any(archive_manifest.get(p) != v for p, v in digests.items()):
+                archive_manifest.update(digests)
+                set_archive_manifest(self.archive_digest, archive_manifest)
+
+        archive_manifest = get_archive_manifest(self.archive_digest) or {}
+        return RepositoryManifest(self.files, known_digests=known_digests, on_diff=store_digests)
+
 
 class Base64WorkflowRepository(TemporaryLocalWorkflowRepository):
 
@@ -310,6 +386,42 @@ class LocalGitWorkflowRepository(LocalWorkflowRepository):
     def main_branch(self) -> str:
         return self._git_repo.active_branch.name
 
+    def _get_index_digests(self) -> Tuple[Dict[str, Tuple[int, int, str]], int]:
+        index_path = os.path.join(self._git_repo.git_dir, 'index')
+        try:
+            index_mtime = os.stat(index_path).st_mtime_ns
+        except OSError:
+            return {}, 0
+        return {path: (e.size, e.mtime[0] * 1000000000 + e.mtime[1], e.hexsha)
+                for (path, stage), e in self._git_repo.index.entries.items() if stage == 0}, index_mtime
+
+    @property
+    def manifest(self) -> RepositoryManifest:
+        # reuse the object ids of the git index for the files unchanged since they were staged
+        index, index_mtime = self._get_index_digests()
+
+        def known_digests(file: RepositoryFile, entry: ManifestEntry) -> Optional[str]:
+            if file.repository_path != self.local_path or entry.mtime is None:
+                return None
+            size, mtime, digest = index.get(file_relpath(file), (None, None, None))
+            # files modified in the same instant of the index are not trusted (racy git)
+            if size == entry.size and mtime == entry.mtime and entry.mtime < index_mtime:
+                return digest
+            return None
+
+        return RepositoryManifest(self.files, known_digests=known_digests)
+
+    @property
+    def commit_sha(self) -> Optional[str]:
+        # uncommitted changes are not bound to the HEAD commit
+        if self._transient_files['add'] or self._transient_files['remove'] \
+                or self._git_repo.is_dirty(untracked_files=True):
+            return None
+        try:
+            return self._git_repo.head.commit.hexsha
+        except ValueError:
+            return None
+
     @property
     def remotes(self) -> List[str]:
         return [r.name for r in self._git_repo.remotes]
@@ -0,0 +1,178 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from lifemonitor.cache import Timeout, cache
+
+from .files import RepositoryFile
+
+# set module level logger
+logger = logging.getLogger(__name__)
+
+# prefix of the cached manifests of immutable archives
+ARCHIVE_MANIFEST_PREFIX = "repository-manifest:"
+
+# size of the blocks read to hash files
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def git_blob_digest(content: bytes) -> str:
+    '''Return the id of the git blob object with the given content'''
+    h = hashlib.sha1(f"blob {len(content)}\0".encode())
+    h.update(content)
+    return h.hexdigest()
+
+
+def git_blob_file_digest(path: str, size: Optional[int] = None) -> str:
+    '''Return the id of the git blob object with the content of the file at `path`'''
+    size = os.path.getsize(path) if size is None else size
+    h = hashlib.sha1(f"blob {size}\0".encode())
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_relpath(file: RepositoryFile) -> str:
+    '''Return the path of the file relative to the repository root'''
+    return os.path.normpath(os.path.join(file.dir or '.', file.name))
+
+
+def archive_digest(archive_path: str) -> str:
+    h = hashlib.sha256()
+    with open(archive_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def get_archive_manifest(digest: str) -> Optional[Dict[str, Tuple[int, str]]]:
+    return cache.get(f"{ARCHIVE_MANIFEST_PREFIX}{digest}")
+
+
+def set_archive_manifest(digest: str, manifest: Dict[str, Tuple[int, str]]):
+    cache.set(f"{ARCHIVE_MANIFEST_PREFIX}{digest}", manifest, timeout=Timeout.WORKFLOW)
+
+
+class ManifestEntry(NamedTuple):
+    file: RepositoryFile
+    size: Optional[int]
+    mtime: Optional[int]
+
+
+class RepositoryManifest():
+    """
+    Manifest of the files of a repository: file key -> (size, mtime, content hash).
+
+    Content hashes are git blob ids, so they are comparable with the ids of
+    the git objects of remote repositories and local checkouts.
+    They are computed lazily and only for the files to compare, unless
+    they are available for free, i.e., from the remote repository listing,
+    the index of a git checkout or the cached manifest of an archive.
+    """
+
+    def __init__(self, files: Iterable[RepositoryFile],
+                 known_digests: Optional[Callable[[RepositoryFile, ManifestEntry], Optional[str]]] = None,
+                 on_diff: Optional[Callable[[RepositoryManifest], None]] = None) -> None:
+        self._entries: Dict[Tuple[str, str], ManifestEntry] = {}
+        self._digests: Dict[Tuple[str, str], str] = {}
+        self._known_digests = known_digests
+        self._on_diff = on_diff
+        for f in files:
+            key = (f.dir, f.name)
+            # keep the first file with the same key, as the lookups of the repository files
+            if key not in self._entries:
+                self._entries[key] = self.__make_entry__(f)
+
+    @staticmethod
+    def __make_entry__(file: RepositoryFile) -> ManifestEntry:
+        if file.repository_path:
+            try:
+                stat = os.stat(file.path)
+                return ManifestEntry(file, stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                pass
+        return ManifestEntry(file, None, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return key in self._entries
+
+    @property
+    def entries(self) -> Dict[Tuple[str, str], ManifestEntry]:
+        return self._entries
+
+    @property
+    def digests(self) -> Dict[Tuple[str, str], str]:
+        '''The digests computed (or reused) so far'''
+        return dict(self._digests)
+
+    def digest(self, key: Tuple[str, str]) -> str:
+        digest = self._digests.get(key)
+        if digest is None:
+            entry = self._entries[key]
+            f = entry.file
+            digest = getattr(f, 'sha', None) \
+                or (self._known_digests(f, entry) if self._known_digests else None)
+            if not digest:
+                if entry.mtime is not None:
+                    digest = git_blob_file_digest(f.path, size=entry.size)
+                else:
+                    content = f.get_content(binary_mode=True) or b''
+                    digest = git_blob_digest(content if isinstance(content, bytes) else content.encode())
+            self._digests[key] = digest
+        return digest
+
+    def same_content(self, key: Tuple[str, str], other: RepositoryManifest) -> bool:
+        left, right = self._entries[key], other._entries[key]
+        if left.size is not None and right.size is not None and left.size != right.size:
+            return False
+        return self.digest(key) == other.digest(key)
+
+    def diff(self, other: RepositoryManifest,
+             exclude: Optional[List[str]] = None) -> Tuple[List[RepositoryFile],
+                                                           List[RepositoryFile],
+                                                           List[Tuple[RepositoryFile, RepositoryFile]]]:
+        '''Return the files missing on this manifest, the files missing on the other one and the pairs of changed files'''
+        excluded = set(exclude or [])
+        missing_left = [e.file for k, e in other._entries.items() if k not in self._entries and k[1] not in excluded]
+        missing_right, differences = [], []
+        for k, e in self._entries.items():
+            if k[1] in excluded:
+                continue
+            if k not in other._entries:
+                missing_right.append(e.file)
+            elif not self.same_content(k, other):
+                differences.append((e.file, other._entries[k].file))
+        logger.debug("Missing Left: %r", missing_left)
+        logger.debug("Missing Right: %r", missing_right)
+        logger.debug("Differences: %r", differences)
+        for manifest in (self, other):
+            if manifest._on_diff:
+                manifest._on_diff(manifest)
+        return missing_left, missing_right, differences
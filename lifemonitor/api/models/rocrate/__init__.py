@@ -43,7 +43,9 @@ from lifemonitor.api.models.repositories.github import (
 from lifemonitor.api.models.repositories.local import LocalWorkflowRepository
 from lifemonitor.auth.models import (ExternalServiceAuthorizationHeader,
                                      HostingService, Resource)
+from lifemonitor.cache import Timeout, cache
 from lifemonitor.config import BaseConfig
+from lifemonitor.crates import get_crate_store
 from lifemonitor.models import JSON
 from lifemonitor.storage import RemoteStorage
 from lifemonitor.utils import download_url, get_current_ref
@@ -51,6 +53,9 @@ from lifemonitor.utils import download_url, get_current_ref
 # set module level logger
 logger = logging.getLogger(__name__)
 
+# prefix of the cache keys of the RO-Crate archive descriptors
+ARCHIVE_DESCRIPTOR_PREFIX = "rocrate-archive:"
+
 
 class ROCrate(Resource):
 
@@ -153,23 +158,33 @@ class ROCrate(Resource):
             logger.debug("Initializing repository object bound to the ROCrate %r", self)
             # download the RO-Crate if it is not locally stored
             ref = None
-            if not os.path.exists(self.local_path):
+            store = get_crate_store()
+            if not store.get(self.storage_path):
                 logger.debug(f"{self.local_path} archive of {self} not found locally!!!")
                 logger.debug("Remote storage enabled: %r", self._storage.enabled)
-                logger.debug("File exists on remote storage: %r", self._storage.exists(self._get_storage_path(self.local_path)))
-                # download the workflow ROCrate and store it into the remote storage
-                if not inspect(self).persistent or not self._storage.exists(self._get_storage_path(self.local_path)):
-                    _, ref, _ = self.download_from_source(self.local_path)
-                    logger.debug(f"RO-Crate downloaded from {self.uri} to {self.storage_path}!")
-                    if self._storage.enabled and not self._storage.exists(self._get_storage_path(self.local_path)):
-                        self._storage.put_file_as_job(self.local_path, self._get_storage_path(self.local_path))
-                        logger.debug(f"Scheduled job to store {self.storage_path} into the remote storage!")
-                else:
-                    # download the RO-Crate archive from the remote storage
-                    logger.warning(f"Getting path {self.storage_path} from remote storage!!!")
-                    if self._storage.enabled and not self._storage.exists(self._get_storage_path(self.local_path)):
-                        self._storage.get_file(self._get_storage_path(self.local_path), self.local_path)
-                        logger.warning(f"Getting path {self.storage_path} from remote storage.... DONE!!!")
+                staging_path = store.staging_path(self.storage_path)
+                archive, upload, uploaded = None, False, False
+                try:
+                    if inspect(self).persistent and self._storage.enabled:
+                        # download the RO-Crate archive from the remote storage
+                        logger.debug(f"Getting path {self.storage_path} from remote storage")
+                        if self._storage.get_file(self.storage_path, staging_path):
+                            archive, uploaded = staging_path, True
+                            logger.debug(f"Getting path {self.storage_path} from remote storage.... DONE!!!")
+                    if not archive:
+                        # download the workflow ROCrate and store it into the remote storage
+                        archive, ref, _ = self.download_from_source(staging_path)
+                        logger.debug(f"RO-Crate downloaded from {self.uri} to {self.storage_path}!")
+                        upload = self._storage.enabled
+                    # publish the archive to the local store
+                    store.publish(self.storage_path, archive, uploaded=uploaded)
+                finally:
+                    for path in {staging_path, archive}:
+                        if path and os.path.exists(path):
+                            os.remove(path)
+                if upload:
+                    self._storage.put_file_as_job(self.local_path, self.storage_path)
+                    logger.debug(f"Scheduled job to store {self.storage_path} into the remote storage!")
 
             # instantiate a local ROCrate repository
             if self._get_normalized_github_url_(self.uri):
@@ -288,6 +303,49 @@ class ROCrate(Resource):
         logger.debug("ZIP Archive: %s", local_zip)
         return (tmpdir_path / 'rocrate.zip').as_posix()
 
+    def _get_archive_descriptor_key(self) -> str:
+        return f"{ARCHIVE_DESCRIPTOR_PREFIX}{self.storage_path}"
+
+    def get_archive_descriptor(self) -> Dict:
+        '''
+        Return a descriptor (storage path, digest, size and location) of the RO-Crate archive.
+        Only the descriptor is cached: the archive itself is served from the local
+        filesystem or from the remote storage.
+        '''
+        key = self._get_archive_descriptor_key()
+        descriptor = cache.get(key)
+        if descriptor is None or (not descriptor['remote'] and not get_crate_store().contains(self.storage_path)):
+            descriptor = self.__build_archive_descriptor__()
+            cache.set(key, descriptor, timeout=Timeout.WORKFLOW)
+        logger.debug("Descriptor of the RO-Crate archive %r: %r", self.storage_path, descriptor)
+        return descriptor
+
+    def __build_archive_descriptor__(self) -> Dict:
+        storage_path = self.storage_path
+        store = get_crate_store()
+        if not store.get(storage_path):
+            info = self._storage.get_file_info(storage_path) if self._storage.enabled else None
+            if info:
+                return {'path': storage_path, 'digest': info['etag'], 'size': info['size'], 'remote': True}
+            # load ro-crate if not locally stored
+            metadata = self.crate_metadata
+            # report an error if the workflow is not locally available
+            if (metadata and not self._local_path) or not store.contains(storage_path):
+                raise lm_exceptions.DownloadException(detail="RO-Crate unavailable", status=410)
+        info = store.info(storage_path)
+        return {'path': storage_path, 'digest': store.digest(storage_path),
+                'size': info['size'], 'remote': False}
+
+    def get_local_archive(self) -> Optional[str]:
+        '''Return the path of the local copy of the RO-Crate archive, if any'''
+        return get_crate_store().get(self.storage_path)
+
+    def get_archive_url(self, filename: Optional[str] = None) -> Optional[str]:
+        '''Return a time-limited URL of the RO-Crate archive on the remote storage'''
+        if not self._storage.enabled:
+            return None
+        return self._storage.get_presigned_url(self.storage_path, filename=filename)
+
     @staticmethod
     def _get_normalized_github_url_(uri: str) -> Optional[str]:
         from lifemonitor.integrations.github.utils import normalized_github_url
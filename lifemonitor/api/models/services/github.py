@@ -20,15 +20,18 @@
 
 from __future__ import annotations
 
+import copy
 import logging
 import re
-from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 from urllib.error import URLError
 from urllib.parse import urlparse
 
 import lifemonitor.api.models as models
 import lifemonitor.exceptions as lm_exceptions
-from lifemonitor.cache import Timeout, cached
+from flask import current_app
+from lifemonitor.cache import Timeout, cache, cached, make_cache_key
 from lifemonitor.integrations.github.utils import (CachedPaginatedList,
                                                    GithubApiWrapper)
 
@@ -51,6 +54,7 @@ class GithubTestingService(TestingService):
     _RESOURCE_PATTERN = re.compile(r"/?repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/actions/workflows/(?P<wf>[^/]+)")
 
     _gh_obj = None
+    build_state_supported = True
     __mapper_args__ = {
         'polymorphic_identity': 'github_testing_service'
     }
@@ -62,6 +66,9 @@ class GithubTestingService(TestingService):
         'per_page': 100
     }
 
+    # max number of run attempts fetched in parallel
+    _attempts_batch_size_ = 4
+
     class GithubStatus:
         COMPLETED = 'completed'
         QUEUED = 'queued'
@@ -211,19 +218,34 @@ class GithubTestingService(TestingService):
         headers, data = workflow_run._requester.requestJsonAndCheck("GET", url)
         return headers, data
 
-    @cached(timeout=Timeout.NONE, client_scope=False, transactional_update=True)
-    def __get_gh_workflow_run_attempts__(self,
-                                         workflow_run: github.WorkflowRun.WorkflowRun,
-                                         limit: Optional[int] = None) -> List[github.WorkflowRun.WorkflowRun]:
-        result = []
-        i = workflow_run.raw_data['run_attempt']
-        while i >= 1:
-            headers, data = self.__get_gh_workflow_run_attempt__(workflow_run, i)
-            result.append(WorkflowRun(workflow_run._requester, headers, data, True))
-            i -= 1
-            if limit and len(result) == limit:
-                break
-        return result
+    def __load_gh_workflow_run_attempt__(self, workflow_run: github.WorkflowRun.WorkflowRun,
+                                         attempt: int) -> github.WorkflowRun.WorkflowRun:
+        headers, data = self.__get_gh_workflow_run_attempt__(workflow_run, attempt)
+        return WorkflowRun(workflow_run._requester, headers, data, True)
+
+    def __fetch_gh_workflow_run_attempts__(self, attempts: List[Tuple[github.WorkflowRun.WorkflowRun, int]]) \
+            -> List[github.WorkflowRun.WorkflowRun]:
+        """
+        Fetch the given (run, attempt number) pairs
+        in parallel batches of at most `_attempts_batch_size_` requests
+        """
+        logger.debug("Fetching %d run attempts...", len(attempts))
+        if len(attempts) <= 1 or self._attempts_batch_size_ <= 1:
+            return [self.__load_gh_workflow_run_attempt__(run, attempt) for run, attempt in attempts]
+
+        app = current_app._get_current_object()
+
+        def fetch(item):
+            run, attempt = item
+            with app.app_context():
+                # requesters cannot be shared among threads:
+                # use a copy with its own connection
+                requester = copy.copy(run._requester)
+                requester._Requester__connection = None
+                return self.__load_gh_workflow_run_attempt__(WorkflowRun(requester, {}, run.raw_data, True), attempt)
+
+        with ThreadPoolExecutor(max_workers=self._attempts_batch_size_) as executor:
+            return list(executor.map(fetch, attempts))
 
     @cached(timeout=Timeout.NONE, client_scope=False, transactional_update=True)
     def __get_workflow_runs_iterator(self, workflow: Workflow.Workflow, test_instance: models.TestInstance,
@@ -253,7 +275,8 @@ class GithubTestingService(TestingService):
         # return list(itertools.islice(self.__get_gh_workflow_runs__(workflow, branch=branch, created=created), limit))
         return self.__get_gh_workflow_runs__(workflow, branch=branch, created=created, limit=limit)
 
-    @cached(timeout=Timeout.NONE, client_scope=False, transactional_update=True)
+    @cached(timeout=Timeout.BUILD, client_scope=False, transactional_update=True,
+            stale_while_revalidate=Timeout.BUILD)
     def _list_workflow_runs(self, test_instance: models.TestInstance,
                             status: Optional[str] = None, limit: int = 10) -> List[github.WorkflowRun.WorkflowRun]:
         # get gh workflow
@@ -264,18 +287,26 @@ class GithubTestingService(TestingService):
 
         return list(self.__get_workflow_runs_iterator(workflow, test_instance, limit=limit))
 
-    @cached(timeout=Timeout.NONE, client_scope=False, transactional_update=True)
+    @cached(timeout=Timeout.BUILD, client_scope=False, transactional_update=True,
+            stale_while_revalidate=Timeout.BUILD)
     def _list_workflow_run_attempts(self, test_instance: models.TestInstance,
-                                    status: Optional[str] = None, limit: int = 10) -> List[github.WorkflowRun.WorkflowRun]:
+                                    status: Optional[str] = None, limit: int = 10,
+                                    previous_attempts: bool = False) -> List[github.WorkflowRun.WorkflowRun]:
         # get gh workflow
         workflow = self._get_gh_workflow_from_test_instance_resource(test_instance.resource)
         logger.debug("Retrieved workflow %s from github", workflow)
         logger.debug("Workflow Runs Limit: %r", limit)
         logger.debug("Workflow Runs Status: %r", status)
 
-        result = []
-        for run in self.__get_workflow_runs_iterator(workflow, test_instance):
-            logger.debug("Loading Github run ID %r", run.id)
+        # The run listing carries the latest attempt of each run.
+        # Older attempts (if requested) are fetched lazily, i.e., only when needed to reach the `limit`:
+        # `slots` holds either runs or (run, attempt number) pairs still to be fetched.
+        slots = []
+
+        def is_pending(slot) -> bool:
+            return isinstance(slot, tuple)
+
+        def matches(run) -> bool:
             # The Workflow.get_runs method in the PyGithub API has a status argument
             # which in theory we could use to filter the runs that are retrieved to
             # only the ones with the status that interests us.  This worked in the past,
@@ -283,61 +314,112 @@ class GithubTestingService(TestingService):
             # latest three matching runs when we specify that argument.
             #
             # To work around the problem, we call `get_runs` with no arguments, thus
-            # retrieving all the runs regardless of status, and then we filter below.
-            # if status is None or run.status == status:
+            # retrieving all the runs regardless of status, and then we filter here.
+            return status is None or run.status == status
+
+        def count_candidates() -> int:
+            return sum(1 for _ in slots if is_pending(_) or matches(_))
+
+        def resolve() -> List[github.WorkflowRun.WorkflowRun]:
+            # fetch the pending attempts among the first `limit` candidates
+            count, pending = 0, []
+            for index, slot in enumerate(slots):
+                if limit and count >= limit:
+                    break
+                if is_pending(slot):
+                    pending.append(index)
+                    count += 1
+                elif matches(slot):
+                    count += 1
+            for index, attempt in zip(pending, self.__fetch_gh_workflow_run_attempts__([slots[_] for _ in pending])):
+                logger.debug("Attempt: %r %r %r", attempt, status, attempt.status)
+                slots[index] = attempt
+            return [_ for _ in slots if not is_pending(_) and matches(_)]
+
+        result = []
+        for run in self.__get_workflow_runs_iterator(workflow, test_instance):
+            logger.debug("Loading Github run ID %r", run.id)
             logger.debug("Number of attempts of run ID %r: %r", run.id, run.raw_data['run_attempt'])
-            if (limit is None or limit > 1) and run.raw_data['run_attempt'] > 1:
-                for attempt in self.__get_gh_workflow_run_attempts__(
-                        run, limit=(limit - len(result) if limit else None)):
-                    logger.debug("Attempt: %r %r %r", attempt, status, attempt.status)
-                    if status is None or attempt.status == status:
-                        result.append(attempt)
-            else:
-                if status is None or run.status == status:
-                    result.append(run)
+            slots.append(run)
+            if previous_attempts and run.raw_data.get('previous_attempt_url'):
+                slots.extend((run, attempt) for attempt in range(run.raw_data['run_attempt'] - 1, 0, -1))
             # stop iteration if the limit is reached
-            if len(result) >= limit:
-                break
-
+            if limit and count_candidates() >= limit:
+                result = resolve()
+                if len(result) >= limit:
+                    break
+        else:
+            result = resolve()
+
+        result = result[:limit] if limit else result
         for run in result:
             logger.debug("Run: %r --> %r -- %r", run, run.created_at, run.updated_at)
         return result
 
-    def get_last_test_build(self, test_instance: models.TestInstance) -> Optional[GithubTestBuild]:
+    @cached(timeout=Timeout.BUILD, client_scope=False, transactional_update=True)
+    def _get_newest_run_id(self, test_instance: models.TestInstance) -> Optional[int]:
+        # the ID of the newest run keys the build summary:
+        # it is cached for Timeout.BUILD secs and invalidated by the workflow_run webhooks
+        workflow = self._get_gh_workflow_from_test_instance_resource(test_instance.resource)
+        for run in self.__get_workflow_runs_iterator(workflow, test_instance, limit=1):
+            return run.id
+        return None
+
+    def invalidate_newest_run_id(self, test_instance: models.TestInstance):
+        cache.delete(make_cache_key(GithubTestingService._get_newest_run_id,
+                                    client_scope=False, args=(self, test_instance)))
+
+    @cached(timeout=Timeout.NONE, client_scope=False, transactional_update=True)
+    def _get_build_summary(self, test_instance: models.TestInstance, newest_run_id: Optional[int]) -> Dict[str, Any]:
+        """
+        Scan the completed runs of `test_instance` once and summarise them:
+        last, last passed and last failed run, and number of runs by conclusion.
+        Summaries are cached by instance and newest run ID,
+        so a new run makes the cached summary obsolete.
+        """
+        logger.debug("Building summary of %r (newest run: %r)...", test_instance, newest_run_id)
+        summary = {'last': None, 'last_passed': None, 'last_failed': None, 'counts': {}}
+        if newest_run_id is None:
+            return summary
+        for run in self._list_workflow_run_attempts(test_instance, status=self.GithubStatus.COMPLETED,
+                                                    previous_attempts=True):
+            if summary['last'] is None:
+                summary['last'] = run
+            if summary['last_passed'] is None and run.conclusion == self.GithubConclusion.SUCCESS:
+                summary['last_passed'] = run
+            if summary['last_failed'] is None and run.conclusion == self.GithubConclusion.FAILURE:
+                summary['last_failed'] = run
+            summary['counts'][run.conclusion] = summary['counts'].get(run.conclusion, 0) + 1
+        logger.debug("Building summary of %r (newest run: %r)... DONE: %r", test_instance, newest_run_id, summary['counts'])
+        return summary
+
+    def get_build_summary(self, test_instance: models.TestInstance) -> Dict[str, Any]:
         try:
-            logger.debug("Getting latest build...")
-            for run in self._list_workflow_run_attempts(test_instance, status=self.GithubStatus.COMPLETED):
-                return GithubTestBuild(self, test_instance, run)
-            logger.debug("Getting latest build... DONE")
-            return None
+            return self._get_build_summary(test_instance, self._get_newest_run_id(test_instance))
         except GithubRateLimitExceededException as e:
             raise lm_exceptions.RateLimitExceededException(detail=str(e), instance=test_instance)
 
+    def __get_summary_build__(self, test_instance: models.TestInstance, name: str) -> Optional[GithubTestBuild]:
+        run = self.get_build_summary(test_instance)[name]
+        return GithubTestBuild(self, test_instance, run) if run else None
+
+    def get_last_test_build(self, test_instance: models.TestInstance) -> Optional[GithubTestBuild]:
+        logger.debug("Getting latest build...")
+        return self.__get_summary_build__(test_instance, 'last')
+
     def get_last_passed_test_build(self, test_instance: models.TestInstance) -> Optional[GithubTestBuild]:
-        try:
-            logger.debug("Getting last passed build...")
-            for run in self._list_workflow_run_attempts(test_instance, status=self.GithubStatus.COMPLETED):
-                if run.conclusion == self.GithubConclusion.SUCCESS:
-                    return GithubTestBuild(self, test_instance, run)
-            return None
-        except GithubRateLimitExceededException as e:
-            raise lm_exceptions.RateLimitExceededException(detail=str(e), instance=test_instance)
+        logger.debug("Getting last passed build...")
+        return self.__get_summary_build__(test_instance, 'last_passed')
 
     def get_last_failed_test_build(self, test_instance: models.TestInstance) -> Optional[GithubTestBuild]:
-        try:
-            logger.debug("Getting last failed build...")
-            for run in self._list_workflow_run_attempts(test_instance, status=self.GithubStatus.COMPLETED):
-                if run.conclusion == self.GithubConclusion.FAILURE:
-                    return GithubTestBuild(self, test_instance, run)
-            return None
-        except GithubRateLimitExceededException as e:
-            raise lm_exceptions.RateLimitExceededException(detail=str(e), instance=test_instance)
+        logger.debug("Getting last failed build...")
+        return self.__get_summary_build__(test_instance, 'last_failed')
 
     def get_test_builds(self, test_instance: models.TestInstance, limit=10) -> list:
         try:
             logger.debug("Getting test builds...")
             return [GithubTestBuild(self, test_instance, run)
-                    for run in self._list_workflow_run_attempts(test_instance, limit=limit)[:limit]]
+                    for run in self._list_workflow_run_attempts(test_instance, limit=limit, previous_attempts=True)]
         except GithubRateLimitExceededException as e:
             raise lm_exceptions.RateLimitExceededException(detail=str(e), instance=test_instance)
 
@@ -375,6 +457,11 @@ class GithubTestingService(TestingService):
         except UnknownObjectException as e:
             raise lm_exceptions.EntityNotFoundException(models.TestBuild, entity_id=f"{run_id}_{run_attempt}", detail=str(e))
 
+    def get_test_build_from_state(self, test_instance: models.TestInstance,
+                                  state: models.TestBuildState) -> GithubTestBuild:
+        return GithubTestBuild(self, test_instance,
+                               WorkflowRun(self._gh_service._Github__requester, {}, state.data, True))
+
     def get_instance_external_link(self, test_instance: models.TestInstance) -> str:
         _, repo_full_name, workflow_id = self._get_workflow_info(test_instance.resource)
         return f'https://github.com/{repo_full_name}/actions/workflows/{workflow_id}'
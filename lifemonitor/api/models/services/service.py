@@ -105,6 +105,9 @@ class TestingService(db.Model, ModelMixin):
     # define the token type
     token_type = "Bearer"
 
+    # enable the `TestBuildState` store for the builds of this service
+    build_state_supported = False
+
     # configure the class manager
     service_type_registry = ClassManager('lifemonitor.api.models.services', class_suffix='TestingService', skip=['__init__', 'service'])
 
@@ -180,6 +183,9 @@ class TestingService(db.Model, ModelMixin):
     def get_test_build_external_link(self, test_build: models.TestBuild) -> str:
         raise lm_exceptions.NotImplementedException()
 
+    def get_test_build_from_state(self, test_instance: models.TestInstance, state: models.TestBuildState) -> models.TestBuild:
+        raise lm_exceptions.NotImplementedException()
+
     def get_test_builds(self, test_instance: models.TestInstance, limit: int = 10) -> list:
         raise lm_exceptions.NotImplementedException()
 
@@ -20,6 +20,7 @@
 
 from __future__ import annotations
 
+import hashlib
 import logging
 
 import lifemonitor.exceptions as lm_exceptions
@@ -29,6 +30,19 @@ from lifemonitor.lang import messages
 logger = logging.getLogger(__name__)
 
 
+def get_build_state_token(suites) -> str:
+    """
+    Return a token which changes whenever the test instances of the `suites`
+    or the last update of their builds change.
+    """
+    token = hashlib.sha1()
+    for suite in suites:
+        token.update(str(suite.uuid).encode())
+        for test_instance in suite.test_instances:
+            token.update(f"{test_instance.uuid}@{test_instance.last_builds_update}".encode())
+    return token.hexdigest()
+
+
 class AggregateTestStatus:
     ALL_PASSING = "all_passing"
     SOME_PASSING = "some_passing"
@@ -55,6 +69,20 @@ class Status:
     def availability_issues(self):
         return self._availability_issues.copy()
 
+    def __getstate__(self):
+        # don't serialize the referenced models
+        return {
+            "_status": self._status,
+            "_latest_builds": self._latest_builds,
+            "_availability_issues": [
+                {k: (str(v.uuid) if k == 'test_instance' else v) for k, v in issue.items()}
+                for issue in self._availability_issues
+            ]
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
     @staticmethod
     def _update_status(current_status, build_passing):
         status = current_status
@@ -25,10 +25,11 @@ import logging
 from .testsuite import TestSuite
 from .testbuild import BuildStatus, TestBuild
 from .testinstance import TestInstance, ManagedTestInstance
+from .buildstate import TestBuildState
 
 
 # set module level logger
 logger = logging.getLogger(__name__)
 
 
-__all__ = ["BuildStatus", "TestBuild", "TestSuite", "TestInstance", "ManagedTestInstance"]
+__all__ = ["BuildStatus", "TestBuild", "TestSuite", "TestInstance", "ManagedTestInstance", "TestBuildState"]
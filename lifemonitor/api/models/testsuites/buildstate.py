@@ -0,0 +1,119 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from __future__ import annotations
+
+import datetime
+import logging
+from typing import List, Optional
+
+import lifemonitor.api.models as models
+from flask import current_app
+from lifemonitor.api.models import db
+from lifemonitor.cache import Timeout
+from lifemonitor.models import JSON, UUID, ModelMixin
+
+# set module level logger
+logger = logging.getLogger(__name__)
+
+
+class TestBuildState(db.Model, ModelMixin):
+    """
+    Last observed state of a test build, fed either by webhook events
+    or by the periodic reconciliation with the testing service.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    _test_instance_uuid = db.Column("test_instance_uuid", UUID,
+                                    db.ForeignKey("test_instance.uuid", ondelete="CASCADE"),
+                                    nullable=False, index=True)
+    build_id = db.Column(db.String, nullable=False)
+    status = db.Column(db.String, nullable=True)
+    run_attempt = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    observed_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+    data = db.Column(JSON, nullable=True)
+
+    test_instance = db.relationship("TestInstance", uselist=False,
+                                    backref=db.backref("build_states", cascade="all, delete-orphan",
+                                                       passive_deletes=True, lazy="dynamic"))
+
+    __table_args__ = (
+        db.UniqueConstraint("test_instance_uuid", "build_id"),
+    )
+
+    def __repr__(self):
+        return f"<TestBuildState {self.build_id} ({self.status}) @ instance {self._test_instance_uuid}>"
+
+    def update(self, build: models.TestBuild, observed_at: datetime.datetime = None):
+        self.status = build.status
+        self.run_attempt = getattr(build, 'attempt_number', None)
+        self.created_at = datetime.datetime.utcfromtimestamp(build.timestamp) if build.timestamp else None
+        self.updated_at = getattr(build, 'updated_at', None)
+        self.observed_at = observed_at or datetime.datetime.utcnow()
+        self.data = build.metadata
+
+    @classmethod
+    def upsert(cls, test_instance: models.TestInstance, builds: List[models.TestBuild], commit: bool = True) -> List[TestBuildState]:
+        now = datetime.datetime.utcnow()
+        states = {_.build_id: _ for _ in cls.query.filter(
+            cls._test_instance_uuid == test_instance.uuid,
+            cls.build_id.in_([b.id for b in builds])).all()} if builds else {}
+        result = []
+        for b in builds:
+            state = states.get(b.id, None)
+            if state is None:
+                state = cls(test_instance=test_instance, build_id=b.id)
+            state.update(b, observed_at=now)
+            db.session.add(state)
+            result.append(state)
+        logger.debug("Build states of %r updated: %r", test_instance, result)
+        test_instance.last_builds_updated(now)
+        if commit:
+            db.session.commit()
+        return result
+
+    @classmethod
+    def find_by_instance(cls, test_instance: models.TestInstance, limit: Optional[int] = 10) -> List[TestBuildState]:
+        query = cls.query.filter(cls._test_instance_uuid == test_instance.uuid)\
+            .order_by(cls.created_at.desc().nullslast(), cls.run_attempt.desc().nullslast())
+        if limit:
+            query = query.limit(limit)
+        return query.all()
+
+    @classmethod
+    def last_observed(cls, test_instance: models.TestInstance) -> Optional[datetime.datetime]:
+        return db.session.query(db.func.max(cls.observed_at))\
+            .filter(cls._test_instance_uuid == test_instance.uuid).scalar()
+
+    @classmethod
+    def is_fresh(cls, test_instance: models.TestInstance, max_age: Optional[int] = None) -> bool:
+        """
+        Return `True` if the last build state of the `test_instance`
+        has been observed at most `max_age` secs ago.
+        """
+        last_observed = cls.last_observed(test_instance)
+        if last_observed is None:
+            return False
+        if max_age is None:
+            max_age = current_app.config.get("BUILD_STATE_MAX_AGE", Timeout.BUILD)
+        return last_observed >= datetime.datetime.utcnow() - datetime.timedelta(seconds=int(max_age))
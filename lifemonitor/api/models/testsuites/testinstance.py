@@ -27,9 +27,10 @@ from typing import List
 
 import lifemonitor.api.models as models
 from lifemonitor.api.models import db
-from lifemonitor.cache import Timeout, cached
+from lifemonitor.cache import Timeout, cache, cached, make_cache_key
 from lifemonitor.models import JSON, UUID, ModelMixin
 
+from .buildstate import TestBuildState
 from .testsuite import TestSuite
 
 # set module level logger
@@ -48,7 +49,7 @@ class TestInstance(db.Model, ModelMixin):
     submitter_id = db.Column(db.Integer,
                              db.ForeignKey(models.User.id), nullable=True)
     last_builds_update = db.Column(db.DateTime, default=datetime.datetime.utcnow,
-                                   onupdate=datetime.datetime.utcnow)
+                                   onupdate=datetime.datetime.utcnow, index=True)
     # configure relationships
     submitter = db.relationship("User", uselist=False)
     test_suite = db.relationship("TestSuite",
@@ -100,7 +101,7 @@ class TestInstance(db.Model, ModelMixin):
         except Exception:
             return None
 
-    @cached(timeout=Timeout.BUILD, client_scope=False)
+    @cached(timeout=Timeout.BUILD, client_scope=False, stale_while_revalidate=Timeout.BUILD)
     def get_external_link(self):
         return self.testing_service.get_instance_external_link(self)
 
@@ -118,17 +119,58 @@ class TestInstance(db.Model, ModelMixin):
 
     @cached(timeout=Timeout.NONE, client_scope=False, transactional_update=True)
     def get_test_builds(self, limit=10):
+        # read the builds from the (fresh) build states fed by the webhooks
+        if self.has_fresh_build_states():
+            logger.debug("Loading builds of %r from their states", self)
+            return [self.testing_service.get_test_build_from_state(self, _)
+                    for _ in TestBuildState.find_by_instance(self, limit=limit)]
         try:
             return self.testing_service.get_test_builds(self, limit=limit)
         finally:
             self.last_builds_updated()
 
-    @cached(timeout=Timeout.BUILD, client_scope=False, transactional_update=True)
+    @cached(timeout=Timeout.BUILD, client_scope=False, transactional_update=True,
+            stale_while_revalidate=Timeout.BUILD)
     def get_test_build(self, build_number):
         return self.testing_service.get_test_build(self, build_number)
 
-    def last_builds_updated(self, when=datetime.datetime.utcnow()):
-        self.last_builds_update = when
+    def invalidate_test_build(self, build_number):
+        """Drop the cached value of the build `build_number` (e.g., after a webhook has changed it)"""
+        cache.delete(make_cache_key(TestInstance.get_test_build, client_scope=False, args=(self, build_number)))
+
+    def reconcile_build_states(self, limit=10) -> List[models.TestBuild]:
+        """
+        List the latest builds from the testing service and store their states.
+        Not cached: it writes to the database.
+        """
+        builds = self.testing_service.get_test_builds(self, limit=limit)
+        self.update_build_states(builds, reconcile=True)
+        return builds
+
+    def has_fresh_build_states(self) -> bool:
+        return self.testing_service.build_state_supported and TestBuildState.is_fresh(self)
+
+    def update_build_states(self, builds: List[models.TestBuild], reconcile: bool = False):
+        """
+        Store the observed state of the given `builds`.
+        Single builds are tracked only after a full reconciliation
+        (i.e., `reconcile=True`) has listed the latest builds of this instance.
+        """
+        if not self.testing_service.build_state_supported:
+            return
+        try:
+            if reconcile or TestBuildState.last_observed(self) is not None:
+                TestBuildState.upsert(self, builds)
+        except Exception as e:
+            # e.g., concurrent upserts of the same build:
+            # the failed transaction must be rolled back to keep using the session
+            db.session.rollback()
+            logger.warning("Unable to update the build states of %r: %s", self, str(e))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.exception(e)
+
+    def last_builds_updated(self, when=None):
+        self.last_builds_update = when or datetime.datetime.utcnow()
 
     def to_dict(self, test_build=False, test_output=False):
         data = {
@@ -28,6 +28,7 @@ from typing import List
 import lifemonitor.api.models as models
 from lifemonitor.api.models import db
 from lifemonitor.auth.models import User
+from lifemonitor.cache import Timeout, cached
 from lifemonitor.models import JSON, UUID, ModelMixin
 
 # set module level logger
@@ -64,6 +65,19 @@ class TestSuite(db.Model, ModelMixin):
 
     @property
     def status(self) -> models.SuiteStatus:
+        # the materialized status is reused until the state of the builds changes
+        token = models.get_build_state_token([self])
+        memo = self.__dict__.get('_status_memo', None)
+        if memo is None or memo[0] != token:
+            memo = (token, self._get_status(token))
+            self._status_memo = memo
+        return memo[1]
+
+    # only the status of persistent objects is materialized
+    @cached(timeout=Timeout.WORKFLOW, client_scope=False, transactional_update=True,
+            unless=lambda obj, *args, **kwargs: not obj.is_persistent())
+    def _get_status(self, build_state_token: str) -> models.SuiteStatus:
+        logger.debug("Computing status of %r (build state: %s)", self, build_state_token)
         return models.SuiteStatus(self)
 
     def get_test_instance_by_name(self, name) -> list:
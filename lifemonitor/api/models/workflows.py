@@ -39,6 +39,7 @@ from lifemonitor.api.models.rocrate import ROCrate
 from lifemonitor.auth.models import (HostingService, Permission, Resource,
                                      Subscription, User)
 from lifemonitor.auth.oauth2.client.models import OAuthIdentity
+from lifemonitor.cache import Timeout, cached
 from lifemonitor.storage import RemoteStorage
 
 # set module level logger
@@ -171,8 +172,12 @@ class Workflow(Resource):
 
     @classmethod
     def get_public_workflows(cls) -> List[Workflow]:
+        return cls.get_public_workflows_query().all()
+
+    @classmethod
+    def get_public_workflows_query(cls):
         return cls.query\
-            .filter(cls.public == true()).all()  # noqa: E712
+            .filter(cls.public == true())  # noqa: E712
 
     @classmethod
     def get_hosted_workflows_by_uri(cls, hosting_service: HostingService, uri: str, submitter: User = None) -> List[Workflow]:
@@ -299,6 +304,19 @@ class WorkflowVersion(ROCrate):
 
     @property
     def status(self) -> models.WorkflowStatus:
+        # the materialized status is reused until the state of the builds changes
+        token = models.get_build_state_token(self.test_suites)
+        memo = self.__dict__.get('_status_memo', None)
+        if memo is None or memo[0] != token:
+            memo = (token, self._get_status(token))
+            self._status_memo = memo
+        return memo[1]
+
+    # only the status of persistent objects is materialized
+    @cached(timeout=Timeout.WORKFLOW, client_scope=False, transactional_update=True,
+            unless=lambda obj, *args, **kwargs: not obj.is_persistent())
+    def _get_status(self, build_state_token: str) -> models.WorkflowStatus:
+        logger.debug("Computing status of %r (build state: %s)", self, build_state_token)
         return models.WorkflowStatus(self)
 
     @property
@@ -0,0 +1,141 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from __future__ import annotations
+
+import base64
+import json
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from flask import request
+
+import lifemonitor.exceptions as lm_exceptions
+from lifemonitor import utils as lm_utils
+
+# set module level logger
+logger = logging.getLogger(__name__)
+
+# max number of items which can precede a page:
+# deeper pages are rejected to bound the items loaded to serve them
+MAX_PAGE_DEPTH = 1000
+
+
+def encode_cursor(key: Tuple, count: int = 0) -> str:
+    data = json.dumps({"after": list(key), "count": count}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, max_count: Optional[int] = None) -> Tuple[Tuple, int]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        after, count = tuple(data['after']), int(data.get('count', 0))
+    except Exception as e:
+        logger.debug("Invalid cursor %r: %s", cursor, e)
+        raise lm_exceptions.BadRequestException(detail=f"Invalid cursor '{cursor}'")
+    if count < 0 or (max_count is not None and count > max_count):
+        logger.debug("Invalid count %r of cursor %r", count, cursor)
+        raise lm_exceptions.BadRequestException(detail=f"Invalid cursor '{cursor}': page too deep")
+    return after, count
+
+
+class Page:
+    """
+    A page of a list of items ordered by a key,
+    with the cursor of the next page (if any).
+    """
+
+    def __init__(self, items: List, limit: int, next_key: Optional[Tuple] = None, count: int = 0) -> None:
+        self.items = items
+        self.limit = limit
+        self.next_key = next_key
+        self.count = count
+
+    @property
+    def next_cursor(self) -> Optional[str]:
+        return encode_cursor(self.next_key, self.count) if self.next_key is not None else None
+
+    @property
+    def next_link(self) -> Optional[str]:
+        if self.next_cursor is None:
+            return None
+        args = request.args.to_dict()
+        args.update({"limit": self.limit, "cursor": self.next_cursor})
+        return f"{lm_utils.get_external_server_url()}{request.path}?{urlencode(args)}"
+
+    def response(self, data: Dict[str, Any]):
+        """
+        Return the response of the serialized page `data`,
+        linking the next page in both the body and the `Link` header.
+        """
+        next_link = self.next_link
+        if next_link is None:
+            return data
+        links = data.get('links', None) or {}
+        links['next'] = next_link
+        data['links'] = links
+        return data, 200, {"Link": f'<{next_link}>; rel="next"'}
+
+
+def paginate(items: Iterable, key: Callable[[Any], Tuple], limit: int,
+             cursor: Optional[str] = None, reverse: bool = False) -> Page:
+    """
+    Return the page of `items` which follows the `cursor`
+    according to the order defined by the `key` function.
+    """
+    after, count = decode_cursor(cursor) if cursor else (None, 0)
+    ordered = sorted(items, key=key, reverse=reverse)
+    if after is not None:
+        ordered = [_ for _ in ordered if (key(_) < after if reverse else key(_) > after)]
+    page = ordered[:limit]
+    next_key = key(page[-1]) if len(ordered) > limit else None
+    logger.debug("Page of %d items after %r (next: %r)", len(page), after, next_key)
+    return Page(page, limit, next_key=next_key, count=count + len(page))
+
+
+def paginate_query(query, column, limit: int, cursor: Optional[str] = None) -> Page:
+    """
+    Return the page of the results of the SQLAlchemy `query` which follows the `cursor`,
+    applying the keyset filter on `column`, the ordering and the limit in SQL.
+    """
+    after, count = decode_cursor(cursor) if cursor else (None, 0)
+    if after is not None:
+        try:
+            value, = after
+            value = column.type.python_type(value)
+        except Exception as e:
+            logger.debug("Invalid key %r of cursor %r: %s", after, cursor, e)
+            raise lm_exceptions.BadRequestException(detail=f"Invalid cursor '{cursor}'")
+        query = query.filter(column > value)
+    items = query.order_by(column).limit(limit + 1).all()
+    page = items[:limit]
+    next_key = (getattr(page[-1], column.key),) if len(items) > limit else None
+    logger.debug("Page of %d items after %r (next: %r)", len(page), after, next_key)
+    return Page(page, limit, next_key=next_key, count=count + len(page))
+
+
+def workflow_key(workflow) -> Tuple:
+    return (workflow.id,)
+
+
+def build_key(build) -> Tuple:
+    return (build.timestamp or 0, str(build.id))
@@ -0,0 +1,126 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from __future__ import annotations
+
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import configure_mappers, selectinload
+
+from lifemonitor.api import models
+from lifemonitor.api.models.registries.registry import RegistryWorkflowVersion
+from lifemonitor.auth.models import Permission, Resource, Subscription, User
+
+# set module level logger
+logger = logging.getLogger(__name__)
+
+
+def _ids(resources: Iterable[Resource]) -> List[int]:
+    # read the identity of persistent objects without refreshing expired ones
+    return [state.identity[0] for state in (inspect(r) for r in resources)
+            if state.identity is not None]
+
+
+def plan_workflow_list(status: bool = False, versions: bool = False) -> List:
+    """
+    Return the loader options required to serialize a list of workflows
+    including their `status` and/or all their `versions`.
+    """
+    # backrefs (e.g., `Workflow.versions`) exist only on configured mappers
+    configure_mappers()
+    # the latest version is always required to serialize a workflow
+    workflow_versions = selectinload(models.Workflow.versions)
+    options = [workflow_versions]
+    if versions:
+        options.append(workflow_versions.joinedload(models.WorkflowVersion.submitter))
+        options.append(workflow_versions
+                       .selectinload(models.WorkflowVersion.registry_workflow_versions)
+                       .joinedload(RegistryWorkflowVersion.registry))
+    if status:
+        options.append(workflow_versions
+                       .selectinload(models.WorkflowVersion.test_suites)
+                       .selectinload(models.TestSuite.test_instances)
+                       .joinedload(models.TestInstance.testing_service))
+    return options
+
+
+def _has_status_memo(workflow: models.Workflow) -> bool:
+    # the status is memoized on the latest version, once the versions are loaded
+    if 'versions' in inspect(workflow).unloaded:
+        return False
+    versions = workflow.versions
+    return len(versions) > 0 and '_status_memo' in workflow.latest_version.__dict__
+
+
+def prefetch_workflows(workflows: Iterable[models.Workflow],
+                       status: bool = False, versions: bool = False) -> List[models.Workflow]:
+    """
+    Load up front all the relationships needed to serialize `workflows`:
+    the already loaded workflows are refreshed in place by the session,
+    so that the serializer no longer triggers lazy loads per item.
+    Suites and instances are loaded only for the workflows without a memoized status.
+    """
+    workflows = list(workflows)
+    memoized = set(_ids(w for w in workflows if _has_status_memo(w))) if status else set()
+    ids = [_ for _ in _ids(workflows) if _ not in memoized]
+    for batch, with_status in ((ids, status), (list(memoized), False)):
+        if len(batch) > 0:
+            models.Workflow.query.filter(models.Workflow.id.in_(batch))\
+                .options(*plan_workflow_list(status=with_status, versions=versions)).all()
+            logger.debug("Prefetched %d workflows (status: %r, versions: %r)", len(batch), with_status, versions)
+    return workflows
+
+
+class SubscriptionIndex:
+    """
+    Per-request index of the subscriptions of a set of users.
+    """
+
+    def __init__(self, users: Optional[Iterable[User]]) -> None:
+        self._index: Dict[Tuple[int, int], Subscription] = {}
+        for user in users or []:
+            for s in user.subscriptions:
+                self._index[(user.id, s.resource_id)] = s
+
+    def get(self, user: User, resource: Resource) -> Optional[Subscription]:
+        return self._index.get((user.id, resource.id), None)
+
+
+class PermissionIndex:
+    """
+    Per-request index of the permissions of a user on a set of resources.
+    """
+
+    def __init__(self, user: User, resources: Iterable[Resource]) -> None:
+        ids = _ids(resources)
+        self._index: Dict[int, Permission] = {
+            p.resource_id: p for p in Permission.query
+            .filter(Permission.user_id == user.id)
+            .filter(Permission.resource_id.in_(ids)).all()
+        } if len(ids) > 0 else {}
+
+    def get(self, resource: Resource) -> Optional[Permission]:
+        return self._index.get(resource.id, None)
+
+    def has_permission(self, resource: Resource) -> bool:
+        return resource.id in self._index
@@ -27,6 +27,7 @@ from urllib.parse import urljoin
 from lifemonitor import exceptions as lm_exceptions
 from lifemonitor import utils as lm_utils
 from lifemonitor.api.models.issues import WorkflowRepositoryIssue
+from lifemonitor.api.prefetch import SubscriptionIndex, prefetch_workflows
 from lifemonitor.auth import models as auth_models
 from lifemonitor.auth.serializers import SubscriptionSchema, UserSchema
 from lifemonitor.serializers import (BaseSchema, ListOfItems,
@@ -447,9 +448,11 @@ class WorkflowVersionListItem(WorkflowSchema):
     versions = fields.Method("get_versions")
 
     def __init__(self, *args, self_link: bool = True,
-                 workflow_versions: bool = False, subscriptionsOf: List[auth_models.User] = None, **kwargs):
+                 workflow_versions: bool = False, subscriptionsOf: List[auth_models.User] = None,
+                 subscriptions_index: SubscriptionIndex = None, **kwargs):
         super().__init__(*args, self_link=self_link, **kwargs)
         self.subscriptionsOf = subscriptionsOf
+        self.subscriptions_index = subscriptions_index
         self.workflow_versions = workflow_versions
 
     def get_status(self, workflow):
@@ -507,7 +510,8 @@ class WorkflowVersionListItem(WorkflowSchema):
         result = []
         if self.subscriptionsOf:
             for user in self.subscriptionsOf:
-                s = user.get_subscription(w)
+                s = self.subscriptions_index.get(user, w) \
+                    if self.subscriptions_index else user.get_subscription(w)
                 if s:
                     result.append(SubscriptionSchema(exclude=('meta', 'links'), self_link=False).dump(s))
         return result
@@ -539,10 +543,16 @@ class ListOfWorkflows(ListOfItems):
             exclude.append('status')
         if not self.subscriptionsOf or len(self.subscriptionsOf) == 0:
             exclude.append('subscriptions')
-        return [self.__item_scheme__(exclude=tuple(exclude), many=False,
-                                     subscriptionsOf=self.subscriptionsOf,
-                                     workflow_versions=self.workflow_versions).dump(_) for _ in obj] \
-            if self.__item_scheme__ else None
+        if not self.__item_scheme__:
+            return None
+        # load in advance what is required to serialize the items
+        obj = prefetch_workflows(obj, status=self.workflow_status, versions=self.workflow_versions)
+        subscriptions_index = SubscriptionIndex(self.subscriptionsOf) if self.subscriptionsOf else None
+        schema = self.__item_scheme__(exclude=tuple(exclude), many=False,
+                                      subscriptionsOf=self.subscriptionsOf,
+                                      subscriptions_index=subscriptions_index,
+                                      workflow_versions=self.workflow_versions)
+        return [schema.dump(_) for _ in obj]
 
 
 class SuiteSchema(ResourceMetadataSchema):
@@ -24,8 +24,11 @@ import logging
 from datetime import datetime, timezone
 from typing import Dict, List, Optional, Union
 
+from sqlalchemy import text
+
 import lifemonitor.exceptions as lm_exceptions
 from lifemonitor.api import models
+from lifemonitor.api.prefetch import PermissionIndex
 from lifemonitor.auth.models import (EventType,
                                      ExternalServiceAuthorizationHeader,
                                      HostingService, Notification, Permission,
@@ -533,6 +536,10 @@ class LifeMonitor:
     def get_registry_workflows(registry: models.WorkflowRegistry) -> List[models.Workflow]:
         return registry.get_workflows()
 
+    @staticmethod
+    def get_registry_workflows_query(registry: models.WorkflowRegistry):
+        return registry.get_workflows_query()
+
     @staticmethod
     def get_registry_workflow(registry: models.WorkflowRegistry) -> models.Workflow:
         return registry.workflow_versions
@@ -552,13 +559,23 @@ class LifeMonitor:
     def get_public_workflows() -> List[models.Workflow]:
         return models.Workflow.get_public_workflows()
 
+    @staticmethod
+    def get_public_workflows_query():
+        return models.Workflow.get_public_workflows_query()
+
     @staticmethod
     def get_user_workflows(user: User,
                            include_subscriptions: bool = False,
                            only_subscriptions: bool = False) -> List[models.Workflow]:
         if only_subscriptions:
-            return [_.resource for _ in user.subscriptions
-                    if _.resource.public or user in [p.user for p in _.resource.permissions]]
+            # load the subscribed workflows with a single query
+            subscribed_ids = [_.resource_id for _ in user.subscriptions]
+            subscribed = {w.id: w for w in models.Workflow.query
+                          .filter(models.Workflow.id.in_(subscribed_ids)).all()} if subscribed_ids else {}
+            resources = [subscribed[_] for _ in subscribed_ids if _ in subscribed]
+            permissions = PermissionIndex(user, resources)
+            return [r for r in resources
+                    if r.public or permissions.has_permission(r)]
 
         workflows = [w for w in models.Workflow.get_user_workflows(user, include_subscriptions=include_subscriptions)]
         for svc in models.WorkflowRegistry.all():
@@ -726,31 +743,42 @@ class LifeMonitor:
         user.save()
 
     @staticmethod
-    def list_workflow_updates(since: datetime = datetime.now) -> Dict[str, datetime]:
+    def list_workflow_updates(since: Optional[datetime] = None) -> List[Dict]:
+        """
+        List the last update of every workflow version,
+        restricted to the versions updated after `since` (if set).
+        """
         from lifemonitor.db import db
-        query = """
-            SELECT DISTINCT uuid, version, max(last_update) as last_update
-            FROM (
+        version_updates = """
                 SELECT w.uuid AS uuid, r.version AS version, GREATEST(r.modified, w.modified) AS last_update
                 FROM resource AS r
                 JOIN workflow_version AS wv ON r.id = wv.id
                 JOIN resource AS w ON wv.workflow_id = w.id
                 WHERE r.type LIKE 'workflow_version'
-
-                UNION
-
+        """
+        build_updates = """
                 SELECT w.uuid AS uuid, r.version AS version, t.last_builds_update AS last_update
                 FROM test_instance AS t
                 JOIN test_suite AS s ON t.test_suite_uuid = s.uuid
                 JOIN workflow_version AS wv ON s.workflow_version_id = wv.id
                 JOIN resource AS r ON r.id = wv.id
                 JOIN resource AS w ON wv.workflow_id = w.id
-            ) as X
+        """
+        if since is None:
+            updates = [version_updates, build_updates]
+        else:
+            # one branch per indexed timestamp, so that each one is an index range scan
+            updates = [f"{version_updates} AND r.modified > :since",
+                       f"{version_updates} AND w.modified > :since",
+                       f"{build_updates} WHERE t.last_builds_update > :since"]
+        query = text(f"""
+            SELECT DISTINCT uuid, version, max(last_update) as last_update
+            FROM ({" UNION ".join(updates)}) as X
             GROUP BY X.uuid,X.version
             ORDER BY last_update DESC
-            """
+            """)
         result: List = []
-        rs = db.session.execute(query)
+        rs = db.session.execute(query, {"since": since} if since is not None else {})
         for row in rs:
             logger.debug("Row: %r", row)
             result.append({
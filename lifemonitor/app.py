@@ -37,7 +37,7 @@ from lifemonitor.tasks import init_task_queues
 from lifemonitor.utils import get_domain
 
 from . import commands
-from .cache import init_cache
+from .cache import init_cache, set_response_etag
 from .db import db
 from .exceptions import handle_exception
 from .mail import init_mail
@@ -170,7 +170,7 @@ def initialize_app(
     # init tmp folder
     os.makedirs(app.config.get("BASE_TEMP_FOLDER"), exist_ok=True)
     # enable CORS
-    CORS(app, expose_headers=["Content-Type", "X-CSRFToken"], supports_credentials=True)
+    CORS(app, expose_headers=["Content-Type", "X-CSRFToken", "ETag"], supports_credentials=True)
     # configure logging
     config.configure_logging(app)
     # check if the app is running in maintenance mode
@@ -187,6 +187,8 @@ def initialize_app(
         Migrate(app, db)
         # initialize cache
         init_cache(app)
+        # validate cached responses through their ETags
+        app.after_request(set_response_etag)
         # configure serializer engine (Flask Marshmallow)
         ma.init_app(app)
         # configure app routes
@@ -393,7 +393,7 @@ class Resource(db.Model, ModelMixin):
     version = db.Column(db.String, nullable=True)
     created = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     modified = db.Column(db.DateTime, default=datetime.datetime.utcnow,
-                         onupdate=datetime.datetime.utcnow)
+                         onupdate=datetime.datetime.utcnow, index=True)
 
     permissions = db.relationship("Permission", back_populates="resource",
                                   cascade="all, delete-orphan")
@@ -20,23 +20,47 @@
 
 from __future__ import annotations
 
+import base64
+import fnmatch
 import functools
+import hashlib
+import importlib
 import logging
+import math
 import os
 import pickle
+import random
 import threading
 import time
+import zlib
+from collections import OrderedDict
 from contextlib import contextmanager
 from typing import Callable, Union
 
 import redis
 import redis_lock
-from flask import request
+from flask import Response, g, has_request_context, request
 from flask.app import Flask
 from flask.globals import current_app
+from sqlalchemy import inspect as sqlalchemy_inspect
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # Set prefix
 CACHE_PREFIX = "lifemonitor-api-cache:"
+# Set prefix of the key index
+CACHE_INDEX_PREFIX = "lifemonitor-api-cache-index:"
+# Set prefix of the signal lists of cache fills
+CACHE_FILL_SIGNAL_PREFIX = "lifemonitor-api-cache-fill:"
+# Set prefix of the flags of background cache refreshes
+CACHE_REFRESH_PREFIX = "lifemonitor-api-cache-refresh:"
+# Set suffix of the keys of the ETags of cached responses
+CACHE_ETAG_SUFFIX = "#etag"
+# Set marker of the references to model instances in the messages of background refreshes
+MODEL_REFERENCE_MARKER = "__model__"
 
 
 # Set module logger
@@ -87,6 +111,339 @@ class IllegalStateException(RuntimeError):
     pass
 
 
+class CacheEntry(object):
+    """
+    Wrap a cached value with its soft expiration time (epoch secs) and
+    the time (secs) spent to compute it, to support stale-while-revalidate.
+    """
+
+    __slots__ = ('value', 'soft_expiry', 'delta')
+
+    def __init__(self, value, soft_expiry: float, delta: float = 0) -> None:
+        self.value = value
+        self.soft_expiry = soft_expiry
+        self.delta = delta
+
+    def __getstate__(self):
+        return (self.value, self.soft_expiry, self.delta)
+
+    def __setstate__(self, state):
+        self.value, self.soft_expiry, self.delta = state
+
+    def is_stale(self) -> bool:
+        return time.time() >= self.soft_expiry
+
+    def should_refresh(self, beta: float = 1.0) -> bool:
+        """
+        XFetch probabilistic early expiration: the closer the soft expiry
+        and the more expensive the computation, the more likely a refresh.
+        """
+        return time.time() - self.delta * beta * math.log(1.0 - random.random()) >= self.soft_expiry
+
+
+def _unwrap(value):
+    return value.value if isinstance(value, CacheEntry) else value
+
+
+class CacheCodec(object):
+    """
+    Serialize cache values as pickle data, compressed when larger than `threshold` bytes.
+
+    Encoded values start with a header byte: the high nibble holds the codec version,
+    the low nibble the format of the payload (see `RAW`, `ZLIB` and `ZSTD`).
+    Values written without a header (i.e., plain pickle data) are still decoded.
+    """
+
+    VERSION = 1
+
+    RAW = 0
+    ZLIB = 1
+    ZSTD = 2
+
+    _formats = {
+        'none': RAW,
+        'zlib': ZLIB,
+        'zstd': ZSTD
+    }
+
+    def __init__(self, compression: str = 'zstd', threshold: int = 1024, level: int = 3) -> None:
+        self.compression = compression
+        self.threshold = threshold
+        self.level = level
+
+    @property
+    def compression(self) -> str:
+        return self._compression
+
+    @compression.setter
+    def compression(self, value: str):
+        value = (value or 'none').lower()
+        if value not in self._formats:
+            raise ValueError(f"Unsupported cache compression: {value}")
+        if value == 'zstd' and zstandard is None:
+            logger.warning("zstandard module not available: falling back to zlib compression")
+            value = 'zlib'
+        self._compression = value
+
+    def _header(self, fmt: int) -> bytes:
+        return bytes([(self.VERSION << 4) | fmt])
+
+    def encode(self, value) -> bytes:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        fmt = self._formats[self.compression]
+        if fmt == self.RAW or len(data) < self.threshold:
+            return self._header(self.RAW) + data
+        if fmt == self.ZSTD:
+            compressed = zstandard.ZstdCompressor(level=self.level).compress(data)
+        else:
+            compressed = zlib.compress(data, self.level)
+        # keep the uncompressed payload if compression doesn't pay off
+        if len(compressed) >= len(data):
+            return self._header(self.RAW) + data
+        return self._header(fmt) + compressed
+
+    def decode(self, data: bytes):
+        if data is None:
+            return None
+        header = data[0]
+        # legacy values: plain pickle data (protocol >= 2 starts with the PROTO opcode)
+        if header == 0x80:
+            return pickle.loads(data)
+        version, fmt = header >> 4, header & 0x0F
+        if version != self.VERSION:
+            raise ValueError(f"Unsupported cache codec version: {version}")
+        payload = data[1:]
+        if fmt == self.ZLIB:
+            payload = zlib.decompress(payload)
+        elif fmt == self.ZSTD:
+            if zstandard is None:
+                raise ValueError("zstandard module required to decode the cached value")
+            payload = zstandard.ZstdDecompressor().decompress(payload)
+        elif fmt != self.RAW:
+            raise ValueError(f"Unsupported cache codec format: {fmt}")
+        return pickle.loads(payload)
+
+
+class LocalCache(object):
+    """
+    Bounded in-process (L1) cache which sits in front of the Redis (L2) back-end.
+
+    Entries are evicted in LRU order when `max_size` is exceeded and
+    expire after `timeout` seconds (or earlier, if the L2 timeout is shorter).
+    Values are stored as encoded bytes and decoded on every hit, so hits skip
+    the network round-trip while each caller still gets its own copy of the value.
+    """
+
+    def __init__(self, max_size: int = 1024, timeout: int = 30) -> None:
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.timeout > 0
+
+    def configure(self, max_size: int = None, timeout: int = None):
+        with self._lock:
+            if max_size is not None:
+                self.max_size = int(max_size)
+            if timeout is not None:
+                self.timeout = int(timeout)
+            self.clear()
+
+    def get(self, key: str):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._data.get(key, None)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value, timeout: int = Timeout.NONE, expires_at: float = None):
+        if not self.enabled:
+            return
+        if value is None:
+            self.delete(key)
+            return
+        ttl = min(timeout, self.timeout) if timeout and timeout > 0 else self.timeout
+        if expires_at is None:
+            expires_at = time.monotonic() + ttl
+        else:
+            expires_at = min(expires_at, time.monotonic() + ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_keys(self, pattern: str):
+        with self._lock:
+            for k in [_ for _ in self._data.keys() if fnmatch.fnmatchcase(_, pattern)]:
+                del self._data[k]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def size(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size(),
+            "max_size": self.max_size,
+            "timeout": self.timeout,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+class CacheKeyIndex(object):
+    """
+    Registry of the keys stored within a cache namespace (i.e., key prefix).
+
+    The registry is made of two Redis sorted sets: the first one maps every key
+    to its expiration time and it is used to lazily prune the expired keys;
+    the second one stores all the keys with the same score, so that keys
+    sharing a literal prefix can be retrieved by a lexicographical range query
+    in O(log(N) + M), without blocking the server with the `KEYS` command.
+    """
+
+    def __init__(self, prefix: str = CACHE_PREFIX) -> None:
+        self.prefix = prefix
+        self.expiry_key = f"{CACHE_INDEX_PREFIX}{prefix}expiry"
+        self.lex_key = f"{CACHE_INDEX_PREFIX}{prefix}lex"
+
+    def add(self, pipeline, key: str, timeout: int = Timeout.NONE):
+        score = time.time() + timeout if timeout and timeout > 0 else float('inf')
+        pipeline.zadd(self.expiry_key, {key: score})
+        pipeline.zadd(self.lex_key, {key: 0})
+
+    def remove(self, pipeline, *keys):
+        if keys:
+            pipeline.zrem(self.expiry_key, *keys)
+            pipeline.zrem(self.lex_key, *keys)
+
+    def clear(self, pipeline):
+        pipeline.delete(self.expiry_key, self.lex_key)
+
+    def prune(self, backend: redis.Redis):
+        expired = backend.zrangebyscore(self.expiry_key, '-inf', time.time())
+        if expired:
+            logger.debug("Pruning %d expired keys from the index %r", len(expired), self.lex_key)
+            pipeline = backend.pipeline()
+            self.remove(pipeline, *expired)
+            pipeline.execute()
+
+    def size(self, backend: redis.Redis) -> int:
+        self.prune(backend)
+        return backend.zcard(self.lex_key)
+
+    @staticmethod
+    def _literal_prefix(pattern: str) -> str:
+        for i, c in enumerate(pattern):
+            if c in '*?[\\':
+                return pattern[:i]
+        return pattern
+
+    def match(self, backend: redis.Redis, pattern: str = None) -> list:
+        self.prune(backend)
+        pattern = pattern or f"{self.prefix}*"
+        literal = self._literal_prefix(pattern)
+        if literal:
+            start = b'[' + literal.encode()
+            end = b'(' + literal.encode() + b'\xff'
+        else:
+            start, end = '-', '+'
+        keys = backend.zrangebylex(self.lex_key, start, end)
+        if pattern == f"{literal}*":
+            return keys
+        return [k for k in keys if fnmatch.fnmatchcase(k.decode(), pattern)]
+
+
+class CacheInvalidationListener(object):
+    """
+    Listen to the Redis invalidation channel and evict the keys
+    modified by other processes from the local (L1) cache.
+    """
+
+    CHANNEL = f"{CACHE_PREFIX}invalidations"
+
+    def __init__(self, local_cache: LocalCache) -> None:
+        self.local_cache = local_cache
+        self.origin = f"{os.getpid()}-{id(self)}"
+        self._backend: redis.Redis = None
+        self._thread: threading.Thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def start(self, backend: redis.Redis):
+        with self._lock:
+            if self._backend is not backend:
+                self._backend = backend
+            if self.is_running():
+                return
+            # refresh the origin after a fork: threads don't survive it
+            self._pid = os.getpid()
+            self.origin = f"{self._pid}-{id(self)}"
+            self.local_cache.clear()
+            self._thread = threading.Thread(target=self._listen, name="cache-invalidation-listener", daemon=True)
+            self._thread.start()
+
+    def publish(self, pattern: str):
+        if self._backend is None:
+            return
+        try:
+            self._backend.publish(self.CHANNEL, f"{self.origin}|{pattern}")
+        except Exception as e:
+            logger.warning("Unable to publish cache invalidation for %r: %s", pattern, e)
+
+    def _listen(self):
+        while True:
+            pubsub = None
+            try:
+                pubsub = self._backend.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.CHANNEL)
+                logger.debug("Subscribed to the cache invalidation channel %r", self.CHANNEL)
+                for message in pubsub.listen():
+                    data = message.get('data')
+                    if isinstance(data, bytes):
+                        data = data.decode()
+                    origin, _, pattern = str(data).partition("|")
+                    if origin == self.origin:
+                        continue
+                    logger.debug("Invalidating local cache keys %r (origin: %r)", pattern, origin)
+                    self.local_cache.delete_keys(pattern)
+            except Exception as e:
+                # invalidations might have been lost: drop all the local data
+                logger.warning("Cache invalidation listener error: %s", e)
+                self.local_cache.clear()
+                time.sleep(1)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception as e:
+                        logger.debug(e)
+
+
 class CacheTransaction(object):
 
     _current_transaction = threading.local()
@@ -148,9 +505,9 @@ class CacheTransaction(object):
             yield self.__locks__[key]
         else:
             lock = redis_lock.Lock(self.cache.backend, key, expire=expire, auto_renewal=auto_renewal, id=self.name)
-            while not lock.acquire(blocking=False, timeout=timeout if timeout > 0 else None):
+            # blocking acquire: waiters are woken up by the lock signal as soon as the lock is released
+            while not lock.acquire(blocking=True, timeout=retry):
                 logger.debug("Waiting for lock key '%r'... (retry in %r secs)", lock, retry)
-                time.sleep(retry)
             logger.debug("Lock for key '%r' acquired: %r", key, lock.locked)
             self.__locks__[key] = lock
             logger.debug("Lock for key '%r' added to transaction %r: %r", key, self.name, self.has_lock(key))
@@ -193,8 +550,12 @@ class CacheTransaction(object):
                 pipeline = self.__cache__.backend.pipeline()
                 for k, data in self.__data__.items():
                     logger.debug(f"Setting key {k} on transaction pipeline (timeout: {data[1]}")
-                    pipeline.set(k, pickle.dumps(data[0]), ex=data[1] if data[1] > 0 else None)
+                    pipeline.set(k, self.__cache__._codec.encode(data[0]), ex=data[1] if data[1] > 0 else None)
+                    if k.startswith(CACHE_PREFIX):
+                        self.__cache__._key_index.add(pipeline, k, data[1])
                 pipeline.execute()
+                for k in self.__data__.keys():
+                    self.__cache__._invalidate_local(k)
                 logger.debug("Transaction finalized!")
                 for k in list(self.__locks__.keys()):
                     lk = self.__locks__.pop(k)
@@ -235,6 +596,23 @@ class Cache(object):
     _hash_function = None
     # Reference to the current app
     app: Flask = None
+    # Reference to the in-process (L1) cache
+    _local_cache: LocalCache = LocalCache()
+    # Reference to the listener of L1 invalidations
+    _invalidation_listener: CacheInvalidationListener = CacheInvalidationListener(_local_cache)
+    # Reference to the registry of cache keys
+    _key_index: CacheKeyIndex = CacheKeyIndex(CACHE_PREFIX)
+    # Number of keys removed by a single pipelined UNLINK
+    _delete_batch_size = 500
+    # Parameter of the XFetch early expiration (> 1.0 favours earlier refreshes)
+    _xfetch_beta = 1.0
+    # Max time (secs) to wait for the value computed by another worker
+    _fill_timeout = 60
+    # Reference to the codec of cache values
+    _codec: CacheCodec = CacheCodec()
+    # Counters of the Redis (L2) cache
+    _l2_hits = 0
+    _l2_misses = 0
 
     @classmethod
     def init_backend(cls, config):
@@ -250,6 +628,10 @@ class Cache(object):
             cls.cache_enabled = False
         return cls.__cache__
 
+    @classmethod
+    def is_initialized(cls) -> bool:
+        return cls.__cache__ is not None
+
     @classmethod
     def get_backend(cls) -> redis.Redis:
         if cls.__cache__ is None:
@@ -261,8 +643,17 @@ class Cache(object):
         cls.init_backend(app.config)
         cls.app = app
         cls._hash_function = cls.hash_function()
+        cls._codec = CacheCodec(compression=app.config.get("CACHE_COMPRESSION", 'zstd'),
+                                threshold=int(app.config.get("CACHE_COMPRESSION_THRESHOLD", 1024)))
+        cls._xfetch_beta = float(app.config.get("CACHE_XFETCH_BETA", 1.0))
+        cls._fill_timeout = int(app.config.get("CACHE_FILL_TIMEOUT", 60))
+        cls._delete_batch_size = max(1, int(app.config.get("CACHE_DELETE_BATCH_SIZE", 500)))
+        cls._local_cache.configure(max_size=app.config.get("CACHE_L1_MAX_SIZE", 1024),
+                                   timeout=app.config.get("CACHE_L1_TIMEOUT", 30))
         if cls.__cache__ is not None:
             cls.reset_locks()
+            if cls._local_cache.enabled:
+                cls._invalidation_listener.start(cls.__cache__)
 
     def __init__(self, parent: Cache = None) -> None:
         self._local = _current_transaction
@@ -271,9 +662,12 @@ class Cache(object):
     @classmethod
     def _make_key(cls, key: str, prefix: str = CACHE_PREFIX) -> str:
         if cls._hash_function:
-            parts = key.split("::")
+            # ETag keys share the hashed key of their value (plus the ETag suffix),
+            # so that they can be removed together with the value
+            suffix = CACHE_ETAG_SUFFIX if key.endswith(CACHE_ETAG_SUFFIX) else ''
+            parts = key[:len(key) - len(suffix)].split("::")
             if len(parts) > 1 and parts[1] != '*':
-                key = f"{parts[0]}::{cls._hash_function(parts[1].encode()).hexdigest()}"
+                key = f"{parts[0]}::{cls._hash_function(parts[1].encode()).hexdigest()}{suffix}"
         return f"{prefix}{key}"
 
     @classmethod
@@ -344,9 +738,11 @@ class Cache(object):
         else:
             query = f"{query}*"
         logger.debug("Keys pattern: %r", query)
-        return self.backend.keys(query)
+        return self._key_index.match(self.backend, query)
 
     def size(self, pattern=None):
+        if pattern is None:
+            return self._key_index.size(self.backend)
         return len(self.keys(pattern=pattern))
 
     def to_dict(self, pattern=None):
@@ -359,9 +755,9 @@ class Cache(object):
         logger.debug("Getting lock for key %r...", key)
         lock = redis_lock.Lock(self.backend, key, expire=expire, auto_renewal=auto_renewal)
         try:
-            while not lock.acquire(blocking=False, timeout=timeout if timeout > 0 else None):
+            # blocking acquire: waiters are woken up by the lock signal as soon as the lock is released
+            while not lock.acquire(blocking=True, timeout=retry):
                 logger.debug("Waiting to acquire the lock for '%r'... (retry in %r secs)", lock, retry)
-                time.sleep(retry)
             logger.debug(f"Lock for key '{key}' acquired: {lock.locked}")
             yield lock
         finally:
@@ -376,14 +772,43 @@ class Cache(object):
             except redis_lock.NotAcquired as e:
                 logger.debug(e)
 
+    @classmethod
+    def _local_cache_available(cls) -> bool:
+        if not cls._local_cache.enabled or cls.__cache__ is None:
+            return False
+        # (re)start the listener if needed (e.g., after a fork):
+        # without it the local cache might serve stale values
+        if not cls._invalidation_listener.is_running():
+            cls._invalidation_listener.start(cls.__cache__)
+        return True
+
+    @classmethod
+    def _invalidate_local(cls, key: str, pattern: bool = False):
+        if not cls._local_cache.enabled:
+            return
+        if pattern:
+            cls._local_cache.delete_keys(key)
+        else:
+            cls._local_cache.delete(key)
+        cls._invalidation_listener.publish(key)
+
     def set(self, key: str, value, timeout: int = Timeout.NONE, prefix: str = CACHE_PREFIX):
         if key is not None and self.cache_enabled:
             key = self._make_key(key, prefix=prefix)
             logger.debug("Setting cache value for key %r.... (timeout: %r)", key, timeout)
+            pipeline = self.backend.pipeline()
             if value is None:
-                self.backend.delete(key)
+                self._delete_value(pipeline, key, indexed=prefix == CACHE_PREFIX)
             else:
-                self.backend.set(key, pickle.dumps(value), ex=timeout if timeout > 0 else None)
+                expires_at = time.monotonic() + timeout if timeout > 0 else None
+                data = self._codec.encode(value)
+                pipeline.set(key, data, ex=timeout if timeout > 0 else None)
+                if prefix == CACHE_PREFIX:
+                    self._key_index.add(pipeline, key, timeout)
+                pipeline.execute()
+                self._invalidate_local(key)
+                if self._local_cache_available():
+                    self._local_cache.set(key, data, timeout=timeout, expires_at=expires_at)
 
     def has(self, key: str, prefix: str = CACHE_PREFIX) -> bool:
         return self.get(key, prefix=prefix) is not None
@@ -402,31 +827,152 @@ class Cache(object):
         logger.debug("Cache status: %r", self._get_status())
         if not self.cache_enabled or self.ignore_cache_values:
             return None
-        data = self.backend.get(self._make_key(key, prefix=prefix))
+        key = self._make_key(key, prefix=prefix)
+        use_local_cache = self._local_cache_available()
+        if use_local_cache:
+            data = self._local_cache.get(key)
+            if data is not None:
+                logger.debug("Reusing value of key %r from the local cache", key)
+                # decode a fresh copy: callers may mutate the returned value
+                return self._codec.decode(data)
+        # read the value and its TTL within a single round-trip
+        expires_at = None
+        if use_local_cache:
+            pipeline = self.backend.pipeline()
+            pipeline.get(key)
+            pipeline.pttl(key)
+            data, ttl = pipeline.execute()
+            if ttl is not None and ttl > 0:
+                expires_at = time.monotonic() + ttl / 1000
+        else:
+            data = self.backend.get(key)
         logger.debug("Current cache data: %r", data is not None)
-        return pickle.loads(data) if data is not None else data
+        if data is None:
+            Cache._l2_misses += 1
+            return None
+        Cache._l2_hits += 1
+        if use_local_cache:
+            self._local_cache.set(key, data, expires_at=expires_at)
+        return self._codec.decode(data)
 
     def delete(self, key: str, prefix: str = CACHE_PREFIX):
         logger.debug(f"Deleting key: {key}")
         if self.cache_enabled:
             logger.debug("Redis backend detected!")
             logger.debug(f"Pattern: {prefix}{key}")
-            self.backend.delete(self._make_key(key, prefix=prefix))
-
-    def delete_keys(self, pattern: str, prefix: str = CACHE_PREFIX):
+            key = self._make_key(key, prefix=prefix)
+            self._delete_value(self.backend.pipeline(), key, indexed=prefix == CACHE_PREFIX)
+
+    def _delete_value(self, pipeline, key: str, indexed: bool = True):
+        # remove the value together with its ETag (if any)
+        keys = [key] if key.endswith(CACHE_ETAG_SUFFIX) else [key, f"{key}{CACHE_ETAG_SUFFIX}"]
+        pipeline.delete(*keys)
+        if indexed:
+            self._key_index.remove(pipeline, *keys)
+        pipeline.execute()
+        for k in keys:
+            self._invalidate_local(k)
+
+    def delete_keys(self, pattern: str, prefix: str = CACHE_PREFIX) -> int:
         logger.debug(f"Deleting keys by pattern: {pattern}")
         if self.cache_enabled:
             logger.debug("Redis backend detected!")
             logger.debug(f"Pattern: {prefix}{pattern}")
-            for key in self.backend.scan_iter(self._make_key(pattern, prefix=prefix)):
-                logger.debug("Delete key: %r", key)
-                self.backend.delete(key)
+            pattern = self._make_key(pattern, prefix=prefix)
+            # keys of other namespaces (e.g., the task queue) are not indexed
+            indexed = prefix == CACHE_PREFIX
+            keys = self._key_index.match(self.backend, pattern) \
+                if indexed else self.backend.scan_iter(pattern, count=self._delete_batch_size)
+            count = self._unlink_keys(keys, indexed=indexed, pattern=pattern)
+            self._invalidate_local(pattern, pattern=True)
+            return count
+        return 0
+
+    def _unlink_keys(self, keys, indexed: bool = True, pattern: str = None) -> int:
+        """
+        Remove the given keys in batches of `_delete_batch_size` keys,
+        issuing a single pipelined `UNLINK` (which reclaims memory
+        in a background thread of the Redis server) per batch.
+        """
+        start = time.perf_counter()
+        count = 0
+        batches = 0
+        batch = []
+
+        def __flush__():
+            # ETags of the removed values are removed as well
+            etags = [f"{_}{CACHE_ETAG_SUFFIX}" for _ in batch if not _.endswith(CACHE_ETAG_SUFFIX)]
+            pipeline = self.backend.pipeline(transaction=False)
+            pipeline.unlink(*batch)
+            if etags:
+                pipeline.unlink(*etags)
+            if indexed:
+                self._key_index.remove(pipeline, *batch, *etags)
+            return pipeline.execute()[0]
+
+        for key in keys:
+            batch.append(key)
+            if len(batch) >= self._delete_batch_size:
+                count += __flush__()
+                batches += 1
+                batch.clear()
+        if batch:
+            count += __flush__()
+            batches += 1
+        logger.debug("Deleted %d keys matching %r in %d batches (%.3f ms)",
+                     count, pattern, batches, (time.perf_counter() - start) * 1000)
+        return count
 
     def clear(self):
-        for key in self.backend.scan_iter(f"{CACHE_PREFIX}*"):
-            self.backend.delete(key)
+        # SCAN also removes the keys written before the index was introduced
+        self._unlink_keys(self.backend.scan_iter(f"{CACHE_PREFIX}*", count=self._delete_batch_size),
+                          indexed=False, pattern=f"{CACHE_PREFIX}*")
+        pipeline = self.backend.pipeline()
+        self._key_index.clear(pipeline)
+        pipeline.execute()
+        self._invalidate_local(f"{CACHE_PREFIX}*", pattern=True)
         self.reset_locks()
 
+    @staticmethod
+    def _fill_signal_key(key: str) -> str:
+        return f"{CACHE_FILL_SIGNAL_PREFIX}{key}"
+
+    def reset_fill_signal(self, key: str):
+        self.backend.delete(self._fill_signal_key(key))
+
+    def notify_fill(self, key: str, expire: int = 5000):
+        signal = self._fill_signal_key(key)
+        pipeline = self.backend.pipeline()
+        pipeline.delete(signal)
+        pipeline.rpush(signal, 1)
+        pipeline.pexpire(signal, expire)
+        pipeline.execute()
+
+    def wait_fill(self, key: str, timeout: int = 1, expire: int = 5000) -> bool:
+        """
+        Block until the worker filling the value of `key` notifies its completion
+        (or `timeout` seconds elapse). The signal is passed on, so that
+        all the waiters are woken up by a single notification.
+        """
+        signal = self._fill_signal_key(key)
+        if not self.backend.blpop(signal, timeout=max(1, int(timeout))):
+            return False
+        pipeline = self.backend.pipeline()
+        pipeline.rpush(signal, 1)
+        pipeline.pexpire(signal, expire)
+        pipeline.execute()
+        return True
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "l1": cls._local_cache.stats(),
+            "l2": {
+                "hits": cls._l2_hits,
+                "misses": cls._l2_misses
+            }
+        }
+
     @classmethod
     def reset_locks(cls):
         redis_lock.reset_all(cls.get_backend())
@@ -436,6 +982,31 @@ class Cache(object):
 cache: Cache = Cache()
 
 
+def make_etag(value) -> str:
+    """
+    Return a strong ETag of a (cacheable) `value`.
+    """
+    return hashlib.sha1(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+
+
+def _etag_key(key: str) -> str:
+    # the ETag is stored next to the value (see `Cache._make_key`):
+    # deleting the value also deletes its ETag
+    return f"{key}{CACHE_ETAG_SUFFIX}"
+
+
+def set_response_etag(response):
+    """
+    Set the ETag of the cached value returned by the current request (if any)
+    and reply with `304 Not Modified` when it matches the `If-None-Match` header.
+    """
+    etag = g.get('cache_etag', None)
+    if etag and request.method == 'GET' and response.status_code == 200:
+        response.set_etag(etag)
+        response = response.make_conditional(request)
+    return response
+
+
 def init_cache(app: Flask):
     cache_type = app.config.get(
         'CACHE_TYPE',
@@ -493,23 +1064,26 @@ def make_cache_key(func=None, client_scope=True, args=None, kwargs=None) -> str:
     return result
 
 
-def clear_cache(func=None, client_scope=True, prefix=CACHE_PREFIX, *args, **kwargs):
+def clear_cache(func=None, client_scope=True, prefix=CACHE_PREFIX, *args, **kwargs) -> int:
+    count = 0
     try:
         if func:
             key = make_cache_key(func, client_scope)
-            cache.delete_keys(f"{key}*")
+            count += cache.delete_keys(f"{key}*")
             if args or kwargs:
                 key = make_cache_key(func, client_scope=client_scope, args=args, kwargs=kwargs)
-                cache.delete_keys(f"{key}*", prefix=prefix)
+                count += cache.delete_keys(f"{key}*", prefix=prefix)
         else:
             key = make_cache_key(client_scope=client_scope)
-            cache.delete_keys(f"{key}*", prefix=prefix)
+            count += cache.delete_keys(f"{key}*", prefix=prefix)
     except Exception as e:
         logger.error("Error deleting cache: %r", e)
+    return count
 
 
 def _process_cache_data(cache, transaction, key, unless, timeout,
-                        read_from_cache, write_to_cache, function, args, kwargs):
+                        read_from_cache, write_to_cache, function, args, kwargs,
+                        stale_while_revalidate: int = 0, etag: bool = False):
     # check parameters
     assert read_from_cache or transaction, "Unable to read from transaction: transaction is None"
     assert write_to_cache or transaction, "Unable to write to transaction: transaction is None"
@@ -517,30 +1091,73 @@ def _process_cache_data(cache, transaction, key, unless, timeout,
     reader = cache if read_from_cache else transaction
     writer = cache if write_to_cache else transaction
     # get/set data
-    result = reader.get(key)
+    result = _unwrap(reader.get(key))
     if result is None:
         logger.debug(f"Value {key} not set in cache...")
-        with cache.lock(key, timeout=Timeout.NONE):
-            result = reader.get(key)
-            if not result:
-                logger.debug("Cache empty: getting value from the actual function...")
-                result = function(*args, **kwargs)
-                logger.debug("Checking unless function: %r", unless)
-                if unless is None or unless is False or callable(unless) and not unless(*args, _value_to_cache=result, **kwargs):
-                    writer.set(key, result, timeout=timeout)
-                else:
-                    logger.debug("Don't set value in cache due to unless=%r",
-                                 "None" if unless is None else "True")
+        lock = redis_lock.Lock(cache.backend, key, expire=15, auto_renewal=True)
+        deadline = time.monotonic() + cache._fill_timeout
+        while result is None:
+            if lock.acquire(blocking=False):
+                # this worker fills the cache: the others wait for its notification
+                try:
+                    cache.reset_fill_signal(key)
+                    result = _unwrap(reader.get(key))
+                    if not result:
+                        result = _compute_cache_data(writer, key, unless, timeout, function, args, kwargs,
+                                                     stale_while_revalidate=stale_while_revalidate,
+                                                     etag=etag)
+                finally:
+                    try:
+                        lock.release()
+                    except redis_lock.NotAcquired as e:
+                        logger.debug(e)
+                    cache.notify_fill(key)
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning("Timeout waiting for the value of key %r: computing it", _log_key_value(key))
+                result = _compute_cache_data(writer, key, unless, timeout, function, args, kwargs,
+                                             stale_while_revalidate=stale_while_revalidate,
+                                             etag=etag)
+                break
+            logger.debug("Waiting for the value of key %r filled by another worker...", _log_key_value(key))
+            cache.wait_fill(key, timeout=min(1, remaining))
+            result = _unwrap(reader.get(key))
     else:
         logger.debug(f"Reusing value from cache key '{key}'...")
     return result
 
 
+def _compute_cache_data(writer, key, unless, timeout, function, args, kwargs,
+                        stale_while_revalidate: int = 0, etag: bool = False):
+    logger.debug("Cache empty: getting value from the actual function...")
+    start = time.time()
+    result = function(*args, **kwargs)
+    logger.debug("Checking unless function: %r", unless)
+    if unless is None or unless is False or callable(unless) and not unless(*args, _value_to_cache=result, **kwargs):
+        if stale_while_revalidate > 0 and result is not None:
+            # keep the value for `stale_while_revalidate` secs after its soft expiration
+            end = time.time()
+            writer.set(key, CacheEntry(result, end + timeout, end - start),
+                       timeout=timeout + stale_while_revalidate)
+        else:
+            writer.set(key, result, timeout=timeout)
+        if etag and result is not None:
+            # store the ETag next to the value, with the same expiration
+            writer.set(_etag_key(key), make_etag(result), timeout=timeout)
+    else:
+        logger.debug("Don't set value in cache due to unless=%r",
+                     "None" if unless is None else "True")
+    return result
+
+
 def cache_function(function: Callable, timeout=Timeout.REQUEST,
                    client_scope=True,
                    unless: Union[bool, Callable, None] = None,
                    transactional_update: Union[bool, Callable, None] = False,
                    force_cache_value: Union[bool, Callable, None] = False,
+                   stale_while_revalidate: int = 0,
+                   conditional: bool = False,
                    args=(), kwargs={}):
     logger.debug("Args: %r", args)
     logger.debug("KwArgs: %r", kwargs)
@@ -551,6 +1168,14 @@ def cache_function(function: Callable, timeout=Timeout.REQUEST,
     if hc and hc.cache_enabled:
         # compute cache key
         key = make_cache_key(function, client_scope, args=args, kwargs=kwargs)
+        # answer conditional requests of unchanged values without computing them
+        conditional = conditional and has_request_context() and request.method == 'GET'
+        if conditional and request.if_none_match:
+            etag = hc.get(_etag_key(key))
+            if etag and etag in request.if_none_match:
+                logger.debug("Value of key %r not modified (etag: %r)", _log_key_value(key), etag)
+                g.cache_etag = etag
+                return Response(status=304, headers={"ETag": f'"{etag}"'})
         # retrieve the current transaction (might be None)
         transaction = hc.get_current_transaction()
         logger.debug("Current transaction: %r", transaction)
@@ -558,7 +1183,7 @@ def cache_function(function: Callable, timeout=Timeout.REQUEST,
         use_cache_value = force_cache_value
         current_cache_value = None
         if force_cache_value and callable(force_cache_value):
-            current_cache_value = cache.get(key)
+            current_cache_value = _unwrap(cache.get(key))
             if current_cache_value:
                 use_cache_value = force_cache_value(current_cache_value)
             else:
@@ -566,11 +1191,15 @@ def cache_function(function: Callable, timeout=Timeout.REQUEST,
         if use_cache_value:
             logger.debug("Using current cache value: %r", current_cache_value)
             result = current_cache_value
+        elif stale_while_revalidate > 0 and transaction is None:
+            logger.debug("Getting value from cache (stale-while-revalidate)")
+            result = _process_stale_cache_data(cache, key, unless, timeout, stale_while_revalidate,
+                                               function, args, kwargs)
         else:
             # decide whether to skip the transactional update
             skip_transaction = transaction is None
             if transactional_update and callable(transactional_update):
-                current_value = transaction.get(key) if transaction else None or cache.get(key)
+                current_value = _unwrap(transaction.get(key) if transaction else None or cache.get(key))
                 logger.debug("Transaction uodate callable: %r", transactional_update)
                 if current_value:
                     skip_transaction = not transactional_update(current_value)
@@ -586,21 +1215,116 @@ def cache_function(function: Callable, timeout=Timeout.REQUEST,
                     result = _process_cache_data(cache, transaction,
                                                  key, unless, timeout,
                                                  read_from_cache, False,
-                                                 function, args, kwargs)
+                                                 function, args, kwargs,
+                                                 stale_while_revalidate=stale_while_revalidate)
             else:
                 logger.debug("Getting value from cache")
                 result = _process_cache_data(cache, transaction, key, unless, timeout,
-                                             True, True, function, args, kwargs)
+                                             True, True, function, args, kwargs,
+                                             etag=conditional)
+        if conditional and result is not None and 'cache_etag' not in g:
+            g.cache_etag = hc.get(_etag_key(key)) or make_etag(result)
     else:
         logger.debug("Cache disabled: getting value from the actual function...")
         result = function(*args, **kwargs)
     return result
 
 
+def _process_stale_cache_data(cache, key, unless, timeout, stale_while_revalidate,
+                              function, args, kwargs):
+    entry = cache.get(key)
+    if entry is None:
+        return _process_cache_data(cache, None, key, unless, timeout, True, True,
+                                   function, args, kwargs,
+                                   stale_while_revalidate=stale_while_revalidate)
+    if not isinstance(entry, CacheEntry):
+        # value written without soft expiration: fresh until its hard expiration
+        return entry
+    if entry.should_refresh(cache._xfetch_beta):
+        logger.debug("Value of key %r %s: refreshing it in background", _log_key_value(key),
+                     "stale" if entry.is_stale() else "close to expire")
+        _schedule_cache_refresh(cache, function, key, args, kwargs, stale_while_revalidate)
+    return entry.value
+
+
+def model_reference(value):
+    '''Replace a model instance with a (marker, class, primary key) reference;
+    any other value is returned as it is'''
+    state = sqlalchemy_inspect(value, raiseerr=False)
+    if state is None or not hasattr(state, 'identity'):
+        return value
+    if state.identity is None:
+        raise ValueError(f"Unable to reference the unsaved instance {value!r}")
+    model = type(value)
+    return (MODEL_REFERENCE_MARKER, f"{model.__module__}:{model.__qualname__}", state.identity)
+
+
+def _schedule_cache_refresh(cache, function, key, args, kwargs, stale_while_revalidate):
+    # only one refresh per key at time
+    if not cache.backend.set(f"{CACHE_REFRESH_PREFIX}{key}", 1, nx=True, ex=max(1, stale_while_revalidate)):
+        logger.debug("Refresh of key %r already scheduled", _log_key_value(key))
+        return
+    try:
+        import dramatiq
+        # send references to the model instances, to be reloaded by the worker
+        args = tuple(model_reference(_) for _ in args)
+        kwargs = {k: model_reference(v) for k, v in kwargs.items()}
+        payload = base64.b64encode(cache._codec.encode((args, kwargs))).decode()
+        function_name = f"{function.__module__}:{function.__qualname__}"
+        # enqueue the message directly: jobs run through the scheduler share
+        # a single job ID and would replace the pending refreshes of other keys
+        scheduler = getattr(current_app, 'scheduler', None)
+        actor = scheduler.get_deferred_job('refreshCacheEntry') if scheduler is not None else None
+        if actor is None:
+            actor = dramatiq.get_broker().get_actor('refreshCacheEntry')
+        actor.send(function_name, key, payload)
+        logger.debug("Refresh of key %r scheduled", _log_key_value(key))
+    except Exception as e:
+        logger.error("Unable to schedule the refresh of key %r: %s", _log_key_value(key), e)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.exception(e)
+        cache.backend.delete(f"{CACHE_REFRESH_PREFIX}{key}")
+
+
+def refresh_cache_entry(function_name: str, key: str, args=(), kwargs=None):
+    """
+    Recompute the value of the cache entry `key` by calling the @cached function
+    `function_name` (i.e., "<module>:<qualified name>") with the given arguments.
+    """
+    module_name, qualname = function_name.split(":")
+    target = importlib.import_module(module_name)
+    for name in qualname.split("."):
+        target = getattr(target, name)
+    refresh = getattr(target, 'refresh', None)
+    if refresh is None:
+        raise ValueError(f"Function {function_name} doesn't support stale-while-revalidate")
+    return refresh(key, *args, **(kwargs or {}))
+
+
 def cached(timeout=Timeout.REQUEST, client_scope=True,
            unless: Union[bool, Callable, None] = None,
            transactional_update: Union[bool, Callable, None] = False,
-           force_cache_value: Union[bool, Callable, None] = False):
+           force_cache_value: Union[bool, Callable, None] = False,
+           stale_while_revalidate: int = 0,
+           conditional: bool = False):
+    """
+    Cache the value returned by the decorated function.
+
+    When `conditional` is set, the decorated function is expected to be the view
+    of a GET request: a strong ETag of its value is stored next to the value,
+    set on the response and requests with a matching `If-None-Match` header
+    are answered with `304 Not Modified` without recomputing the value.
+
+    When `stale_while_revalidate` is greater than zero, the value is kept in cache
+    for `stale_while_revalidate` secs after its `timeout`: within that window the
+    stale value is served while a single background job recomputes it.
+    Refreshes are also started, with a probability increasing as the expiration
+    approaches, before the value gets stale (XFetch), so that they spread out.
+    Values of client scoped functions can't be refreshed in background.
+    """
+    assert not stale_while_revalidate or (timeout > 0 and not client_scope), \
+        "stale_while_revalidate requires a timeout and client_scope=False"
+
     def decorator(function):
 
         @functools.wraps(function)
@@ -609,8 +1333,19 @@ def cached(timeout=Timeout.REQUEST, client_scope=True,
                                   client_scope=client_scope, unless=unless,
                                   transactional_update=transactional_update,
                                   force_cache_value=force_cache_value,
+                                  stale_while_revalidate=stale_while_revalidate,
+                                  conditional=conditional,
                                   args=args, kwargs=kwargs)
 
+        if stale_while_revalidate:
+            def refresh(key, *args, **kwargs):
+                try:
+                    return _compute_cache_data(cache, key, unless, timeout, function, args, kwargs,
+                                               stale_while_revalidate=stale_while_revalidate)
+                finally:
+                    cache.backend.delete(f"{CACHE_REFRESH_PREFIX}{key}")
+            wrapper.refresh = refresh
+
         return wrapper
     return decorator
 
@@ -0,0 +1,282 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional
+
+from flask import current_app, has_app_context
+
+from lifemonitor.storage import RemoteStorage
+
+# set module level logger
+logger = logging.getLogger(__name__)
+
+# default size (MB) of the disk quota reserved to the local RO-Crate archives
+DEFAULT_CRATE_STORE_QUOTA = 10240
+
+# name of the index database within the store folder
+INDEX_FILENAME = ".crates.sqlite"
+
+# size of the blocks read to hash archives
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def _file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class LocalCrateStore():
+    '''
+    Local store of RO-Crate archives.
+
+    Archives are addressed by their path relative to the store folder
+    and tracked by a persistent SQLite index (digest, size and last access),
+    which answers existence checks without touching the filesystem or the remote storage.
+    New archives are staged next to their final location and published by an atomic rename;
+    the least recently used ones are evicted when their total size exceeds the disk quota.
+    Only archives marked as uploaded, i.e., with a copy on the remote storage, can be evicted:
+    eviction is disabled altogether when the store is created with `eviction=False`.
+    The index is reconciled with the archives on disk whenever the store is created,
+    checking on the remote `storage` (if any) which of them are already uploaded.
+    '''
+
+    def __init__(self, base_path: str, quota: int = DEFAULT_CRATE_STORE_QUOTA, eviction: bool = True,
+                 storage: Optional[RemoteStorage] = None) -> None:
+        self.base_path = os.path.abspath(base_path)
+        self.quota = quota * 1024 * 1024
+        self.eviction = eviction
+        self.storage = storage
+        self.index_path = os.path.join(self.base_path, INDEX_FILENAME)
+        os.makedirs(self.base_path, exist_ok=True)
+        with self._index() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS crates ("
+                       "key TEXT PRIMARY KEY, digest TEXT, size INTEGER NOT NULL, last_access REAL NOT NULL, "
+                       "uploaded INTEGER NOT NULL DEFAULT 0)")
+            columns = {row[1] for row in db.execute("PRAGMA table_info(crates)")}
+            if 'uploaded' not in columns:
+                # upgrade indexes created before the uploaded flag was tracked
+                db.execute("ALTER TABLE crates ADD COLUMN uploaded INTEGER NOT NULL DEFAULT 0")
+        self.sync()
+        self.evict()
+
+    @contextlib.contextmanager
+    def _index(self) -> Iterator[sqlite3.Connection]:
+        db = sqlite3.connect(self.index_path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.base_path, key)
+
+    def key(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.base_path)
+
+    def info(self, key: str) -> Optional[Dict]:
+        with self._index() as db:
+            row = db.execute("SELECT digest, size, last_access, uploaded FROM crates WHERE key = ?",
+                             (key,)).fetchone()
+        if not row:
+            return None
+        return {'key': key, 'path': self.path(key), 'digest': row[0], 'size': row[1], 'last_access': row[2],
+                'uploaded': bool(row[3])}
+
+    def contains(self, key: str) -> bool:
+        return self.info(key) is not None
+
+    def get(self, key: str) -> Optional[str]:
+        '''Return the local path of the archive `key` and record its access; None if it is not stored'''
+        with self._index() as db:
+            found = db.execute("UPDATE crates SET last_access = ? WHERE key = ?", (time.time(), key)).rowcount > 0
+        if not found:
+            return None
+        path = self.path(key)
+        if not os.path.isfile(path):
+            # the archive has been removed behind the store: drop it from the index
+            logger.debug("Archive %r not found on disk: removing it from the index", key)
+            self._drop(key)
+            return None
+        return path
+
+    def digest(self, key: str) -> Optional[str]:
+        info = self.info(key)
+        if not info:
+            return None
+        if not info['digest']:
+            digest = _file_digest(info['path'])
+            with self._index() as db:
+                db.execute("UPDATE crates SET digest = ? WHERE key = ?", (digest, key))
+            return digest
+        return info['digest']
+
+    def staging_path(self, key: str) -> str:
+        '''Return a temporary path, on the same filesystem of the archive `key`, to write it before publishing'''
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        return os.path.join(os.path.dirname(target), f".{uuid.uuid4().hex}.zip")
+
+    def publish(self, key: str, source_path: str, digest: Optional[str] = None, uploaded: bool = False) -> str:
+        '''Atomically move the archive at `source_path` to the store as `key`;
+        `uploaded` tells whether the archive is already available on the remote storage'''
+        target = self.path(key)
+        staged = source_path
+        if os.path.dirname(os.path.abspath(source_path)) != os.path.dirname(target):
+            # rename is atomic only within the same filesystem: stage a copy next to the target
+            staged = self.staging_path(key)
+            shutil.copyfile(source_path, staged)
+        try:
+            size = os.path.getsize(staged)
+            digest = digest or _file_digest(staged)
+            os.replace(staged, target)
+        except Exception:
+            if staged != source_path and os.path.exists(staged):
+                os.remove(staged)
+            raise
+        with self._index() as db:
+            db.execute("INSERT OR REPLACE INTO crates (key, digest, size, last_access, uploaded) "
+                       "VALUES (?, ?, ?, ?, ?)", (key, digest, size, time.time(), int(uploaded)))
+        logger.debug("Archive %r published to the local store", key)
+        self.evict(keep=key)
+        return target
+
+    def mark_uploaded(self, key: str) -> bool:
+        '''Record that the archive `key` has been stored on the remote storage, making it evictable'''
+        with self._index() as db:
+            found = db.execute("UPDATE crates SET uploaded = 1 WHERE key = ?", (key,)).rowcount > 0
+        if found:
+            logger.debug("Archive %r marked as uploaded", key)
+        return found
+
+    def remove(self, key: str):
+        self._drop(key)
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def _drop(self, key: str):
+        with self._index() as db:
+            db.execute("DELETE FROM crates WHERE key = ?", (key,))
+
+    def entries(self) -> List[Dict]:
+        with self._index() as db:
+            rows = db.execute("SELECT key, digest, size, last_access, uploaded FROM crates "
+                              "ORDER BY last_access").fetchall()
+        return [{'key': r[0], 'path': self.path(r[0]), 'digest': r[1], 'size': r[2], 'last_access': r[3],
+                 'uploaded': bool(r[4])} for r in rows]
+
+    def _is_uploaded(self, key: str, size: int) -> bool:
+        if self.storage is None:
+            return False
+        try:
+            info = self.storage.get_file_info(key)
+        except Exception as e:
+            logger.warning("Unable to check the remote copy of the archive %r: %s", key, e)
+            return False
+        return info is not None and info['size'] == size
+
+    def sync(self) -> int:
+        '''Reconcile the index with the archives on disk:
+        the unknown archives are indexed, using their mtime as last access,
+        the missing ones are removed and those with a remote copy are marked as uploaded'''
+        entries = {e['key']: e for e in self.entries()}
+        found, missing, uploaded = [], [], []
+        for root, _, files in os.walk(self.base_path):
+            for name in files:
+                if name.startswith('.') or not name.endswith('.zip'):
+                    continue
+                path = os.path.join(root, name)
+                key = self.key(path)
+                entry = entries.pop(key, None)
+                if entry is None:
+                    stat = os.stat(path)
+                    # digests are computed lazily
+                    found.append((key, None, stat.st_size, stat.st_mtime,
+                                  int(self._is_uploaded(key, stat.st_size))))
+                elif not entry['uploaded'] and self._is_uploaded(key, entry['size']):
+                    uploaded.append((key,))
+        missing = [(key,) for key in entries]
+        with self._index() as db:
+            db.executemany("INSERT OR IGNORE INTO crates (key, digest, size, last_access, uploaded) "
+                           "VALUES (?, ?, ?, ?, ?)", found)
+            db.executemany("DELETE FROM crates WHERE key = ?", missing)
+            db.executemany("UPDATE crates SET uploaded = 1 WHERE key = ?", uploaded)
+        logger.debug("Local store synced: %d archives added, %d removed, %d marked as uploaded",
+                     len(found), len(missing), len(uploaded))
+        return len(found)
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        '''Remove the least recently used archives until the store fits the disk quota,
+        skipping those not yet available on the remote storage'''
+        if not self.eviction:
+            return []
+        entries = self.entries()
+        total = sum(e['size'] for e in entries)
+        evicted = []
+        for entry in entries:
+            if total <= self.quota:
+                break
+            if entry['key'] == keep or not entry['uploaded']:
+                continue
+            # archives already opened by readers remain readable after removal
+            self.remove(entry['key'])
+            total -= entry['size']
+            evicted.append(entry['key'])
+            logger.debug("Archive %r evicted from the local store", entry['key'])
+        return evicted
+
+
+__stores__: Dict[str, LocalCrateStore] = {}
+__stores_lock__ = threading.Lock()
+
+
+def get_crate_store() -> LocalCrateStore:
+    '''Return the local crate store rooted at the DATA_WORKFLOWS folder of the current app;
+    archives are evicted only if the remote storage is enabled'''
+    config = current_app.config if has_app_context() else {}
+    base_path = os.path.abspath(config.get('DATA_WORKFLOWS', '/data_workflows'))
+    quota = int(config.get('CRATE_STORE_QUOTA', os.environ.get('CRATE_STORE_QUOTA', DEFAULT_CRATE_STORE_QUOTA)))
+    with __stores_lock__:
+        store = __stores__.get(base_path)
+        if store is None:
+            storage = RemoteStorage(current_app) if has_app_context() else None
+            if storage is None or not storage.enabled:
+                logger.warning("Remote storage not enabled: local RO-Crate archives will never be evicted")
+                storage = None
+            store = __stores__[base_path] = LocalCrateStore(base_path, quota=quota,
+                                                            eviction=storage is not None, storage=storage)
+        return store
@@ -38,6 +38,7 @@ from lifemonitor.api.models import WorkflowRegistry
 from lifemonitor.api.models.registries.settings import RegistrySettings
 from lifemonitor.api.models.repositories.config import WorkflowRepositoryConfig
 from lifemonitor.api.models.repositories.github import GithubWorkflowRepository
+from lifemonitor.api.models.services.github import GithubTestBuild
 from lifemonitor.api.models.testsuites.testinstance import TestInstance
 from lifemonitor.api.models.wizards import QuestionStep, UpdateStep
 from lifemonitor.api.models.workflows import WorkflowVersion
@@ -53,9 +54,9 @@ from lifemonitor.integrations.github.settings import GithubUserSettings
 from lifemonitor.integrations.github.utils import delete_branch
 from lifemonitor.integrations.github.wizards import GithubWizard
 from lifemonitor.tasks import Scheduler
-from lifemonitor.utils import (bool_from_string, get_git_repo_revision,
-                               match_ref)
+from lifemonitor.utils import bool_from_string, match_ref
 
+from . import refs as git_refs
 from . import services
 
 # Config a module level logger
@@ -78,9 +79,6 @@ def refresh_workflow_builds(event: GithubEvent):
         repo_info = event.repository_reference
         logger.debug("Repo reference: %r", repo_info)
 
-        repo: GithubWorkflowRepository = repo_info.repository
-        logger.debug("Repository: %r", repo)
-
         github_workflow = event.workflow
         logger.debug("Github Workflow: %r (name: %s, path: %s)",
                      github_workflow, github_workflow.name, github_workflow.path)
@@ -88,14 +86,13 @@ def refresh_workflow_builds(event: GithubEvent):
         github_workflow_run = event.workflow_run
         logger.debug("Github Workflow: %r", github_workflow_run)
 
-        repo_revision = get_git_repo_revision(repo.local_repo.local_path, github_workflow_run.raw_data['head_sha'])
-        refs = [_['ref'].split('/')[-1] for _ in repo_revision['refs']]
+        refs = git_refs.resolve_refs(event, token=installation.auth.token)
         logger.debug("REFS: %r", refs)
 
         workflow_name = github_workflow.path.replace('.github/workflows/', '')
         logger.debug("Workflow NAME: %r", workflow_name)
 
-        workflow_resource = f"repos/{repo.full_name}/actions/workflows/{workflow_name}"
+        workflow_resource = f"repos/{repo_info.full_name}/actions/workflows/{workflow_name}"
         logger.debug("Workflow Resource: %r", workflow_resource)
         instances = TestInstance.find_by_resource(workflow_resource)
         logger.debug("Instances: %r", instances)
@@ -105,7 +102,15 @@ def refresh_workflow_builds(event: GithubEvent):
                 workflow_version = i.test_suite.workflow_version
                 if workflow_version.version in refs or (not workflow_version.has_revision() and not workflow_version.next_version):
                     logger.warning("Version %r to uodate", workflow_version)
-                    i.get_test_build(f"{github_workflow_run.id}_{github_workflow_run.raw_data['run_attempt']}")
+                    # store the build state carried by the event and refresh the list of builds
+                    build = GithubTestBuild(i.testing_service, i, github_workflow_run)
+                    if i.has_fresh_build_states():
+                        i.update_build_states([build])
+                    else:
+                        i.reconcile_build_states(limit=10)
+                    i.invalidate_test_build(build.id)
+                    i.testing_service.invalidate_newest_run_id(i)
+                    i.get_test_builds(limit=10)
                     i.test_suite.workflow_version.status
                 else:
                     logger.warning("Skipping instance %r not bound to the current branch or tag", i)
@@ -131,11 +136,7 @@ def refresh_workflow_build(event: GithubEvent):
         workflow_job = event._raw_data.get('workflow_job', None)
         logger.debug("workflow job: %r", workflow_job)
 
-        repo: GithubWorkflowRepository = repo_info.repository
-        logger.debug("Repository: %r", repo)
-
-        repo_revision = get_git_repo_revision(repo.local_repo.local_path, workflow_job['head_sha'])
-        refs = [_['ref'].split('/')[-1] for _ in repo_revision['refs']]
+        refs = git_refs.resolve_refs(event, token=installation.auth.token)
         logger.debug("REFS: %r", refs)
 
         github_workflow_run = event.workflow_run
@@ -148,7 +149,7 @@ def refresh_workflow_build(event: GithubEvent):
         logger.debug("Workflow build ID: %r", build_id)
 
         if build_id:
-            workflow_resource = f"repos/{repo.full_name}/actions/workflows/{workflow_name}"
+            workflow_resource = f"repos/{repo_info.full_name}/actions/workflows/{workflow_name}"
             logger.debug("Workflow Resource: %r", workflow_resource)
             instances = TestInstance.find_by_resource(workflow_resource)
             logger.debug("Instances: %r", instances)
@@ -162,7 +163,11 @@ def refresh_workflow_build(event: GithubEvent):
                     if workflow_version.version in refs or not workflow_version.has_revision():
                         logger.warning("Version %s in refs %r", i.test_suite.workflow_version.version, refs)
                         last_build_id = f"{github_workflow_run.id}_{github_workflow_run.raw_data['run_attempt']}"
-                        i.get_test_build(last_build_id)
+                        i.invalidate_test_build(last_build_id)
+                        build = i.get_test_build(last_build_id)
+                        if build:
+                            i.update_build_states([build])
+                        i.get_test_builds(limit=10)
                         i.test_suite.workflow_version.status
                         logger.info("Version %s updated... last build: %s", i.test_suite.workflow_version.version, last_build_id)
                     else:
@@ -401,6 +406,7 @@ def __check_for_issues_and_register__(repo_info: GithubRepositoryReference,
 
 def create(event: GithubEvent):
     logger.debug("Create event: %r", event)
+    git_refs.update_refs(event)
 
     installation = event.installation
 
@@ -441,6 +447,7 @@ def create(event: GithubEvent):
 
 def delete(event: GithubEvent):
     logger.debug("Delete event: %r", event)
+    git_refs.update_refs(event)
 
     installation = event.installation
 
@@ -483,6 +490,7 @@ def delete(event: GithubEvent):
 def push(event: GithubEvent):
     try:
         logger.debug("Push event: %r", event)
+        git_refs.update_refs(event)
         logger.debug("Event ref: %r", event.repository_reference.branch or event.repository_reference.tag)
 
         installation = event.installation
@@ -0,0 +1,151 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import annotations
+
+import logging
+from typing import Dict, Iterator, List, Optional
+
+import requests
+
+from lifemonitor.integrations.github.config import DEFAULT_TIMEOUT
+from lifemonitor.integrations.github.events import GithubEvent
+from lifemonitor.redis import get_connection
+
+# Config a module level logger
+logger = logging.getLogger(__name__)
+
+# prefix of the Redis hashes mapping the refs of a repository to their commit SHA
+REFS_KEY_PREFIX = "lifemonitor-github-refs:"
+
+# max age (secs) of a ref map: it bounds the staleness due to missed events
+REFS_TIMEOUT = 3600
+
+# SHA of the deleted refs on push events
+NULL_SHA = '0' * 40
+
+# update the ref map only if it has already been loaded:
+# a partial map would hide the refs not notified yet
+__SET_REF_SCRIPT__ = """
+if redis.call('exists', KEYS[1]) == 1 then
+    redis.call('hset', KEYS[1], ARGV[1], ARGV[2])
+end
+"""
+
+
+def _refs_key(repo_full_name: str) -> str:
+    return f"{REFS_KEY_PREFIX}{repo_full_name}"
+
+
+def _pkt_lines(data: bytes) -> Iterator[bytes]:
+    pos = 0
+    while pos + 4 <= len(data):
+        length = int(data[pos:pos + 4], 16)
+        if length == 0:
+            pos += 4
+            continue
+        yield data[pos + 4:pos + length]
+        pos += length
+
+
+def ls_remote(clone_url: str, token: Optional[str] = None, timeout: int = DEFAULT_TIMEOUT) -> Dict[str, str]:
+    '''Return the map ref -> commit SHA advertised by the remote repository at `clone_url`'''
+    response = requests.get(f"{clone_url.rstrip('/')}/info/refs", params={'service': 'git-upload-pack'},
+                            auth=('x-access-token', token) if token else None, timeout=timeout)
+    response.raise_for_status()
+    refs = {}
+    for line in _pkt_lines(response.content):
+        line = line.split(b'\0')[0].strip().decode()
+        if line.startswith('#') or ' ' not in line:
+            continue
+        sha, ref = line.split(' ', 1)
+        # peeled annotated tags point to the tagged commit
+        if ref.endswith('^{}'):
+            refs[ref[:-3]] = sha
+        elif ref.startswith('refs/heads/') or ref.startswith('refs/tags/'):
+            refs.setdefault(ref, sha)
+    logger.debug("Refs of %r: %r", clone_url, refs)
+    return refs
+
+
+def get_refs(repo_full_name: str, clone_url: str, token: Optional[str] = None) -> Dict[str, str]:
+    '''Return the map ref -> commit SHA of a repository, loading it by ls-remote when not cached'''
+    connection = get_connection()
+    key = _refs_key(repo_full_name)
+    refs = {k.decode(): v.decode() for k, v in connection.hgetall(key).items()}
+    if not refs:
+        refs = ls_remote(clone_url, token=token)
+        if refs:
+            pipeline = connection.pipeline()
+            pipeline.hset(key, mapping=refs)
+            pipeline.expire(key, REFS_TIMEOUT)
+            pipeline.execute()
+    return refs
+
+
+def update_refs(event: GithubEvent) -> None:
+    '''Apply to the cached ref map of the event repository the changes notified by `push`, `create` and `delete` events'''
+    try:
+        payload = event.payload
+        key = _refs_key(payload['repository']['full_name'])
+        connection = get_connection()
+        if event.type == 'push':
+            ref, sha = payload['ref'], payload.get('after')
+            if payload.get('deleted', False) or sha == NULL_SHA:
+                connection.hdel(key, ref)
+            else:
+                connection.eval(__SET_REF_SCRIPT__, 1, key, ref, sha)
+        elif event.type in ('create', 'delete'):
+            ref = f"refs/{'tags' if payload.get('ref_type') == 'tag' else 'heads'}/{payload['ref']}"
+            if event.type == 'delete':
+                connection.hdel(key, ref)
+            # `create` events do not carry the SHA: reload the map
+            # unless the ref has already been notified by a `push` event
+            elif not connection.hexists(key, ref):
+                connection.delete(key)
+        else:
+            return
+        logger.debug("Ref map of %r updated by the %r event", payload['repository']['full_name'], event.type)
+    except Exception as e:
+        logger.warning("Unable to update the ref map: %s", e)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.exception(e)
+
+
+def resolve_refs(event: GithubEvent, token: Optional[str] = None) -> List[str]:
+    '''
+    Return the names of the branches and tags pointing to the commit of
+    a `workflow_run` or `workflow_job` event, without cloning the repository
+    '''
+    payload = event.payload
+    run = payload.get('workflow_run') or payload.get('workflow_job') or {}
+    head_sha, head_branch = run.get('head_sha'), run.get('head_branch')
+    refs = [head_branch] if head_branch else []
+    try:
+        repo = payload['repository']
+        for ref, sha in get_refs(repo['full_name'], repo['clone_url'], token=token).items():
+            name = ref.split('/')[-1]
+            if sha == head_sha and name not in refs:
+                refs.append(name)
+    except Exception as e:
+        logger.warning("Unable to resolve the refs of the commit %r: %s", head_sha, e)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.exception(e)
+    return refs
@@ -20,8 +20,10 @@
 
 from __future__ import annotations
 
+import hashlib
 import logging
 import re
+import urllib.parse
 from typing import (Any, Callable, Dict, List, Optional, OrderedDict, Tuple,
                     Type, Union)
 
@@ -34,7 +36,7 @@ from github.PaginatedList import PaginatedList
 from github.Repository import Repository
 from github.Requester import Requester
 
-from lifemonitor.cache import Timeout, cache_function
+from lifemonitor.cache import Timeout, cache, cache_function
 from lifemonitor.integrations.github.config import (DEFAULT_BASE_URL,
                                                     DEFAULT_PER_PAGE,
                                                     DEFAULT_TIMEOUT)
@@ -183,7 +185,8 @@ class GithubApiWrapper(github.Github):
     ):
         super().__init__(login_or_token, password, jwt, base_url, timeout,
                          user_agent, per_page, verify, retry, pool_size)  # type: ignore
-        self.__requester = CachedGithubRequester(
+        # replace the requester created by the base class
+        self._Github__requester = CachedGithubRequester(
             login_or_token,
             password,
             jwt,
@@ -208,18 +211,63 @@ def __cache_request_value__(requester, verb: str, url: str, *args,
     return False
 
 
+# The revalidation of cached responses relies on private members of the PyGithub Requester
+# (available in the PyGithub release pinned in requirements.txt): plain requests are
+# sent when they are missing
+__revalidation_supported__ = all(hasattr(Requester, _) for _ in ('_Requester__check',
+                                                                 '_Requester__customConnection'))
+if not __revalidation_supported__:
+    logger.warning("Unsupported PyGithub release: responses of the Github API will not be cached")
+
+
 class CachedGithubRequester(Requester):
 
     """
     Extend the default Github Requester to enable caching.
+
+    Responses of GET requests are stored in cache together with their
+    `ETag` and `Last-Modified` validators, which are sent back
+    (as `If-None-Match` and `If-Modified-Since`) when the same resource is requested again.
+    The cached response is reused when GitHub replies with `304 Not Modified`,
+    which doesn't count against the API rate limit.
+    Responses are cached per credentials, since their validators vary with the `Authorization` header.
     """
 
-    # @cached(timeout=Timeout.NONE, client_scope=False, transactional_update=True, unless=__cache_request_value__)
+    def __make_revalidation_key__(self, url: str, parameters: Optional[Dict[str, Any]] = None) -> str:
+        query = urllib.parse.urlencode(sorted((parameters or {}).items()))
+        authorization = getattr(self, '_Requester__authorizationHeader', None)
+        auth_digest = hashlib.sha256(authorization.encode()).hexdigest()[:16] if authorization else 'anonymous'
+        return f"github-revalidation::{auth_digest} GET {url}?{query}"
+
     def requestJsonAndCheck(self, verb: str, url: str,
                             parameters: Optional[Dict[str, Any]] = None,
                             headers: Optional[Dict[str, str]] = None,
                             input: Optional[Any] = None) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
-        return super().requestJsonAndCheck(verb, url, parameters, headers, input)
+        if verb.upper() != "GET" or input is not None or not __revalidation_supported__ \
+                or not cache.cache_enabled or not cache.is_initialized():
+            return super().requestJsonAndCheck(verb, url, parameters, headers, input)
+        key = self.__make_revalidation_key__(url, parameters)
+        cached_response = cache.get(key)
+        request_headers = dict(headers or {})
+        if cached_response:
+            if cached_response.get('etag'):
+                request_headers['If-None-Match'] = cached_response['etag']
+            if cached_response.get('last-modified'):
+                request_headers['If-Modified-Since'] = cached_response['last-modified']
+        status, response_headers, output = self.requestJson(
+            verb, url, parameters, request_headers, input, self._Requester__customConnection(url))
+        if status == 304 and cached_response:
+            logger.debug("Resource %r not modified: reusing cached response", url)
+            return cached_response['headers'], cached_response['data']
+        response_headers, data = self._Requester__check(status, response_headers, output)
+        if status == 200 and ('etag' in response_headers or 'last-modified' in response_headers):
+            cache.set(key, {
+                'etag': response_headers.get('etag'),
+                'last-modified': response_headers.get('last-modified'),
+                'headers': response_headers,
+                'data': data
+            }, timeout=Timeout.SESSION)
+        return response_headers, data
 
     # @cached(timeout=Timeout.NONE, client_scope=False, transactional_update=True, unless=__cache_request_value__)
     def requestMultipartAndCheck(self, verb: str, url: str,
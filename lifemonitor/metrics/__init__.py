@@ -28,7 +28,7 @@ from prometheus_flask_exporter import PrometheusMetrics
 import lifemonitor.metrics.controller as controller
 from lifemonitor import __version__ as version
 
-from . import model, services
+from . import model, services, stats
 
 # Config a module level logger
 logger = logging.getLogger(__name__)
@@ -71,6 +71,7 @@ def init_metrics(app, prom_registry=None):
     app_version.info({'version': version})
 
     # Initialize metrics
+    stats.init_stats()
     services.update_stats()
 
 
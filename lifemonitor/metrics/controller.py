@@ -25,7 +25,7 @@ import logging
 from flask import Blueprint, Flask
 from lifemonitor.auth.services import authorized_by_session_or_apikey
 
-import lifemonitor.metrics.model as stats
+import lifemonitor.metrics.stats as stats
 from lifemonitor.metrics.model import get_metric_key
 
 #
@@ -36,18 +36,19 @@ logger = logging.getLogger(__name__)
 def update_stats() -> bool:
     logger.debug("Updating global metrics...")
     try:
+        counts = stats.get_counts()
         # number of users
-        users.set(stats.users())
+        users.set(counts['users'])
         # number of workflows
-        workflows.set(stats.workflows())
+        workflows.set(counts['workflows'])
         # number of workflow versions
-        workflow_versions.set(stats.workflow_versions())
+        workflow_versions.set(counts['workflow_versions'])
         # number of workflow registries
-        workflow_registries.set(stats.workflow_registries())
+        workflow_registries.set(counts['workflow_registries'])
         # number of workflow suites
-        workflow_suites.set(stats.workflow_suites())
+        workflow_suites.set(counts['workflow_suites'])
         # number of workflow test instances
-        workflow_test_instances.set(stats.workflow_test_instances())
+        workflow_test_instances.set(counts['workflow_test_instances'])
         logger.debug("Updating global metrics... DONE")
         return True
     except Exception as e:
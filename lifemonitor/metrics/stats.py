@@ -18,13 +18,24 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+
 from __future__ import annotations
 
 import logging
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Optional
+
+from flask import current_app
+from redis import WatchError
+from sqlalchemy import bindparam, event, func, literal, select, text, union_all
+from sqlalchemy.orm import Session
 
 from lifemonitor.api.models import (TestInstance, TestSuite, Workflow,
                                     WorkflowRegistry, WorkflowVersion)
 from lifemonitor.auth.models import User
+from lifemonitor.db import db
+from lifemonitor.redis import get_connection
 
 #
 logger = logging.getLogger(__name__)
@@ -32,26 +43,175 @@ logger = logging.getLogger(__name__)
 # Set the global prefix for LifeMonitor metrics
 PREFIX = "lifemonitor"
 
+# Redis hash of the current counts
+STATS_KEY = "lifemonitor-stats:counts"
+# field of the hash with the time of the last full recount
+STATS_UPDATED_FIELD = "_updated"
+# key of the session info collecting the count deltas of a transaction
+STATS_DELTAS_INFO = "lifemonitor_stats_deltas"
+
+# default max age (secs) of the counts before a full recount
+DEFAULT_RECOUNT_INTERVAL = 600
+# default number of rows above which the row estimates of PostgreSQL are used
+DEFAULT_ESTIMATE_THRESHOLD = 100000
+# max number of attempts to store a recount not interleaved with count deltas
+MAX_RECOUNT_ATTEMPTS = 3
+
+# counted entities
+COUNTED_MODELS = {
+    'users': User,
+    'workflows': Workflow,
+    'workflow_versions': WorkflowVersion,
+    'workflow_registries': WorkflowRegistry,
+    'workflow_suites': TestSuite,
+    'workflow_test_instances': TestInstance
+}
+
+
+def _get_config(name: str, default: int) -> int:
+    try:
+        return int(current_app.config.get(name, default))
+    except RuntimeError:
+        return default
+
+
+def _estimate_rows(names: Iterable[str]) -> Dict[str, int]:
+    # row estimates maintained by PostgreSQL (i.e., by VACUUM and ANALYZE)
+    tables = {COUNTED_MODELS[n].__table__.name: n for n in names}
+    query = text("SELECT relname, reltuples FROM pg_class "
+                 "WHERE relkind = 'r' AND pg_table_is_visible(oid) AND relname IN :tables")\
+        .bindparams(bindparam('tables', expanding=True))
+    return {tables[relname]: int(reltuples)
+            for relname, reltuples in db.session.execute(query, {'tables': list(tables)})}
+
+
+def count_rows(names: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """
+    Count the entities `names` (all the counted ones by default)
+    with a single grouped query.
+    """
+    names = list(names or COUNTED_MODELS)
+    counts = {}
+    threshold = _get_config("STATS_ESTIMATE_THRESHOLD", DEFAULT_ESTIMATE_THRESHOLD)
+    if threshold > 0 and db.engine.dialect.name == 'postgresql':
+        # large tables are not scanned: their estimates are used instead
+        counts = {n: c for n, c in _estimate_rows(names).items() if c >= threshold}
+    to_count = [n for n in names if n not in counts]
+    if len(to_count) > 0:
+        query = union_all(*[
+            select(literal(n).label('name'), func.count().label('count'))
+            .select_from(COUNTED_MODELS[n].__table__) for n in to_count
+        ])
+        counts.update({n: c for n, c in db.session.execute(query)})
+    logger.debug("Counted rows: %r (estimated: %r)", counts, [n for n in names if n not in to_count])
+    return counts
+
+
+def recount() -> Dict[str, int]:
+    """
+    Count all the entities and store the counts as the current ones.
+
+    The counts hash is watched while counting: if a delta is published in the meantime,
+    the new counts are discarded and the entities are counted again,
+    so that the delta is neither lost nor applied twice.
+    """
+    with get_connection().pipeline() as pipeline:
+        for attempt in range(1, MAX_RECOUNT_ATTEMPTS + 1):
+            try:
+                pipeline.watch(STATS_KEY)
+                counts = count_rows()
+                pipeline.multi()
+                # overwrite the counts with a single command
+                pipeline.hset(STATS_KEY, mapping={**counts, STATS_UPDATED_FIELD: time.time()})
+                pipeline.execute()
+                return counts
+            except WatchError:
+                logger.debug("Counts updated during the recount (attempt %d)", attempt)
+            finally:
+                pipeline.reset()
+    # the counts are not stored: the next read will count the entities again
+    logger.warning("Unable to store the counts: too many concurrent updates")
+    return counts
+
+
+def get_counts(max_age: Optional[int] = None) -> Dict[str, int]:
+    """
+    Return the current counts of entities.
+
+    The counts are kept up to date by the deltas of the committed transactions:
+    the entities are counted again only when the counts are older than `max_age` secs
+    (i.e., `STATS_RECOUNT_INTERVAL`), to fix the drift of changes not tracked by the ORM.
+    """
+    if max_age is None:
+        max_age = _get_config("STATS_RECOUNT_INTERVAL", DEFAULT_RECOUNT_INTERVAL)
+    data = {k.decode(): v for k, v in get_connection().hgetall(STATS_KEY).items()}
+    updated = float(data.get(STATS_UPDATED_FIELD, 0))
+    if time.time() - updated > max_age or any(n not in data for n in COUNTED_MODELS):
+        return recount()
+    return {n: max(0, int(data[n])) for n in COUNTED_MODELS}
+
+
+def _counted_names(obj) -> Iterable[str]:
+    return (n for n, model in COUNTED_MODELS.items() if isinstance(obj, model))
+
+
+def _track_flush(session: Session, flush_context):
+    deltas = session.info.setdefault(STATS_DELTAS_INFO, defaultdict(int))
+    for obj in session.new:
+        for n in _counted_names(obj):
+            deltas[n] += 1
+    for obj in session.deleted:
+        for n in _counted_names(obj):
+            deltas[n] -= 1
+
+
+def _publish_deltas(session: Session):
+    deltas = {n: d for n, d in session.info.pop(STATS_DELTAS_INFO, {}).items() if d != 0}
+    if len(deltas) > 0:
+        try:
+            pipeline = get_connection().pipeline()
+            for n, d in deltas.items():
+                pipeline.hincrby(STATS_KEY, n, d)
+            pipeline.execute()
+            logger.debug("Published count deltas: %r", deltas)
+        except Exception as e:
+            # the next recount will fix the counts
+            logger.warning("Unable to publish count deltas: %s", e)
+
+
+def _discard_deltas(session: Session):
+    session.info.pop(STATS_DELTAS_INFO, None)
+
+
+def init_stats():
+    """
+    Track the count deltas of the committed transactions.
+    """
+    if not event.contains(Session, 'after_flush', _track_flush):
+        event.listen(Session, 'after_flush', _track_flush)
+        event.listen(Session, 'after_commit', _publish_deltas)
+        event.listen(Session, 'after_rollback', _discard_deltas)
+
 
 def users():
-    return len(User.all())
+    return get_counts()['users']
 
 
 def workflows():
-    return len(Workflow.all())
+    return get_counts()['workflows']
 
 
 def workflow_versions():
-    return len(WorkflowVersion.all())
+    return get_counts()['workflow_versions']
 
 
 def workflow_registries():
-    return len(WorkflowRegistry.all())
+    return get_counts()['workflow_registries']
 
 
 def workflow_suites():
-    return len(TestSuite.all())
+    return get_counts()['workflow_suites']
 
 
 def workflow_test_instances():
-    return len(TestInstance.all())
+    return get_counts()['workflow_test_instances']
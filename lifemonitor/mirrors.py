@@ -0,0 +1,314 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import annotations
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse, urlunparse
+
+import pygit2
+from flask import current_app, has_app_context
+
+# set module level logger
+logger = logging.getLogger(__name__)
+
+# mirror refspecs: branches and tags are kept as they are on the remote
+MIRROR_REFSPECS = ['+refs/heads/*:refs/heads/*', '+refs/tags/*:refs/tags/*']
+
+# default size (MB) of the disk quota reserved to the mirrors
+DEFAULT_MIRRORS_QUOTA = 2048
+
+# max age (secs) of the fetches recorded to skip the redundant ones
+FETCH_RECORD_TTL = 600
+
+# max number of attempts to clone a mirror evicted in the meantime
+MAX_CLONE_ATTEMPTS = 3
+
+
+def _split_credentials(url: str) -> Tuple[str, Optional[Tuple[str, str]]]:
+    '''Return the URL without its userinfo and the (user, password) pair it contains, if any'''
+    parsed = urlparse(url)
+    if not parsed.scheme or not (parsed.username or parsed.password):
+        return url, None
+    netloc = parsed.hostname or ''
+    if parsed.port:
+        netloc = f"{netloc}:{parsed.port}"
+    return urlunparse(parsed._replace(netloc=netloc)), (parsed.username or 'x-access-token', parsed.password or '')
+
+
+def _dir_size(path: str) -> int:
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return size
+
+
+class GitMirrorStore():
+    '''
+    Local store of bare mirrors of remote git repositories.
+
+    Every remote URL is mirrored once and kept up to date by incremental fetches;
+    working copies are materialized as local clones of the mirror,
+    which hard-link the mirror objects instead of downloading them again.
+    Mirrors are locked per repository: exclusively while they are updated or evicted,
+    shared while they are cloned, so that concurrent clones of the same mirror don't wait for each other
+    and the mirrors being cloned are never evicted.
+    A clone skips the fetch when another one, with the same credentials, has fetched the mirror
+    after the clone was requested: that fetch already includes the remote state at request time.
+    Mirrors are evicted in least recently used order when their total size exceeds the disk quota.
+    The size of every mirror is measured after each fetch and persisted next to it,
+    so that the eviction doesn't need to walk the mirrors.
+    '''
+
+    def __init__(self, base_path: str, quota: int = DEFAULT_MIRRORS_QUOTA) -> None:
+        self.base_path = base_path
+        self.quota = quota * 1024 * 1024
+        os.makedirs(base_path, exist_ok=True)
+
+    def mirror_path(self, url: str) -> str:
+        clean_url, _ = _split_credentials(url)
+        return os.path.join(self.base_path, hashlib.sha1(clean_url.encode()).hexdigest() + '.git')
+
+    @staticmethod
+    def _lock_path(mirror_path: str) -> str:
+        return f"{mirror_path}.lock"
+
+    @staticmethod
+    def _size_path(mirror_path: str) -> str:
+        return f"{mirror_path}.size"
+
+    @staticmethod
+    def _fetches_path(mirror_path: str) -> str:
+        return f"{mirror_path}.fetches"
+
+    @staticmethod
+    def _credentials_key(url: str, auth_token: Optional[str] = None) -> str:
+        _, credentials = _split_credentials(url)
+        secret = auth_token or (':'.join(credentials) if credentials else None)
+        return hashlib.sha256(secret.encode()).hexdigest() if secret else 'anonymous'
+
+    def _read_fetches(self, mirror_path: str) -> Dict[str, float]:
+        try:
+            with open(self._fetches_path(mirror_path)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_fetch(self, mirror_path: str, credentials_key: str, started: float):
+        # record the start time of the last fetch of every set of credentials
+        fetches = {k: t for k, t in self._read_fetches(mirror_path).items() if t > started - FETCH_RECORD_TTL}
+        fetches[credentials_key] = started
+        tmp_path = f"{self._fetches_path(mirror_path)}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(fetches, f)
+        os.replace(tmp_path, self._fetches_path(mirror_path))
+
+    def _write_size(self, mirror_path: str) -> int:
+        size = _dir_size(mirror_path)
+        tmp_path = f"{self._size_path(mirror_path)}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(size))
+        os.replace(tmp_path, self._size_path(mirror_path))
+        return size
+
+    def _read_size(self, mirror_path: str) -> int:
+        try:
+            with open(self._size_path(mirror_path)) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            # mirrors created before sizes were persisted
+            return self._write_size(mirror_path)
+
+    @contextlib.contextmanager
+    def _lock(self, mirror_path: str, exclusive: bool = False, blocking: bool = True) -> Iterator[bool]:
+        with open(self._lock_path(mirror_path), 'a') as lock_file:
+            flags = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+            try:
+                fcntl.flock(lock_file.fileno(), flags if blocking else flags | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _touch(self, mirror_path: str):
+        # the mtime of the lock file tracks the last use of the mirror
+        try:
+            os.utime(self._lock_path(mirror_path))
+        except OSError:
+            pass
+
+    @staticmethod
+    def _callbacks(url: str, auth_token: Optional[str] = None) -> Optional[pygit2.RemoteCallbacks]:
+        _, credentials = _split_credentials(url)
+        if auth_token:
+            credentials = ('x-access-token', auth_token)
+        return pygit2.RemoteCallbacks(pygit2.UserPass(*credentials)) if credentials else None
+
+    def update(self, url: str, auth_token: Optional[str] = None) -> str:
+        '''Create or incrementally update the mirror of `url` and return its path'''
+        mirror_path = self.mirror_path(url)
+        with self._lock(mirror_path, exclusive=True):
+            self._update(url, mirror_path, auth_token=auth_token)
+        return mirror_path
+
+    def _update(self, url: str, mirror_path: str, auth_token: Optional[str] = None,
+                requested: Optional[float] = None):
+        # to be called holding the exclusive lock of the mirror
+        clean_url, _ = _split_credentials(url)
+        credentials_key = self._credentials_key(url, auth_token)
+        created = not os.path.isdir(mirror_path)
+        if requested is not None and not created \
+                and self._read_fetches(mirror_path).get(credentials_key, 0) >= requested:
+            logger.debug("Mirror of %r fetched after the request: fetch skipped", clean_url)
+            self._touch(mirror_path)
+            return
+        callbacks = self._callbacks(url, auth_token)
+        started = time.time()
+        try:
+            if created:
+                logger.debug("Creating mirror of %r in %r", clean_url, mirror_path)
+                repo = pygit2.init_repository(mirror_path, bare=True)
+                repo.remotes.create('origin', clean_url, MIRROR_REFSPECS[0])
+                for refspec in MIRROR_REFSPECS[1:]:
+                    repo.remotes.add_fetch('origin', refspec)
+            else:
+                repo = pygit2.Repository(mirror_path)
+            remote = repo.remotes['origin']
+            # always fetch: besides updating the mirror, a successful fetch
+            # verifies that the given credentials grant access to the remote
+            remote.fetch(callbacks=callbacks, prune=pygit2.enums.FetchPrune.PRUNE)
+            logger.debug("Mirror of %r updated", clean_url)
+            if created or repo.references.get(repo.references['HEAD'].target) is None:
+                self._update_head(repo, remote, callbacks)
+        except Exception:
+            if created:
+                shutil.rmtree(mirror_path, ignore_errors=True)
+            raise
+        self._write_fetch(mirror_path, credentials_key, started)
+        self._write_size(mirror_path)
+        self._touch(mirror_path)
+
+    @staticmethod
+    def _update_head(repo: pygit2.Repository, remote: pygit2.Remote, callbacks: Optional[pygit2.RemoteCallbacks]):
+        for head in remote.ls_remotes(callbacks=callbacks):
+            if head['name'] == 'HEAD' and head.get('symref_target'):
+                repo.references.create('HEAD', head['symref_target'], force=True)
+                logger.debug("Default branch of the mirror set to %r", head['symref_target'])
+                return
+        # the remote does not advertise its default branch: fall back to the first one available
+        branches = sorted(repo.branches.local, key=lambda b: b not in ('main', 'master'))
+        if branches:
+            repo.references.create('HEAD', f'refs/heads/{branches[0]}', force=True)
+
+    def clone(self, url: str, target_path: str, auth_token: Optional[str] = None) -> pygit2.Repository:
+        '''Materialize a working copy of `url` in `target_path` from its (updated) mirror'''
+        clean_url, _ = _split_credentials(url)
+        mirror_path = self.mirror_path(url)
+        requested = time.time()
+        for attempt in range(1, MAX_CLONE_ATTEMPTS + 1):
+            with self._lock(mirror_path, exclusive=True):
+                self._update(url, mirror_path, auth_token=auth_token, requested=requested)
+            # the shared lock keeps the mirror from being evicted while it is cloned
+            with self._lock(mirror_path):
+                if os.path.isdir(mirror_path):
+                    # libgit2 clones local repositories by hard-linking their object files
+                    clone = pygit2.clone_repository(mirror_path, target_path)
+                    clone.remotes.set_url('origin', clean_url)
+                    break
+            logger.debug("Mirror of %r evicted before being cloned (attempt %d)", clean_url, attempt)
+        else:
+            raise RuntimeError(f"Unable to clone the mirror of {clean_url}: evicted while cloning")
+        logger.debug("Working copy of %r materialized in %r", clean_url, target_path)
+        self.evict(keep=mirror_path)
+        return clone
+
+    def mirrors(self) -> List[Dict]:
+        result = []
+        for name in os.listdir(self.base_path):
+            path = os.path.join(self.base_path, name)
+            if name.endswith('.git') and os.path.isdir(path):
+                try:
+                    last_use = os.stat(self._lock_path(path)).st_mtime
+                except OSError:
+                    last_use = 0
+                result.append({'path': path, 'last_use': last_use, 'size': self._read_size(path)})
+        return result
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        '''Remove the least recently used mirrors until the store fits the disk quota'''
+        mirrors = self.mirrors()
+        total = sum(m['size'] for m in mirrors)
+        evicted = []
+        for mirror in sorted(mirrors, key=lambda m: m['last_use']):
+            if total <= self.quota:
+                break
+            if mirror['path'] == keep:
+                continue
+            with self._lock(mirror['path'], exclusive=True, blocking=False) as locked:
+                # skip the mirrors in use
+                if not locked:
+                    continue
+                shutil.rmtree(mirror['path'], ignore_errors=True)
+                for path in (self._size_path(mirror['path']), self._fetches_path(mirror['path'])):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            total -= mirror['size']
+            evicted.append(mirror['path'])
+            logger.debug("Mirror %r evicted", mirror['path'])
+        return evicted
+
+
+__stores__: Dict[str, GitMirrorStore] = {}
+__stores_lock__ = threading.Lock()
+
+
+def get_mirror_store() -> Optional[GitMirrorStore]:
+    '''Return the mirror store configured for the current app; None if mirrors are disabled'''
+    from lifemonitor.config import BaseConfig
+    from lifemonitor.utils import boolean_value
+    config = current_app.config if has_app_context() else {}
+    if not boolean_value(config.get('GIT_MIRRORS_ENABLED', os.environ.get('GIT_MIRRORS_ENABLED', True))):
+        return None
+    default_path = os.environ.get('GIT_MIRRORS_PATH', f"{BaseConfig.BASE_TEMP_FOLDER}/git_mirrors")
+    base_path = config.get('GIT_MIRRORS_PATH', default_path)
+    quota = int(config.get('GIT_MIRRORS_QUOTA', os.environ.get('GIT_MIRRORS_QUOTA', DEFAULT_MIRRORS_QUOTA)))
+    with __stores_lock__:
+        store = __stores__.get(base_path)
+        if store is None:
+            store = __stores__[base_path] = GitMirrorStore(base_path, quota=quota)
+        return store
@@ -36,6 +36,9 @@ from lifemonitor.tasks.scheduler import Scheduler
 # set module level logger
 logger = logging.getLogger(__name__)
 
+# default validity (secs) of the presigned URLs of the stored objects
+DEFAULT_PRESIGNED_URL_EXPIRATION = 300
+
 
 def check_config(func):
     @functools.wraps(func)
@@ -56,6 +59,7 @@ class RemoteStorage():
     __client = None
     _config = None
     _bucket_name = None
+    _presigned_url_expiration = DEFAULT_PRESIGNED_URL_EXPIRATION
 
     def __init__(self, app: Flask = None, config: Optional[Dict] = None) -> None:
         self.app = app = app or current_app
@@ -67,6 +71,8 @@ class RemoteStorage():
                 'bucket_name': app.config.get('S3_BUCKET', 'lifemonitor-bucket')
             }
             self._bucket_name = self._config.pop('bucket_name')
+            self._presigned_url_expiration = int(app.config.get('S3_PRESIGNED_URL_EXPIRATION',
+                                                                DEFAULT_PRESIGNED_URL_EXPIRATION))
             self._enabled = True
 
         except KeyError as e:
@@ -117,6 +123,33 @@ class RemoteStorage():
                 return False
         return False
 
+    @check_config
+    def get_file_info(self, remote_path: str) -> Optional[Dict]:
+        '''Return size and ETag of the object at `remote_path`; None if the object does not exist'''
+        try:
+            info = self._client.head_object(Bucket=self.bucket_name, Key=remote_path)
+            return {'size': info['ContentLength'], 'etag': info['ETag'].strip('"')}
+        except botocore.exceptions.ClientError as e:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.exception(e)
+        return None
+
+    @check_config
+    def get_presigned_url(self, remote_path: str, expiration: Optional[int] = None,
+                          filename: Optional[str] = None) -> Optional[str]:
+        '''Return a URL granting a time-limited read access to the object at `remote_path`'''
+        params = {'Bucket': self.bucket_name, 'Key': remote_path}
+        if filename:
+            params['ResponseContentDisposition'] = f'attachment; filename={filename}'
+        try:
+            return self._client.generate_presigned_url('get_object', Params=params,
+                                                       ExpiresIn=expiration or self._presigned_url_expiration)
+        except botocore.exceptions.ClientError as e:
+            logger.error("Unable to generate a presigned URL for %r: %s", remote_path, e)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.exception(e)
+        return None
+
     @check_config
     def get_file(self, remote_path: str, local_path: str) -> bool:
         os.makedirs(os.path.dirname(local_path), exist_ok=True)
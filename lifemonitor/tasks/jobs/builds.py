@@ -22,13 +22,19 @@ import datetime
 import logging
 import time
 
+import dramatiq
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
+from dramatiq.rate_limits import ConcurrentRateLimiter
+from dramatiq.rate_limits.backends import RedisBackend as RateLimiterBackend
+from flask import current_app
 from lifemonitor.api.models.notifications import WorkflowStatusNotification
 from lifemonitor.api.models.testsuites.testbuild import BuildStatus, TestBuild
+from lifemonitor.api.models.testsuites.testinstance import TestInstance
 from lifemonitor.api.serializers import BuildSummarySchema
 from lifemonitor.auth.models import (EventType, Notification)
 from lifemonitor.cache import Timeout
+from lifemonitor.redis import get_connection
 from lifemonitor.tasks.scheduler import TASK_EXPIRATION_TIME, schedule
 from lifemonitor.utils import notify_workflow_version_updates
 
@@ -76,54 +82,126 @@ def check_workflows():
     logger.info("Starting 'check_workflows' task.... DONE!")
 
 
+# prefix of the keys used to deduplicate the per-instance build checks
+BUILD_CHECK_PREFIX = "lifemonitor-build-check:"
+# prefix of the counters used as completion barrier of the per-version notifications
+BUILD_CHECK_BARRIER_PREFIX = "lifemonitor-build-check-barrier:"
+# max number of concurrent build checks per testing service
+BUILD_CHECK_CONCURRENCY = 4
+# max duration (secs) of a sweep of build checks, i.e., the sweep interval
+BUILD_CHECK_TIMEOUT = int(Timeout.BUILD * 3 / 4)
+# TTL (secs) of the pending checks and of their barriers:
+# longer than the max age of the check messages, which always release them
+BUILD_CHECK_BARRIER_TTL = BUILD_CHECK_TIMEOUT * 2
+
+
+def _check_instance_builds(i: TestInstance):
+    workflow_version = i.test_suite.workflow_version
+    # instances with a recent webhook-fed state don't need to be reconciled
+    reconcile = not i.has_fresh_build_states()
+    if reconcile:
+        i.reconcile_build_states(limit=10)
+    with i.cache.transaction(str(i)):
+        builds = i.get_test_builds(limit=10)
+        logger.info("Updating latest builds: %r", builds)
+        if reconcile:
+            for b in builds:
+                logger.info("Updating build: %r", i.get_test_build(b.id))
+        i.save()
+        last_build = i.last_test_build
+        logger.debug("Latest build: %r", last_build)
+
+        # check state transition
+        if last_build:
+            logger.debug("Latest build status: %r", last_build.status)
+            failed = last_build.status == BuildStatus.FAILED
+            if len(builds) == 1 or \
+                    builds[0].status in (BuildStatus.FAILED, BuildStatus.PASSED) and \
+                    builds[1].status in (BuildStatus.FAILED, BuildStatus.PASSED) and \
+                    len(builds) > 1 and builds[1].status != last_build.status:
+                logger.error("Updating latest build: %r", last_build)
+                notification_name = f"{last_build} {'FAILED' if failed else 'RECOVERED'}"
+                if len(Notification.find_by_name(notification_name)) == 0:
+                    users = workflow_version.workflow.get_subscribers()
+                    n = WorkflowStatusNotification(
+                        EventType.BUILD_FAILED if failed else EventType.BUILD_RECOVERED,
+                        notification_name,
+                        {'build': BuildSummarySchema(exclude_nested=False).dump(last_build)},
+                        users)
+                    n.save()
+
+
+def _notify_workflow_version(workflow_version):
+    # save workflow version and notify updates
+    workflow_version.save()
+    # materialize the updated status
+    logger.debug("Updated status of %r: %r", workflow_version, workflow_version.status.aggregated_status)
+    notify_workflow_version_updates([workflow_version], type='sync')
+
+
+def _get_build_check_actor():
+    # fan out the build checks only when running on a worker:
+    # otherwise, instances are checked inline
+    if not current_app.config.get("WORKER", False):
+        return None
+    try:
+        return dramatiq.get_broker().get_actor('checkInstanceBuilds')
+    except Exception as e:
+        logger.debug("Actor 'checkInstanceBuilds' not available: %s", e)
+        return None
+
+
+def _enqueue_build_checks(actor, workflow_version) -> int:
+    connection = get_connection()
+    barrier = f"{BUILD_CHECK_BARRIER_PREFIX}{workflow_version.id}"
+    instances = []
+    for s in workflow_version.test_suites:
+        for i in s.test_instances:
+            # skip instances with a pending check
+            if connection.set(f"{BUILD_CHECK_PREFIX}{i.uuid}", 1, nx=True, ex=BUILD_CHECK_BARRIER_TTL):
+                instances.append(i)
+            else:
+                logger.debug("Build check of %r already queued", i)
+    if len(instances) > 0:
+        with connection.pipeline() as pipeline:
+            pipeline.incrby(barrier, len(instances))
+            pipeline.expire(barrier, BUILD_CHECK_BARRIER_TTL)
+            pipeline.execute()
+        for i in instances:
+            # dropped messages (i.e., expired or out of retries) are released by the failure callback
+            actor.send_with_options(args=(str(i.uuid), workflow_version.id),
+                                    on_failure='releaseInstanceBuildCheck')
+    logger.debug("Enqueued %d build checks for %r", len(instances), workflow_version)
+    return len(instances)
+
+
 @schedule(trigger=IntervalTrigger(seconds=Timeout.BUILD * 3 / 4),
           queue_name='builds', options={'max_retries': 3, 'max_age': TASK_EXPIRATION_TIME})
 def check_last_build():
     from lifemonitor.api.models import Workflow
 
     logger.info("Starting 'check_last build' task...")
+    actor = _get_build_check_actor()
     for w in Workflow.all():
         try:
             for workflow_version in w.versions.values():
                 if workflow_version and len(workflow_version.github_versions) > 0:
                     logger.warning("Workflow skipped because updated via github app")
                     continue
+                logger.info("Updating workflow: %r", w)
+                if actor is not None:
+                    # the notification is sent by the last completed check
+                    _enqueue_build_checks(actor, workflow_version)
+                    continue
                 for s in workflow_version.test_suites:
-                    logger.info("Updating workflow: %r", w)
                     for i in s.test_instances:
-                        # old_builds = i.get_test_builds(limit=10)
-                        with i.cache.transaction(str(i)):
-                            builds = i.get_test_builds(limit=10)
-                            logger.info("Updating latest builds: %r", builds)
-                            for b in builds:
-                                logger.info("Updating build: %r", i.get_test_build(b.id))
-                            i.save(commit=False, flush=False)
-                            workflow_version.save()
-                            notify_workflow_version_updates([workflow_version], type='sync')
-                            last_build = i.last_test_build
-                            logger.debug("Latest build: %r", last_build)
-
-                            # check state transition
-                            if last_build:
-                                logger.debug("Latest build status: %r", last_build.status)
-                                failed = last_build.status == BuildStatus.FAILED
-                                if len(builds) == 1 or \
-                                        builds[0].status in (BuildStatus.FAILED, BuildStatus.PASSED) and \
-                                        builds[1].status in (BuildStatus.FAILED, BuildStatus.PASSED) and \
-                                        len(builds) > 1 and builds[1].status != last_build.status:
-                                    logger.error("Updating latest build: %r", last_build)
-                                    notification_name = f"{last_build} {'FAILED' if failed else 'RECOVERED'}"
-                                    if len(Notification.find_by_name(notification_name)) == 0:
-                                        users = workflow_version.workflow.get_subscribers()
-                                        n = WorkflowStatusNotification(
-                                            EventType.BUILD_FAILED if failed else EventType.BUILD_RECOVERED,
-                                            notification_name,
-                                            {'build': BuildSummarySchema(exclude_nested=False).dump(last_build)},
-                                            users)
-                                        n.save()
-                # save workflow version and notify updates
-                workflow_version.save()
-                notify_workflow_version_updates([workflow_version], type='sync')
+                        try:
+                            _check_instance_builds(i)
+                        except Exception as e:
+                            logger.error("Error when checking the builds of %r: %s", i, str(e))
+                            if logger.isEnabledFor(logging.DEBUG):
+                                logger.exception(e)
+                _notify_workflow_version(workflow_version)
         except Exception as e:
             logger.error("Error when executing task 'check_last_build': %s", str(e))
             if logger.isEnabledFor(logging.DEBUG):
@@ -131,6 +209,73 @@ def check_last_build():
     logger.info("Checking last build: DONE!")
 
 
+def _release_build_check(instance_uuid: str, workflow_version_id: int):
+    """
+    Release the pending check of the instance and notify the workflow version updates
+    when all the checks of the same version have been completed.
+    Releasing the same check more than once is a no-op.
+    """
+    from lifemonitor.api.models import WorkflowVersion, db
+    connection = get_connection()
+    if not connection.delete(f"{BUILD_CHECK_PREFIX}{instance_uuid}"):
+        logger.debug("Build check of %r already released", instance_uuid)
+        return
+    if workflow_version_id is None:
+        return
+    barrier = f"{BUILD_CHECK_BARRIER_PREFIX}{workflow_version_id}"
+    pending = connection.decr(barrier)
+    logger.debug("Pending build checks of workflow version %r: %r", workflow_version_id, pending)
+    if pending <= 0:
+        connection.delete(barrier)
+        workflow_version = db.session.get(WorkflowVersion, workflow_version_id)
+        if workflow_version is not None:
+            _notify_workflow_version(workflow_version)
+
+
+@schedule(name='checkInstanceBuilds', queue_name='builds',
+          options={'max_retries': 20, 'min_backoff': 5000, 'max_backoff': 60000, 'max_age': BUILD_CHECK_TIMEOUT * 1000})
+def check_instance_builds(instance_uuid: str, workflow_version_id: int = None):
+    release = True
+    try:
+        i = TestInstance.find_by_uuid(instance_uuid)
+        if i is None:
+            logger.warning("Test instance %r not found", instance_uuid)
+            return
+        # limit the number of concurrent checks on the same testing service:
+        # when the limit is exceeded, the message is retried later
+        limiter = ConcurrentRateLimiter(RateLimiterBackend(client=get_connection()),
+                                        f"testing-service-{i.testing_service.uuid}",
+                                        limit=current_app.config.get("BUILD_CHECK_CONCURRENCY", BUILD_CHECK_CONCURRENCY),
+                                        ttl=BUILD_CHECK_TIMEOUT * 1000)
+        try:
+            with limiter.acquire():
+                logger.debug("Checking builds of %r", i)
+                _check_instance_builds(i)
+        except dramatiq.RateLimitExceeded:
+            # the check is still pending: keep it until the message is retried or dropped
+            release = False
+            raise
+    except dramatiq.RateLimitExceeded:
+        raise
+    except Exception as e:
+        logger.error("Error when checking the builds of %r: %s", instance_uuid, str(e))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.exception(e)
+    finally:
+        if release:
+            _release_build_check(instance_uuid, workflow_version_id)
+
+
+@schedule(name='releaseInstanceBuildCheck', queue_name='builds',
+          options={'max_retries': 3, 'max_age': TASK_EXPIRATION_TIME})
+def release_instance_build_check(message_data: dict, exception_data: dict):
+    # failure callback of the dropped 'checkInstanceBuilds' messages
+    instance_uuid, workflow_version_id = (list(message_data.get('args', ())) + [None, None])[:2]
+    logger.warning("Build check of %r dropped: %r", instance_uuid, exception_data)
+    if instance_uuid:
+        _release_build_check(instance_uuid, workflow_version_id)
+
+
 @schedule(trigger=CronTrigger(minute=0, hour=2),
           queue_name='builds', options={'max_retries': 3, 'max_age': TASK_EXPIRATION_TIME})
 def periodic_builds():
@@ -0,0 +1,61 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import base64
+import importlib
+import logging
+
+from lifemonitor.cache import MODEL_REFERENCE_MARKER, cache, refresh_cache_entry
+from lifemonitor.db import db
+
+from ..scheduler import TASK_EXPIRATION_TIME, schedule
+
+# set module level logger
+logger = logging.getLogger(__name__)
+
+
+def _load(value):
+    # reload the referenced model instances within the current DB session
+    if not (isinstance(value, tuple) and len(value) == 3 and value[0] == MODEL_REFERENCE_MARKER):
+        return value
+    module_name, qualname = value[1].split(":")
+    model = importlib.import_module(module_name)
+    for name in qualname.split("."):
+        model = getattr(model, name)
+    instance = db.session.get(model, value[2])
+    if instance is None:
+        raise ValueError(f"Instance {value[2]!r} of {value[1]} not found")
+    return instance
+
+
+@schedule(name='refreshCacheEntry', queue_name="cache", options={'max_retries': 0, 'max_age': TASK_EXPIRATION_TIME})
+def refresh_entry(function_name: str, key: str, payload: str):
+    logger.debug("Refreshing cache entry %r (function: %r)", key, function_name)
+    try:
+        args, kwargs = cache._codec.decode(base64.b64decode(payload))
+        args = tuple(_load(_) for _ in args)
+        kwargs = {k: _load(v) for k, v in kwargs.items()}
+        refresh_cache_entry(function_name, key, args=args, kwargs=kwargs)
+        logger.debug("Refreshing cache entry %r (function: %r)... DONE", key, function_name)
+    except Exception as e:
+        logger.error("Error when refreshing the cache entry %r: %s", key, str(e))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.exception(e)
@@ -20,6 +20,7 @@
 
 import logging
 
+from lifemonitor.crates import get_crate_store
 from lifemonitor.storage import RemoteStorage
 
 from ..scheduler import TASK_EXPIRATION_TIME, schedule
@@ -35,3 +36,6 @@ storage: RemoteStorage = RemoteStorage()
 def put_file(bucket_name: str, local_path: str, remote_path: str):
     logger.debug("Event parameters: %r %r %r", bucket_name, local_path, remote_path)
     storage.put_file(local_path, remote_path)
+    # the local copy of the uploaded archive can now be evicted
+    store = get_crate_store()
+    store.mark_uploaded(store.key(local_path))
@@ -705,8 +705,13 @@ def clone_repo(url: str, ref: Optional[str] = None, target_path: Optional[str] =
         logger.debug("Local CLONE: %r - %r", url, ref)
         if not local_path:
             local_path = tempfile.TemporaryDirectory(dir=config.BaseConfig.BASE_TEMP_FOLDER).name
-        user_credentials = _make_git_credentials_callback(auth_token)
-        clone = pygit2.clone_repository(url, local_path, callbacks=user_credentials)
+        from .mirrors import get_mirror_store
+        mirrors = get_mirror_store()
+        if mirrors:
+            clone = mirrors.clone(url, local_path, auth_token=auth_token)
+        else:
+            user_credentials = _make_git_credentials_callback(auth_token)
+            clone = pygit2.clone_repository(url, local_path, callbacks=user_credentials)
         if ref is not None:
             for ref_name in [ref, ref.replace('refs/heads', 'refs/remotes/origin')]:
                 try:
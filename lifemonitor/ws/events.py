@@ -20,7 +20,8 @@
 
 import functools
 import logging
-from typing import Dict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
 
 from flask import request
 from flask_socketio import disconnect, emit, join_room, leave_room
@@ -32,6 +33,10 @@ from .config import socketIO
 # configure logger
 logger = logging.getLogger(__name__)
 
+# overlap (secs) of consecutive delta syncs, covering the updates
+# committed after the sync with a timestamp preceding the watermark
+SYNC_WATERMARK_OVERLAP = 5
+
 
 class Message:
     type: str
@@ -105,7 +110,8 @@ def handle_message(message):
             }
         })
     elif message['type'] == 'sync':
-        emit("message", build_sync_message())
+        data = message.get('data', None)
+        emit("message", build_sync_message(since=data.get('since', None) if isinstance(data, dict) else None))
 
 
 # def broadcast_redis_message(serialised_message):
@@ -116,16 +122,47 @@ def handle_message(message):
 #         logger.debug("Message broadcasted through SocketIO channel")
 
 
-def build_sync_message():
+def build_sync_message(since: Optional[float] = None):
+    """
+    Build the message listing the workflow versions updated after
+    the `since` watermark (i.e., the `watermark` of the previous sync)
+    or all the workflow versions if `since` is not set.
+
+    Deleted versions are not listed by delta syncs:
+    a full sync (flagged as `full`) is sent instead when a deletion
+    has been notified after the `since` watermark.
+    """
     from flask import current_app
 
     from lifemonitor.api.services import LifeMonitor
+
+    from . import io
     if current_app:
         with current_app.app_context():
+            since_time = None
+            if since is not None:
+                try:
+                    since = float(since)
+                    since_time = datetime.utcfromtimestamp(since) - timedelta(seconds=SYNC_WATERMARK_OVERLAP)
+                except (TypeError, ValueError, OverflowError) as e:
+                    logger.debug("Invalid sync watermark %r: %s", since, e)
+                    since = None
+            last_delete = io.get_last_delete_time()
+            if since is not None and last_delete is not None and since <= last_delete:
+                logger.debug("Deletion notified at %r after the watermark %r: full sync", last_delete, since)
+                since = since_time = None
+            updates = LifeMonitor.list_workflow_updates(since=since_time)
+            logger.debug("Sync since %r: %d updates", since, len(updates))
+            watermark = max([_['lastUpdate'] for _ in updates], default=since)
+            if since is None and last_delete is not None:
+                # a full sync covers the deletions notified so far
+                watermark = max(watermark or 0, last_delete)
             return {
                 "payload": {
                     "type": "sync",
-                    "data": LifeMonitor.list_workflow_updates()
+                    "full": since is None,
+                    "data": updates,
+                    "watermark": watermark
                 }
             }
     else:
@@ -19,13 +19,16 @@
 # SOFTWARE.
 
 import datetime
+import heapq
+import itertools
 import json
 import logging
 import time
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from uuid import UUID
 
 from flask import Flask
+from prometheus_client import Counter, Gauge, Histogram
 
 from lifemonitor.redis import get_connection
 
@@ -37,10 +40,30 @@ __CHANNEL__ = "ws_messages"
 # default max age of messages
 __MAX_AGE__ = 10
 
+# default max number of messages received or delivered at once
+__BATCH_SIZE__ = 100
+
+# default max time (secs) waiting for new messages
+__POLL_INTERVAL__ = 0.5
+
+# types of messages merged when sent to the same targets
+__COALESCED_TYPES__ = ('sync',)
+
+# key of the time of the last deletion notified to the clients
+__LAST_DELETE_KEY__ = "ws_last_delete"
+
 
 # set module level logger
 logger = logging.getLogger(__name__)
 
+# instrumentation of the message delivery
+queue_depth = Gauge("lifemonitor_ws_queue_depth", "Number of websocket messages waiting for delivery")
+delivery_latency = Histogram("lifemonitor_ws_delivery_latency_seconds",
+                             "Delay of websocket messages with respect to their scheduled delivery time",
+                             buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+coalesced_messages = Counter("lifemonitor_ws_coalesced_messages", "Number of websocket messages merged with others")
+dropped_messages = Counter("lifemonitor_ws_dropped_messages", "Number of websocket messages dropped as too old")
+
 
 def __format_timestamp__(timestamp: datetime) -> str:
     tz_offset = timestamp.strftime('%z')
@@ -60,6 +83,9 @@ def publish_message(message, channel: str = __CHANNEL__,
     now = datetime.datetime.now(datetime.timezone.utc)
     timestamp_as_str = __format_timestamp__(now)
     logger.debug(f"Pushing message @ {timestamp_as_str}")
+    if isinstance(message, dict) and message.get('type', None) == 'delete':
+        # clients offline at this time can learn about the deletion only from a full sync
+        get_connection().set(__LAST_DELETE_KEY__, now.timestamp())
     get_connection().publish(channel, json.dumps({
         "timestamp": now.timestamp(),
         "delay": delay,
@@ -70,46 +96,160 @@ def publish_message(message, channel: str = __CHANNEL__,
     }, cls=_CustomEncoder))
 
 
-def start_reading(app: Flask, channel: str = __CHANNEL__, max_age: int = __MAX_AGE__):
-    pubsub = get_connection().pubsub()
-    pubsub.subscribe(channel)
-    for message in pubsub.listen():
-        try:
-            logger.debug(f"Received message of type {message['type']}")
-            if message['type'] in ['subscribe', 'unsubscribe']:
+def get_last_delete_time() -> Optional[float]:
+    '''Return the time of the last deletion notified to the clients, if any'''
+    value = get_connection().get(__LAST_DELETE_KEY__)
+    return float(value) if value is not None else None
+
+
+def _targets(data: Dict) -> Tuple[str, ...]:
+    # sids are rooms too: a message is sent once to all its targets
+    return tuple(sorted(set((data.get('target_ids', None) or []) + (data.get('target_rooms', None) or []))))
+
+
+def _merge_updates(updates: List[Dict], others: List[Dict]) -> List[Dict]:
+    merged = {(_['uuid'], _.get('version', None)): _ for _ in updates}
+    for u in others:
+        key = (u['uuid'], u.get('version', None))
+        if key not in merged or (u.get('lastUpdate', None) or 0) >= (merged[key].get('lastUpdate', None) or 0):
+            merged[key] = u
+    return list(merged.values())
+
+
+class FanOutWorker:
+    """
+    Deliver the messages published on a Redis channel to the websocket clients.
+
+    Delayed messages wait on a heap ordered by delivery time, without blocking
+    the others; the due messages are sent once per set of targets (rooms or sids),
+    merging the `sync` messages sent to the same targets.
+    """
+
+    def __init__(self, app: Flask, channel: str = __CHANNEL__, max_age: int = __MAX_AGE__,
+                 batch_size: int = __BATCH_SIZE__, poll_interval: float = __POLL_INTERVAL__) -> None:
+        self.app = app
+        self.channel = channel
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._queue: List[Tuple[float, int, Dict]] = []
+        self._sequence = itertools.count()
+        self._running = False
+
+    @property
+    def queue_size(self) -> int:
+        return len(self._queue)
+
+    def push(self, data: Dict):
+        due = data['timestamp'] + max(0, data.get('delay', None) or 0)
+        heapq.heappush(self._queue, (due, next(self._sequence), data))
+        queue_depth.set(len(self._queue))
+
+    def pop_due(self, now: Optional[float] = None) -> List[Tuple[float, Dict]]:
+        now = now or time.time()
+        due_messages = []
+        while self._queue and self._queue[0][0] <= now and len(due_messages) < self.batch_size:
+            due, _, data = heapq.heappop(self._queue)
+            if now - due > self.max_age:
+                logger.warning(f"Message {data['timestamp']} skipped: too old")
+                dropped_messages.inc()
+            else:
+                due_messages.append((due, data))
+        queue_depth.set(len(self._queue))
+        return due_messages
+
+    @staticmethod
+    def coalesce(messages: List[Tuple[float, Dict]]) -> List[Tuple[float, Tuple[str, ...], Dict]]:
+        """
+        Group the due messages by targets, merging the consecutive
+        `sync` messages of the same targets into the first one.
+        """
+        result = []
+        open_groups: Dict[Tuple[str, ...], int] = {}
+        for due, data in messages:
+            targets = _targets(data)
+            payload = data.get('payload', None) or {}
+            if payload.get('type', None) not in __COALESCED_TYPES__:
+                # preserve the order with respect to the other messages of the same targets
+                open_groups.pop(targets, None)
+                result.append((due, targets, data))
                 continue
-            data = json.loads(message['data'])
-            logger.debug("Processing message: %r", data['timestamp'])
-            logger.debug("Decoded data: %r", data)
-            if datetime.datetime.now(datetime.timezone.utc).timestamp() - data['timestamp'] > max_age:
-                logger.warn(f"Message {data['timestamp']} skipped: too old")
+            index = open_groups.get(targets, None)
+            if index is None or result[index][2]['payload']['type'] != payload['type']:
+                open_groups[targets] = len(result)
+                result.append((due, targets, data))
             else:
-                if data['delay'] > 0:
-                    time.sleep(data['delay'])
-                    # app.socketIO.sleep(data['delay'])
-                message_targets = data.get('target_ids', None)
-                if message_targets:
-                    for message_target in message_targets:
-                        logger.warning("Message target: %r", message_target)
-                        app.socketIO.emit("message", data, to=message_target)
-                        logger.info(f"Message with timestamp {data['timestamp']} sent as {__format_timestamp__(datetime.datetime.utcnow())} to {message_target}")
-
-                message_rooms = data.get('target_rooms', None)
-                if message_rooms:
-                    for message_room in message_rooms:
-                        logger.warning("Message target room: %r", message_room)
-                        app.socketIO.emit("message", data, room=message_room)
-                        logger.info(f"Message with timestamp {data['timestamp']} sent as {__format_timestamp__(datetime.datetime.utcnow())}  room {message_room}")
-
-                if not message_rooms and not message_targets:
-                    # logger.warning("Broadcasting message target: %r", message_target)
-                    app.socketIO.emit("message", data)
-                    logger.info(f"Message with timestamp {data['timestamp']} broadcasted as {__format_timestamp__(datetime.datetime.utcnow())}")
+                first_due, _, first = result[index]
+                merged = dict(data)
+                merged['payload'] = dict(payload)
+                merged['payload']['data'] = _merge_updates(first['payload'].get('data', None) or [],
+                                                           payload.get('data', None) or [])
+                result[index] = (min(first_due, due), targets, merged)
+                coalesced_messages.inc()
+        return result
+
+    def emit(self, targets: Tuple[str, ...], data: Dict):
+        if targets:
+            self.app.socketIO.emit("message", data, to=list(targets))
+            logger.info(f"Message with timestamp {data['timestamp']} sent as "
+                        f"{__format_timestamp__(datetime.datetime.utcnow())} to {len(targets)} targets")
+        else:
+            self.app.socketIO.emit("message", data)
+            logger.info(f"Message with timestamp {data['timestamp']} broadcasted as "
+                        f"{__format_timestamp__(datetime.datetime.utcnow())}")
+
+    def deliver(self, now: Optional[float] = None) -> int:
+        count = 0
+        for due, targets, data in self.coalesce(self.pop_due(now)):
+            try:
+                self.emit(targets, data)
+                delivery_latency.observe(max(0, time.time() - due))
+                count += 1
+            except Exception as e:
+                logger.error("Unable to deliver message %r: %s", data.get('timestamp', None), str(e))
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.exception(e)
+        return count
+
+    def receive(self, message: Dict):
+        try:
+            data = json.loads(message['data'])
+            logger.debug("Received message: %r", data['timestamp'])
+            self.push(data)
         except Exception as e:
             logger.error("Invalid message: %s", str(e))
             if logger.isEnabledFor(logging.DEBUG):
                 logger.exception(e)
-    pubsub.unsubscribe()
+
+    def _next_timeout(self) -> float:
+        if not self._queue:
+            return self.poll_interval
+        return min(self.poll_interval, max(0, self._queue[0][0] - time.time()))
+
+    def run(self):
+        pubsub = get_connection().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        self._running = True
+        try:
+            while self._running:
+                # wait for new messages until the next delivery is due
+                message = pubsub.get_message(timeout=self._next_timeout())
+                received = 0
+                while message is not None:
+                    self.receive(message)
+                    received += 1
+                    message = pubsub.get_message() if received < self.batch_size else None
+                self.deliver()
+        finally:
+            pubsub.unsubscribe()
+            pubsub.close()
+
+    def stop(self):
+        self._running = False
+
+
+def start_reading(app: Flask, channel: str = __CHANNEL__, max_age: int = __MAX_AGE__):
+    FanOutWorker(app, channel=channel, max_age=max_age).run()
 
 
 def start_brodcaster(app: Flask, channel: str = __CHANNEL__, max_age: int = __MAX_AGE__):
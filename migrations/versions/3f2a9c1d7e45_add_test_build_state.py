@@ -0,0 +1,61 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Add test build state
+
+Revision ID: 3f2a9c1d7e45
+Revises: 6bb84f8b8c77
+Create Date: 2026-10-17 10:12:31.402215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from lifemonitor.models import JSON, UUID
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7e45'
+down_revision = '6bb84f8b8c77'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('test_build_state',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('test_instance_uuid', UUID(), nullable=False),
+                    sa.Column('build_id', sa.String(), nullable=False),
+                    sa.Column('status', sa.String(), nullable=True),
+                    sa.Column('run_attempt', sa.Integer(), nullable=True),
+                    sa.Column('created_at', sa.DateTime(), nullable=True),
+                    sa.Column('updated_at', sa.DateTime(), nullable=True),
+                    sa.Column('observed_at', sa.DateTime(), nullable=False),
+                    sa.Column('data', JSON(), nullable=True),
+                    sa.ForeignKeyConstraint(['test_instance_uuid'], ['test_instance.uuid'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('test_instance_uuid', 'build_id')
+                    )
+    op.create_index(op.f('ix_test_build_state_test_instance_uuid'), 'test_build_state', ['test_instance_uuid'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_test_build_state_test_instance_uuid'), table_name='test_build_state')
+    op.drop_table('test_build_state')
@@ -0,0 +1,46 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Index modification timestamps
+
+Revision ID: 8d4e2b7a9c13
+Revises: 3f2a9c1d7e45
+Create Date: 2026-10-17 15:40:08.118347
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4e2b7a9c13'
+down_revision = '3f2a9c1d7e45'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_resource_modified'), 'resource', ['modified'], unique=False)
+    op.create_index(op.f('ix_test_instance_last_builds_update'), 'test_instance', ['last_builds_update'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_test_instance_last_builds_update'), table_name='test_instance')
+    op.drop_index(op.f('ix_resource_modified'), table_name='resource')
@@ -0,0 +1,116 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+import werkzeug
+
+from lifemonitor.cache import CacheCodec, zstandard
+
+logger = logging.getLogger(__name__)
+
+# number of encode/decode rounds per payload
+ROUNDS = 50
+
+crate_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          "crates", "ro-crate-galaxy-sortchangecase.crate.zip")
+
+
+def _build_list(size=10):
+    now = datetime.now()
+    return [{
+        "id": 1000 + i,
+        "run_attempt": 1,
+        "status": "completed",
+        "conclusion": "success" if i % 3 else "failure",
+        "head_branch": "main",
+        "head_sha": f"{i:040x}",
+        "created_at": now - timedelta(hours=i),
+        "updated_at": now - timedelta(hours=i, minutes=-5),
+        "html_url": f"https://github.com/crs4/lifemonitor/actions/runs/{1000 + i}",
+        "url": f"https://api.github.com/repos/crs4/lifemonitor/actions/runs/{1000 + i}",
+    } for i in range(size)]
+
+
+def _status():
+    return {
+        "aggregate_test_status": "some_passing",
+        "latest_builds": _build_list(3),
+        "reason": [f"Test instance #{i} is failing" for i in range(5)]
+    }
+
+
+def _crate_response():
+    with open(crate_path, "rb") as f:
+        return werkzeug.Response(f.read(), headers={
+            'Content-Type': 'application/zip',
+            'Content-Disposition': 'attachment; filename=rocrate.zip'
+        })
+
+
+payloads = {
+    "build_list": _build_list,
+    "status": _status,
+    "crate_response": _crate_response
+}
+
+compressions = ['none', 'zlib'] + (['zstd'] if zstandard else [])
+
+
+def _measure(codec: CacheCodec, value):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        data = codec.encode(value)
+    encode_time = (time.perf_counter() - start) / ROUNDS
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        codec.decode(data)
+    decode_time = (time.perf_counter() - start) / ROUNDS
+    return data, encode_time, decode_time
+
+
+@pytest.mark.parametrize("payload", payloads.keys())
+def test_cache_codec_benchmark(payload):
+    value = payloads[payload]()
+    results = {}
+    for compression in compressions:
+        codec = CacheCodec(compression=compression)
+        data, encode_time, decode_time = _measure(codec, value)
+        results[compression] = len(data)
+        logger.info("[%s] %-5s: %8d bytes, encode %.3f ms, decode %.3f ms",
+                    payload, compression, len(data), encode_time * 1000, decode_time * 1000)
+        decoded = codec.decode(data)
+        if isinstance(value, werkzeug.Response):
+            assert decoded.get_data() == value.get_data(), "Unexpected decoded response"
+        else:
+            assert decoded == value, "Unexpected decoded value"
+    for compression in compressions:
+        assert results[compression] <= results['none'], f"{compression} should never increase the stored size"
+
+
+def test_cache_codec_legacy_values():
+    import pickle
+    value = _build_list()
+    assert CacheCodec().decode(pickle.dumps(value)) == value, "Plain pickle data should be decoded"
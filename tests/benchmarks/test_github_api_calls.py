@@ -0,0 +1,158 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import json
+import logging
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock
+
+import pytest
+
+import lifemonitor.api.models as models
+from lifemonitor.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# number of runs returned by the fake run listing
+RUNS = 12
+# number of attempts of every third run
+ATTEMPTS = 3
+
+workflow_resource = "repos/lifemonitor/workflow-tests/actions/workflows/ci.yml"
+
+
+class FakeGithubHandler(BaseHTTPRequestHandler):
+
+    base_url = None
+    requests = []
+
+    def _run(self, run_id, attempt=None):
+        attempts = ATTEMPTS if run_id % 3 == 0 else 1
+        attempt = attempt or attempts
+        url = f"{self.base_url}/repos/lifemonitor/workflow-tests/actions/runs/{run_id}"
+        return {
+            "id": run_id,
+            "run_attempt": attempt,
+            "status": "completed",
+            "conclusion": "success" if attempt == attempts else "failure",
+            "head_sha": f"{run_id:040x}",
+            "created_at": f"2024-01-{31 - run_id % 30:02d}T10:00:00Z",
+            "updated_at": f"2024-01-{31 - run_id % 30:02d}T10:05:00Z",
+            "url": url,
+            "previous_attempt_url": f"{url}/attempts/{attempt - 1}" if attempt > 1 else None
+        }
+
+    def _route(self, path):
+        repo_url = f"{self.base_url}/repos/lifemonitor/workflow-tests"
+        if path == "/repos/lifemonitor/workflow-tests":
+            return {"id": 1, "full_name": "lifemonitor/workflow-tests", "url": repo_url}
+        if path == "/repos/lifemonitor/workflow-tests/actions/workflows/ci.yml":
+            return {"id": 1, "name": "CI", "path": ".github/workflows/ci.yml",
+                    "url": f"{repo_url}/actions/workflows/ci.yml"}
+        if path == "/repos/lifemonitor/workflow-tests/actions/workflows/ci.yml/runs":
+            return {"total_count": RUNS, "workflow_runs": [self._run(RUNS - i) for i in range(RUNS)]}
+        m = re.match(r"/repos/lifemonitor/workflow-tests/actions/runs/(\d+)/attempts/(\d+)", path)
+        if m:
+            return self._run(int(m.group(1)), int(m.group(2)))
+        return None
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        self.requests.append(path)
+        data = self._route(path)
+        body = json.dumps(data if data is not None else {"message": "Not Found"}).encode()
+        self.send_response(200 if data is not None else 404)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+@pytest.fixture
+def fake_github():
+    FakeGithubHandler.requests = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGithubHandler)
+    FakeGithubHandler.base_url = f"http://127.0.0.1:{server.server_port}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield FakeGithubHandler.base_url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fake_instance():
+    instance = MagicMock()
+    instance.resource = workflow_resource
+    instance.test_suite.workflow_version.revision.main_ref.shorthand = "main"
+    return instance
+
+
+def _count_api_calls(fn):
+    FakeGithubHandler.requests = []
+    result = fn()
+    attempts = [_ for _ in FakeGithubHandler.requests if "/attempts/" in _]
+    return result, len(FakeGithubHandler.requests), len(attempts)
+
+
+@pytest.mark.parametrize("limit", [1, 5, 10])
+def test_get_test_builds_api_calls(app_context, redis_cache, fake_github, fake_instance, limit):
+    cache.clear()
+    service = models.GithubTestingService(url=fake_github)
+    builds, calls, attempt_calls = _count_api_calls(lambda: service.get_test_builds(fake_instance, limit=limit))
+    logger.info("get_test_builds(limit=%d): %d API calls (%d attempt calls)", limit, calls, attempt_calls)
+    assert len(builds) == limit, "Unexpected number of builds"
+    # older attempts are fetched only to fill up the list of builds
+    older_attempts = sum(1 for b in builds if b.attempt_number < ATTEMPTS and b.build_number % 3 == 0)
+    assert attempt_calls == older_attempts, "Only the listed older attempts should be fetched"
+    # second call: everything from cache
+    _, calls, _ = _count_api_calls(lambda: service.get_test_builds(fake_instance, limit=limit))
+    logger.info("get_test_builds(limit=%d) from cache: %d API calls", limit, calls)
+    assert calls == 0, "No API calls expected"
+
+
+def test_build_summary_api_calls(app_context, redis_cache, fake_github, fake_instance):
+    cache.clear()
+    service = models.GithubTestingService(url=fake_github)
+    build, calls, attempt_calls = _count_api_calls(lambda: service.get_last_test_build(fake_instance))
+    logger.info("get_last_test_build: %d API calls (%d attempt calls)", calls, attempt_calls)
+    assert build.build_number == RUNS and build.attempt_number == ATTEMPTS, "Unexpected last build"
+    # last passed and last failed builds come from the same summary,
+    # keyed on the (cached) newest run ID: no API calls
+    build, calls, attempt_calls = _count_api_calls(lambda: service.get_last_passed_test_build(fake_instance))
+    logger.info("get_last_passed_test_build: %d API calls (%d attempt calls)", calls, attempt_calls)
+    assert build.build_number == RUNS and build.attempt_number == ATTEMPTS, "Unexpected last passed build"
+    assert calls == 0, "No API calls expected"
+    build, calls, attempt_calls = _count_api_calls(lambda: service.get_last_failed_test_build(fake_instance))
+    logger.info("get_last_failed_test_build: %d API calls (%d attempt calls)", calls, attempt_calls)
+    assert build.build_number == RUNS and build.attempt_number == ATTEMPTS - 1, "Unexpected last failed build"
+    assert calls == 0, "No API calls expected"
+    # a new run (e.g., notified by a webhook) makes the newest run ID obsolete:
+    # only the newest run ID has to be checked again
+    service.invalidate_newest_run_id(fake_instance)
+    build, calls, attempt_calls = _count_api_calls(lambda: service.get_last_test_build(fake_instance))
+    assert build.build_number == RUNS, "Unexpected last build"
+    assert calls == 1 and attempt_calls == 0, "Unexpected number of API calls"
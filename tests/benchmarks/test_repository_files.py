@@ -0,0 +1,84 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import logging
+import os
+import re
+import time
+
+import pytest
+
+from lifemonitor.api.models.repositories import LocalWorkflowRepository
+from lifemonitor.api.models.repositories.files import (RepositoryFile,
+                                                       WorkflowFile)
+
+logger = logging.getLogger(__name__)
+
+LOOKUPS = 50
+
+
+@pytest.fixture(scope="module")
+def synthetic_repo(tmp_path_factory) -> str:
+    # 100 folders x 100 files, plus a workflow file in one of the folders
+    root = tmp_path_factory.mktemp("synthetic_repo")
+    for d in range(100):
+        folder = root / f"dir_{d:03d}"
+        folder.mkdir()
+        for f in range(100):
+            (folder / f"file_{f:03d}.{('txt', 'py', 'json', 'md')[f % 4]}").write_text("")
+    (root / "dir_099" / "Snakefile").write_text("rule all:")
+    return str(root)
+
+
+def _scan_lookups(repo: LocalWorkflowRepository):
+    # the lookups as performed before the file catalogue: a linear scan of the files on each call
+    for _ in range(LOOKUPS):
+        files = []
+        for root, _dirs, names in os.walk(repo.local_path):
+            dirname = root.replace(repo.local_path, '.')
+            files.extend(RepositoryFile(repo.local_path, name, dir=dirname) for name in names)
+        next((f for f in files if f.name == 'file_099.md'), None)
+        next((f for f in files if re.search(r'^file_099\.md$', f.name)), None)
+        next((wf for wf in map(WorkflowFile.is_workflow, files) if wf), None)
+
+
+def _catalogue_lookups(repo: LocalWorkflowRepository):
+    for _ in range(LOOKUPS):
+        repo.find_file_by_name('file_099.md')
+        repo.find_file_by_pattern(r'^file_099\.md$')
+        repo.find_workflow()
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def test_file_catalogue_lookups(synthetic_repo):
+    repo = LocalWorkflowRepository(local_path=synthetic_repo)
+    assert len(repo.files) == 10001, "Unexpected number of files"
+    assert repo.find_workflow().name == 'Snakefile', "Unexpected workflow file"
+
+    scan_time = _timed(_scan_lookups, repo)
+    catalogue_time = _timed(_catalogue_lookups, repo)
+    logger.info("%d lookups on %d files: linear scan %.2fms, catalogue %.2fms",
+                LOOKUPS, len(repo.files), scan_time, catalogue_time)
+    assert catalogue_time < scan_time, "Catalogue lookups should be faster than linear scans"
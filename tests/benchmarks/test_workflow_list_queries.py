@@ -0,0 +1,84 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import logging
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+import lifemonitor.api.models as models
+from lifemonitor.api import serializers
+from lifemonitor.db import db
+
+logger = logging.getLogger(__name__)
+
+# maximum number of SQL statements to serialize a list of workflows
+MAX_STATEMENTS = 10
+
+
+@contextmanager
+def _count_statements():
+    statements = []
+
+    def _on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", _on_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", _on_execute)
+
+
+def _serialize_workflows(user, workflows):
+    # drop the state of the loaded objects as a new request would do
+    db.session.expire_all()
+    with _count_statements() as statements:
+        data = serializers.ListOfWorkflows(workflow_versions=True, subscriptionsOf=[user]).dump(workflows)
+    assert len(data['items']) == len(workflows), "Unexpected number of items"
+    logger.debug("Serialized %d workflows with %d statements", len(workflows), len(statements))
+    return statements
+
+
+@pytest.mark.parametrize("user1", [True], indirect=True)
+def test_workflow_list_query_count(app_client, user1):
+    user = user1['user']
+    workflows = models.Workflow.get_user_workflows(user, include_subscriptions=True)
+    assert len(workflows) > 1, "Unexpected number of workflows"
+
+    one = _serialize_workflows(user, workflows[:1])
+    many = _serialize_workflows(user, workflows)
+    # the number of statements must not depend on the number of workflows
+    assert len(many) <= len(one), \
+        f"{len(many)} statements for {len(workflows)} workflows, {len(one)} for one workflow"
+    assert len(many) <= MAX_STATEMENTS, f"Too many statements: {len(many)}"
+
+
+@pytest.mark.parametrize("user1", [True], indirect=True)
+def test_subscribed_workflows_query_count(app_client, lm, user1):
+    user = user1['user']
+    db.session.expire_all()
+    with _count_statements() as statements:
+        workflows = lm.get_user_workflows(user, only_subscriptions=True)
+    assert len(workflows) > 1, "Unexpected number of subscribed workflows"
+    # user, subscriptions, subscribed workflows and permissions
+    assert len(statements) <= 4, f"Too many statements: {len(statements)}"
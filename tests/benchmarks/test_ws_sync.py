@@ -0,0 +1,100 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+import lifemonitor.api.models as models
+from lifemonitor.api.services import LifeMonitor
+from lifemonitor.auth.models import User
+from lifemonitor.db import db
+from lifemonitor.ws.events import build_sync_message
+from lifemonitor.ws.io import publish_message
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def catalogue(app_context, request):
+    size = request.param
+    user = User(f"sync-benchmark-{uuid.uuid4()}")
+    workflows = []
+    for i in range(size):
+        w = models.Workflow(name=f"sync-benchmark-{i}")
+        models.WorkflowVersion(w, f"https://example.org/workflows/{i}", "1.0", user)
+        workflows.append(w)
+    db.session.add(user)
+    db.session.add_all(workflows)
+    db.session.commit()
+    yield workflows
+    for w in workflows:
+        db.session.delete(w)
+    db.session.delete(user)
+    db.session.commit()
+
+
+def _timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+@pytest.mark.parametrize("catalogue", [10, 100, 500], indirect=True)
+def test_sync_latency(app_context, catalogue):
+    full, full_time = _timed(LifeMonitor.list_workflow_updates)
+    assert len(full) >= len(catalogue), "Unexpected number of updates"
+
+    since = datetime.utcnow()
+    time.sleep(0.01)
+    version = catalogue[0].latest_version
+    version.name = "sync-benchmark-updated"
+    db.session.commit()
+
+    delta, delta_time = _timed(LifeMonitor.list_workflow_updates, since=since)
+    logger.info("Catalogue of %d workflows: full sync %.2fms (%d rows), delta sync %.2fms (%d rows)",
+                len(catalogue), full_time, len(full), delta_time, len(delta))
+    assert [(_['uuid'], _['version']) for _ in delta] == [(str(catalogue[0].uuid), version.version)], \
+        "Only the updated version should be synced"
+
+    # the watermark of a sync is the `since` of the next one
+    message = build_sync_message(since=since.replace(tzinfo=timezone.utc).timestamp())
+    watermark = message['payload']['watermark']
+    assert watermark is not None, "Missing watermark"
+    message = build_sync_message(since=watermark + 60)
+    assert message['payload']['data'] == [], "No updates expected after the watermark"
+
+
+@pytest.mark.parametrize("catalogue", [10], indirect=True)
+def test_sync_after_deletion(app_context, catalogue):
+    since = time.time()
+    time.sleep(0.01)
+    # clients offline when a deletion is notified get a full sync
+    publish_message({"type": "delete", "data": [{"uuid": str(uuid.uuid4()), "version": "1.0"}]})
+    message = build_sync_message(since=since)
+    assert message['payload']['full'] is True, "A full sync is expected after a deletion"
+    assert len(message['payload']['data']) >= len(catalogue), "Unexpected number of updates"
+    # the watermark of the full sync covers the deletion
+    message = build_sync_message(since=message['payload']['watermark'])
+    assert message['payload']['full'] is False, "A delta sync is expected"
@@ -195,3 +195,34 @@ def test_base64_repo(test_repo_info, simple_base64_wf_repo):
         assert repo.name == test_repo_info['name'], "Repository name is not correct"
         assert repo.full_name == f"{test_repo_info['owner']}/{test_repo_info['name']}", "Repository full name is not correct"
         assert repo.license == test_repo_info['license'], "Repository license is not correct"
+
+
+def test_local_repo_file_catalogue(tmp_path):
+    for d in ('.', 'workflow', 'docs'):
+        (tmp_path / d).mkdir(exist_ok=True)
+    (tmp_path / 'README.md').write_text('README')
+    (tmp_path / 'docs' / 'index.md').write_text('Docs')
+    (tmp_path / 'workflow' / 'Snakefile').write_text('rule all:')
+    repo = repos.LocalWorkflowRepository(local_path=str(tmp_path))
+
+    catalogue = repo.catalogue
+    assert len(catalogue) == 3, "Unexpected number of files"
+    assert repo.catalogue is catalogue, "The catalogue should be reused"
+    assert repo.find_file_by_name('README.md').dir == '.'
+    assert repo.find_file_by_name('index.md', path='docs').dir == './docs'
+    assert repo.find_file_by_name('index.md', path='workflow') is None
+    assert repo.find_file_by_pattern(r'\.md$', path='docs').name == 'index.md'
+    assert repo.find_file_by_pattern(r'^Snake').name == 'Snakefile'
+    assert repo.find_workflow().type == 'snakemake'
+
+    # transient changes rebuild the catalogue
+    readme = repo.find_file_by_name('README.md')
+    repo.remove_file(readme)
+    assert repo.find_file_by_name('README.md') is None
+    repo.add_file(readme)
+    assert repo.find_file_by_name('README.md') is not None
+
+    # a new file in the root invalidates the snapshot
+    (tmp_path / 'main.nf').write_text('workflow {}')
+    assert repo.find_file_by_name('main.nf') is not None
+    assert repo.find_workflow().type == 'nextflow'
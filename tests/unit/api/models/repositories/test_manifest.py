@@ -0,0 +1,93 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import logging
+import os
+import zipfile
+
+import git
+
+import lifemonitor.api.models.repositories as repos
+from lifemonitor.api.models.repositories.manifest import (
+    RepositoryManifest, file_relpath, get_archive_manifest, git_blob_digest,
+    git_blob_file_digest)
+from lifemonitor.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+def _write_files(path, files):
+    for name, content in files.items():
+        os.makedirs(os.path.dirname(os.path.join(path, name)), exist_ok=True)
+        with open(os.path.join(path, name), 'w') as f:
+            f.write(content)
+
+
+def test_git_blob_digest(tmp_path):
+    repo = git.Repo.init(tmp_path)
+    _write_files(str(tmp_path), {'README.md': 'README\n'})
+    expected = repo.git.hash_object(str(tmp_path / 'README.md'))
+    assert git_blob_digest(b'README\n') == expected
+    assert git_blob_file_digest(str(tmp_path / 'README.md')) == expected
+
+
+def test_manifest_diff(tmp_path):
+    left_path, right_path = str(tmp_path / 'left'), str(tmp_path / 'right')
+    _write_files(left_path, {'README.md': 'README', 'docs/index.md': 'Docs', 'LICENSE': 'MIT', 'only_left.txt': ''})
+    _write_files(right_path, {'README.md': 'README', 'docs/index.md': 'New docs', 'LICENSE': 'Apache', 'only_right.txt': ''})
+    left = repos.LocalWorkflowRepository(local_path=left_path)
+    right = repos.LocalWorkflowRepository(local_path=right_path)
+
+    missing_left, missing_right, differences = left.compare_to(right, exclude=['LICENSE'])
+    assert [f.name for f in missing_left] == ['only_right.txt']
+    assert [f.name for f in missing_right] == ['only_left.txt']
+    assert [(lf.name, rf.name) for lf, rf in differences] == [('index.md', 'index.md')]
+
+    # same result from the file lists
+    assert left.__compare__(left.files, right.files, exclude=['LICENSE']) == (missing_left, missing_right, differences)
+
+
+def test_git_manifest_reuses_index(simple_local_wf_repo):
+    manifest = simple_local_wf_repo.manifest
+    assert len(manifest) == len(simple_local_wf_repo.files)
+    for key, entry in manifest.entries.items():
+        assert manifest.digest(key) == git_blob_file_digest(entry.file.path), \
+            f"Unexpected digest of {file_relpath(entry.file)}"
+    plain = RepositoryManifest(simple_local_wf_repo.files)
+    assert plain.diff(manifest) == ([], [], []), "Manifests of the same files should not differ"
+
+
+def test_archive_manifest_digests(app_context, redis_cache, tmp_path):
+    cache.clear()
+    archive_path = str(tmp_path / 'crate.zip')
+    with zipfile.ZipFile(archive_path, 'w') as archive:
+        archive.writestr('README.md', 'README')
+        archive.writestr('docs/index.md', 'Docs')
+    right_path = str(tmp_path / 'right')
+    _write_files(right_path, {'README.md': 'README', 'docs/index.md': 'New docs!'})
+
+    repo = repos.ZippedWorkflowRepository(archive_path)
+    right = repos.LocalWorkflowRepository(local_path=right_path)
+    assert get_archive_manifest(repo.archive_digest) is None, "No digest should be cached"
+    # files with different sizes are not hashed
+    _, _, differences = repo.compare_to(right)
+    assert [lf.name for lf, _ in differences] == ['index.md']
+    assert set(get_archive_manifest(repo.archive_digest)) == {'README.md'}, \
+        "Only the digests computed by the comparison should be cached"
@@ -0,0 +1,82 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import datetime
+import logging
+
+import lifemonitor.api.models as models
+from tests import utils
+
+logger = logging.getLogger(__name__)
+
+
+class FakeBuild:
+
+    def __init__(self, run_id, attempt, status, timestamp):
+        self.id = f"{run_id}_{attempt}"
+        self.attempt_number = attempt
+        self.status = status
+        self.timestamp = timestamp
+        self.updated_at = None
+        self.metadata = {'id': run_id, 'run_attempt': attempt}
+
+
+def test_build_states(app_context, user1):
+    _, workflow = utils.pick_and_register_workflow(user1, 'sort-and-change-case')
+    instance: models.TestInstance = workflow.test_suites[0].test_instances[0]
+    assert models.TestBuildState.last_observed(instance) is None, "No state should be observed"
+    assert not models.TestBuildState.is_fresh(instance), "States should not be fresh"
+
+    now = int(datetime.datetime.utcnow().timestamp())
+    models.TestBuildState.upsert(instance, [
+        FakeBuild(1, 1, models.BuildStatus.FAILED, now - 60),
+        FakeBuild(2, 1, models.BuildStatus.FAILED, now),
+        FakeBuild(2, 2, models.BuildStatus.RUNNING, now)
+    ])
+    states = models.TestBuildState.find_by_instance(instance)
+    assert [_.build_id for _ in states] == ["2_2", "2_1", "1_1"], "Unexpected order of build states"
+    assert models.TestBuildState.is_fresh(instance), "States should be fresh"
+    assert not models.TestBuildState.is_fresh(instance, max_age=-1), "States should not be fresh"
+
+    # update the state of an existing build
+    models.TestBuildState.upsert(instance, [FakeBuild(2, 2, models.BuildStatus.PASSED, now)])
+    states = models.TestBuildState.find_by_instance(instance, limit=1)
+    assert len(states) == 1, "Unexpected number of build states"
+    assert states[0].build_id == "2_2" and states[0].status == models.BuildStatus.PASSED, "Build state not updated"
+    assert len(models.TestBuildState.find_by_instance(instance)) == 3, "Unexpected number of build states"
+
+
+def test_build_states_rollback(app_context, user1, monkeypatch):
+    _, workflow = utils.pick_and_register_workflow(user1, 'sort-and-change-case')
+    instance: models.TestInstance = workflow.test_suites[0].test_instances[0]
+    monkeypatch.setattr(type(instance.testing_service), 'build_state_supported', True)
+    now = int(datetime.datetime.utcnow().timestamp())
+    models.TestBuildState.upsert(instance, [FakeBuild(1, 1, models.BuildStatus.FAILED, now)])
+
+    # simulate a concurrent insert of the same build
+    def conflicting_upsert(test_instance, builds, commit=True):
+        models.db.session.add(models.TestBuildState(test_instance=test_instance, build_id="1_1"))
+        models.db.session.commit()
+
+    monkeypatch.setattr(models.TestBuildState, 'upsert', conflicting_upsert)
+    instance.update_build_states([FakeBuild(1, 1, models.BuildStatus.PASSED, now)])
+    # the session should still be usable
+    assert len(models.TestBuildState.find_by_instance(instance)) == 1, "Unexpected number of build states"
@@ -18,6 +18,7 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import datetime
 import logging
 import uuid
 from unittest.mock import MagicMock
@@ -281,3 +282,22 @@ def test_status_some_build_passing_check_issues(workflow, suite, error_descripti
     assert len(status.latest_builds) == 6, "The number of builds should be 5"
     assert len(status.availability_issues) == 1, "One issue should be reported"
     assert error_description in status.availability_issues[0]['issue'], "Invalid issue"
+
+
+@pytest.mark.parametrize("suite", [(1, 0, 0)], indirect=True)
+def test_status_materialized_until_builds_change(workflow, suite):
+    workflow.test_suites.append(suite)
+    status = workflow.status
+    assert status.aggregated_status == models.AggregateTestStatus.ALL_PASSING, \
+        f"The actual workflow status should be {models.AggregateTestStatus.ALL_PASSING}"
+    assert workflow.status is status, "The status should be reused"
+    # the build fails but the build state hasn't been updated yet
+    test_instance = suite.test_instances[0]
+    test_instance.last_test_build.status = "failed"
+    test_instance.last_test_build.is_successful.return_value = False
+    assert workflow.status is status, "The status should be reused"
+    # update the build state
+    test_instance.last_builds_update = datetime.datetime.utcnow()
+    status = workflow.status
+    assert status.aggregated_status == models.AggregateTestStatus.ALL_FAILING, \
+        f"The actual workflow status should be {models.AggregateTestStatus.ALL_FAILING}"
@@ -0,0 +1,129 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import logging
+from unittest.mock import MagicMock
+
+import pytest
+
+import lifemonitor.exceptions as lm_exceptions
+from lifemonitor.api.pagination import (MAX_PAGE_DEPTH, build_key,
+                                        decode_cursor, encode_cursor,
+                                        paginate, paginate_query,
+                                        workflow_key)
+
+logger = logging.getLogger(__name__)
+
+
+def _workflow(id):
+    w = MagicMock()
+    w.id = id
+    return w
+
+
+def _build(timestamp, id):
+    b = MagicMock()
+    b.timestamp = timestamp
+    b.id = id
+    return b
+
+
+def test_cursor_roundtrip():
+    cursor = encode_cursor((1650000000, "abc"), 20)
+    assert decode_cursor(cursor) == ((1650000000, "abc"), 20)
+
+
+def test_invalid_cursor():
+    with pytest.raises(lm_exceptions.BadRequestException):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.parametrize("count", [-1, MAX_PAGE_DEPTH + 1])
+def test_too_deep_cursor(count):
+    cursor = encode_cursor((1650000000, "abc"), count)
+    with pytest.raises(lm_exceptions.BadRequestException):
+        decode_cursor(cursor, max_count=MAX_PAGE_DEPTH)
+
+
+class _Column:
+    key = 'id'
+    type = MagicMock(python_type=int)
+
+    def __gt__(self, value):
+        return lambda item: item.id > value
+
+
+class _Query:
+    def __init__(self, items):
+        self.items = items
+        self.loaded = None
+
+    def filter(self, condition):
+        return _Query([_ for _ in self.items if condition(_)])
+
+    def order_by(self, column):
+        return _Query(sorted(self.items, key=lambda _: getattr(_, column.key)))
+
+    def limit(self, limit):
+        query = _Query(self.items[:limit])
+        query.loaded = query.items
+        return query
+
+    def all(self):
+        assert self.loaded is not None, "The limit should be applied by the query"
+        return self.items
+
+
+def test_paginate_query():
+    query = _Query([_workflow(i) for i in (5, 3, 1, 4, 2)])
+    column = _Column()
+    page = paginate_query(query, column, 2)
+    served = [_.id for _ in page.items]
+    assert served == [1, 2]
+    while page.next_cursor:
+        page = paginate_query(query, column, 2, cursor=page.next_cursor)
+        served.extend([_.id for _ in page.items])
+    assert served == [1, 2, 3, 4, 5]
+    assert page.count == 5
+    with pytest.raises(lm_exceptions.BadRequestException):
+        paginate_query(query, column, 2, cursor=encode_cursor(("abc",)))
+
+
+def test_paginate_workflows():
+    workflows = [_workflow(i) for i in (5, 3, 1, 4, 2)]
+    page = paginate(workflows, workflow_key, 2)
+    assert [_.id for _ in page.items] == [1, 2]
+    served = [_.id for _ in page.items]
+    while page.next_cursor:
+        page = paginate(workflows, workflow_key, 2, cursor=page.next_cursor)
+        served.extend([_.id for _ in page.items])
+    assert served == [1, 2, 3, 4, 5]
+    assert page.count == 5
+
+
+def test_paginate_builds_from_newest():
+    builds = [_build(100 + i, f"b{i}") for i in range(5)]
+    page = paginate(builds, build_key, 3, reverse=True)
+    assert [_.id for _ in page.items] == ["b4", "b3", "b2"]
+    assert page.count == 3
+    page = paginate(builds, build_key, 3, cursor=page.next_cursor, reverse=True)
+    assert [_.id for _ in page.items] == ["b1", "b0"]
+    assert page.next_cursor is None
@@ -20,14 +20,18 @@
 
 import logging
 import threading
+import time
 from multiprocessing import Manager, Process
 from time import sleep
 from unittest.mock import MagicMock
 
+import flask
 import pytest
 
 import lifemonitor.api.models as models
-from lifemonitor.cache import (IllegalStateException, Timeout, cache,
+import lifemonitor.cache as lm_cache
+from lifemonitor.cache import (CacheEntry, IllegalStateException, LocalCache,
+                               Timeout, cache, cache_function, cached,
                                init_cache, make_cache_key)
 from tests import utils
 from tests.utils import SerializableMock
@@ -80,6 +84,204 @@ def test_cache_timeout(app_context, redis_cache):
     assert cache.has(key) is False, f"Key {key} should not be in cache after {timeout} secs"
 
 
+def test_local_cache_lru_eviction():
+    local_cache = LocalCache(max_size=2, timeout=30)
+    local_cache.set("a", 1)
+    local_cache.set("b", 2)
+    assert local_cache.get("a") == 1, "Unexpected value for key 'a'"
+    local_cache.set("c", 3)
+    assert local_cache.size() == 2, "Unexpected local cache size"
+    assert local_cache.get("b") is None, "Key 'b' should have been evicted"
+    assert local_cache.get("a") == 1 and local_cache.get("c") == 3, "Keys 'a' and 'c' should be in cache"
+    assert local_cache.hits == 3, "Unexpected number of hits"
+    assert local_cache.misses == 1, "Unexpected number of misses"
+    local_cache.delete_keys("*")
+    assert local_cache.size() == 0, "Local cache should be empty"
+
+
+def test_local_cache_timeout():
+    local_cache = LocalCache(max_size=10, timeout=30)
+    local_cache.set("a", 1, timeout=1)
+    assert local_cache.get("a") == 1, "Key 'a' should be in cache"
+    sleep(1.1)
+    assert local_cache.get("a") is None, "Key 'a' should be expired"
+
+
+def test_cache_two_tiers(app_context, redis_cache):
+    cache.clear()
+    key = "test-two-tiers"
+    cache.set(key, "value", timeout=Timeout.REQUEST)
+    stats = cache.stats()
+    assert cache.get(key) == "value", "Unexpected cached value"
+    assert cache.stats()['l1']['hits'] == stats['l1']['hits'] + 1, "The value should be served by the local cache"
+    # drop the value from both tiers
+    cache.backend.delete(cache._make_key(key))
+    cache._local_cache.delete(cache._make_key(key))
+    assert cache.get(key) is None, "Key should not be in cache"
+    assert cache.stats()['l2']['misses'] == stats['l2']['misses'] + 1, "Unexpected number of L2 misses"
+    cache.set(key, "value", timeout=Timeout.REQUEST)
+    cache.delete(key)
+    assert cache._local_cache.get(cache._make_key(key)) is None, "Key should be evicted from the local cache"
+
+
+def test_local_cache_returns_copies(app_context, redis_cache):
+    cache.clear()
+    key = "test-local-copies"
+    cache.set(key, {"items": [1, 2]}, timeout=Timeout.REQUEST)
+    value = cache.get(key)
+    value["items"].append(3)
+    assert cache.get(key) == {"items": [1, 2]}, "Mutating a cached value should not affect other readers"
+
+
+def test_cache_key_index(app_context, redis_cache):
+    cache.clear()
+    cache.set("user1::func_a#1", 1, timeout=Timeout.REQUEST)
+    cache.set("user1::func_b#1", 2, timeout=Timeout.REQUEST)
+    cache.set("user2::func_a#1", 3, timeout=2)
+    assert cache.size() == 3, "Unexpected cache size"
+    assert len(cache.keys("user1::*")) == 2, "Unexpected number of keys for 'user1'"
+    cache.delete_keys("user1::*")
+    assert cache.size() == 1, "Unexpected cache size"
+    assert cache.has("user2::func_a#1"), "Key of 'user2' should be in cache"
+    sleep(2)
+    assert cache.size() == 0, "Expired keys should be pruned from the index"
+    assert cache.backend.zcard(cache._key_index.lex_key) == 0, "The key index should be empty"
+
+
+def test_cache_delete_keys_in_batches(app_context, redis_cache, monkeypatch):
+    cache.clear()
+    monkeypatch.setattr(cache.__class__, "_delete_batch_size", 3)
+    for i in range(10):
+        cache.set(f"batch::func#{i}", i, timeout=Timeout.REQUEST)
+    cache.set("other::func#1", 1, timeout=Timeout.REQUEST)
+    assert cache.delete_keys("batch::*") == 10, "Unexpected number of deleted keys"
+    assert cache.size() == 1, "Only the key of the other namespace should be in cache"
+    assert cache.delete_keys("batch::*") == 0, "No key should be deleted"
+
+
+def test_cache_concurrent_fill(app_context, redis_cache):
+    cache.clear()
+    calls = []
+
+    def slow_function(value):
+        calls.append(value)
+        sleep(2)
+        return value
+
+    results = {}
+
+    def worker(index):
+        with app_context.app.app_context():
+            start = time.monotonic()
+            results[index] = (cache_function(slow_function, timeout=Timeout.REQUEST, client_scope=False, args=("value",)),
+                              time.monotonic() - start)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1, "The value should be computed only once"
+    for value, elapsed in results.values():
+        assert value == "value", "Unexpected value"
+        # waiters are notified as soon as the value is set
+        assert elapsed < 3, "Waiters should not poll for the value"
+
+
+def test_cache_entry_early_refresh():
+    entry = CacheEntry("value", soft_expiry=time.time() + 60, delta=0.1)
+    assert not entry.is_stale(), "Entry should not be stale"
+    assert not entry.should_refresh(), "Entry far from its expiration should not be refreshed"
+    entry = CacheEntry("value", soft_expiry=time.time() - 1, delta=0.1)
+    assert entry.is_stale(), "Entry should be stale"
+    assert entry.should_refresh(), "Stale entry should be refreshed"
+
+
+__swr_calls__ = []
+
+
+@cached(timeout=1, client_scope=False, stale_while_revalidate=10)
+def swr_function(value):
+    __swr_calls__.append(value)
+    return f"{value}-{len(__swr_calls__)}"
+
+
+def test_cache_stale_while_revalidate(app_context, redis_cache, monkeypatch):
+    cache.clear()
+    __swr_calls__.clear()
+    refreshes = []
+    monkeypatch.setattr(lm_cache, "_schedule_cache_refresh",
+                        lambda cache, function, key, args, kwargs, swr: refreshes.append(key))
+    assert swr_function("v") == "v-1", "Unexpected value"
+    assert swr_function("v") == "v-1", "The cached value should be used"
+    sleep(1.1)
+    # the stale value is served while the refresh is scheduled
+    assert swr_function("v") == "v-1", "The stale value should be served"
+    assert len(__swr_calls__) == 1, "The function should not be called by the reader"
+    assert len(refreshes) == 1, "A refresh should be scheduled"
+    # run the refresh
+    swr_function.refresh(refreshes[0], "v")
+    assert swr_function("v") == "v-2", "The refreshed value should be served"
+
+
+def test_cache_refresh_model_references(app_context, user1):
+    from lifemonitor.tasks.jobs.cache import _load
+    user = user1['user']
+    reference = lm_cache.model_reference(user)
+    assert reference[0] == lm_cache.MODEL_REFERENCE_MARKER, "Model instances should be referenced"
+    assert reference[2] == (user.id,), "The reference should carry the primary key"
+    assert _load(reference) == user, "The referenced instance should be loaded"
+    assert lm_cache.model_reference("v") == "v", "Other values should be sent as they are"
+    with pytest.raises(ValueError):
+        lm_cache.model_reference(models.User("unsaved"))
+
+
+__conditional_calls__ = []
+
+
+@cached(timeout=10, client_scope=False, conditional=True)
+def conditional_function(value):
+    __conditional_calls__.append(value)
+    return {"value": value}
+
+
+def test_cache_conditional_request(app_context, redis_cache):
+    cache.clear()
+    __conditional_calls__.clear()
+    app = app_context.app
+    with app.test_request_context("/"):
+        assert conditional_function("v") == {"value": "v"}, "Unexpected value"
+        etag = flask.g.cache_etag
+        assert etag, "The ETag of the value should be set"
+        response = lm_cache.set_response_etag(app.make_response(({"value": "v"}, 200)))
+        assert response.get_etag() == (etag, False), "The response should have a strong ETag"
+    with app.test_request_context("/", headers={"If-None-Match": f'"{etag}"'}):
+        response = conditional_function("v")
+        assert response.status_code == 304, "The value should not be modified"
+        assert len(__conditional_calls__) == 1, "The function should not be called"
+    with app.test_request_context("/", headers={"If-None-Match": '"other"'}):
+        assert conditional_function("v") == {"value": "v"}, "Unexpected value"
+        assert flask.g.cache_etag == etag, "The ETag should not change"
+
+
+def test_cache_etag_invalidation(app_context, redis_cache):
+    cache.clear()
+    __conditional_calls__.clear()
+    app = app_context.app
+    key = lm_cache.make_cache_key(conditional_function, client_scope=False, args=("v",))
+    for delete in (lambda: cache.delete(key), lambda: cache.delete_keys(f"{key}*")):
+        with app.test_request_context("/"):
+            conditional_function("v")
+            etag = flask.g.cache_etag
+        assert cache.get(lm_cache._etag_key(key)) == etag, "The ETag should be cached"
+        # deleting the value also deletes its ETag
+        delete()
+        assert cache.get(lm_cache._etag_key(key)) is None, "The ETag should be deleted with its value"
+        with app.test_request_context("/", headers={"If-None-Match": f'"{etag}"'}):
+            assert conditional_function("v") == {"value": "v"}, "The value should be computed again"
+    assert len(__conditional_calls__) == 3, "Unexpected number of calls"
+
+
 def test_cache_last_build(app_context, redis_cache, user1):
     valid_workflow = 'sort-and-change-case'
     cache.clear()
@@ -0,0 +1,108 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from lifemonitor.integrations.github import refs
+from lifemonitor.integrations.github.events import GithubEvent
+from lifemonitor.redis import get_connection
+
+logger = logging.getLogger(__name__)
+
+MAIN_SHA = 'a' * 40
+DEV_SHA = 'b' * 40
+TAG_SHA = 'c' * 40
+
+
+def _pkt_line(line: str) -> bytes:
+    return f"{len(line) + 4:04x}{line}".encode()
+
+
+class FakeGitHandler(BaseHTTPRequestHandler):
+
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        data = _pkt_line("# service=git-upload-pack\n") + b"0000" \
+            + _pkt_line(f"{MAIN_SHA} HEAD\0multi_ack symref=HEAD:refs/heads/main\n") \
+            + _pkt_line(f"{MAIN_SHA} refs/heads/main\n") \
+            + _pkt_line(f"{DEV_SHA} refs/heads/develop\n") \
+            + _pkt_line(f"{'d' * 40} refs/pull/1/head\n") \
+            + _pkt_line(f"{'e' * 40} refs/tags/1.0\n") \
+            + _pkt_line(f"{TAG_SHA} refs/tags/1.0^{{}}\n") + b"0000"
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-git-upload-pack-advertisement')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+@pytest.fixture
+def fake_git():
+    FakeGitHandler.requests = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGitHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/crs4/test.git"
+    server.shutdown()
+    server.server_close()
+
+
+def _event(event_type: str, clone_url: str, **data) -> GithubEvent:
+    data['repository'] = {'full_name': 'crs4/test', 'clone_url': clone_url}
+    return GithubEvent({'X-Github-Event': event_type}, data)
+
+
+def test_ls_remote(fake_git):
+    assert refs.ls_remote(fake_git) == {
+        'refs/heads/main': MAIN_SHA,
+        'refs/heads/develop': DEV_SHA,
+        'refs/tags/1.0': TAG_SHA
+    }
+    assert FakeGitHandler.requests == ['/crs4/test.git/info/refs?service=git-upload-pack']
+
+
+def test_resolve_refs(app_context, fake_git):
+    get_connection().delete(refs._refs_key('crs4/test'))
+    run = _event('workflow_run', fake_git, workflow_run={'head_sha': MAIN_SHA, 'head_branch': 'main'})
+    assert refs.resolve_refs(run) == ['main']
+    # the ref map is loaded once and then served from the cache
+    assert refs.resolve_refs(run) == ['main']
+    assert len(FakeGitHandler.requests) == 1, "Unexpected number of ls-remote queries"
+
+    # push events update the cached map
+    refs.update_refs(_event('push', fake_git, ref='refs/tags/2.0', after=MAIN_SHA, deleted=False))
+    assert refs.resolve_refs(run) == ['main', '2.0']
+    refs.update_refs(_event('delete', fake_git, ref='2.0', ref_type='tag'))
+    assert refs.resolve_refs(run) == ['main']
+
+    # the creation of refs not notified by a push reloads the map
+    refs.update_refs(_event('create', fake_git, ref='feature', ref_type='branch'))
+    job = _event('workflow_job', fake_git, workflow_job={'head_sha': TAG_SHA, 'head_branch': '1.0'})
+    assert refs.resolve_refs(job) == ['1.0']
+    assert len(FakeGitHandler.requests) == 2, "Unexpected number of ls-remote queries"
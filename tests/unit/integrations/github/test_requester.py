@@ -0,0 +1,122 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from lifemonitor.cache import Cache, cache
+from lifemonitor.integrations.github.config import (DEFAULT_PER_PAGE,
+                                                    DEFAULT_TIMEOUT)
+from lifemonitor.integrations.github.utils import CachedGithubRequester
+
+logger = logging.getLogger(__name__)
+
+
+class FakeGithubHandler(BaseHTTPRequestHandler):
+
+    etag = '"run-list-v1"'
+    body = {"total_count": 1, "workflow_runs": [{"id": 1, "run_attempt": 1, "status": "completed"}]}
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, dict(self.headers)))
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.send_header('ETag', self.etag)
+            self.end_headers()
+            return
+        data = json.dumps(self.body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+@pytest.fixture
+def fake_github():
+    FakeGithubHandler.requests = []
+    FakeGithubHandler.etag = '"run-list-v1"'
+    FakeGithubHandler.body = {"total_count": 1, "workflow_runs": [{"id": 1, "run_attempt": 1, "status": "completed"}]}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGithubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_conditional_requests(app_context, redis_cache, fake_github):
+    cache.clear()
+    requester = CachedGithubRequester("token", None, None, fake_github, DEFAULT_TIMEOUT,
+                                      "PyGithub/Python", DEFAULT_PER_PAGE, True, None, None)
+    url = "/repos/crs4/life_monitor/actions/workflows/1/runs"
+    # first request: full response
+    headers, data = requester.requestJsonAndCheck("GET", url)
+    assert data == FakeGithubHandler.body, "Unexpected response data"
+    assert 'If-None-Match' not in FakeGithubHandler.requests[0][1], "The first request should not be conditional"
+    # second request: 304 served from cache
+    headers, data = requester.requestJsonAndCheck("GET", url)
+    assert data == FakeGithubHandler.body, "The cached response should be reused"
+    assert FakeGithubHandler.requests[1][1].get('If-None-Match') == FakeGithubHandler.etag, \
+        "The second request should be conditional"
+    # changed resource: the new body replaces the cached one
+    FakeGithubHandler.etag = '"run-list-v2"'
+    FakeGithubHandler.body = {"total_count": 0, "workflow_runs": []}
+    headers, data = requester.requestJsonAndCheck("GET", url)
+    assert data == FakeGithubHandler.body, "The updated response should be returned"
+    assert len(FakeGithubHandler.requests) == 3, "Unexpected number of requests"
+
+
+def test_requests_without_cache_backend(monkeypatch, fake_github):
+    # e.g., CLI processes which never initialize the cache back-end
+    monkeypatch.setattr(Cache, '__cache__', None)
+    requester = CachedGithubRequester("token", None, None, fake_github, DEFAULT_TIMEOUT,
+                                      "PyGithub/Python", DEFAULT_PER_PAGE, True, None, None)
+    url = "/repos/crs4/life_monitor/actions/workflows/1/runs"
+    for _ in range(2):
+        headers, data = requester.requestJsonAndCheck("GET", url)
+        assert data == FakeGithubHandler.body, "Unexpected response data"
+    assert all('If-None-Match' not in h for _, h in FakeGithubHandler.requests), \
+        "Requests should not be conditional without a cache"
+
+
+def test_conditional_requests_per_token(app_context, redis_cache, fake_github):
+    cache.clear()
+    url = "/repos/crs4/life_monitor/actions/workflows/1/runs"
+    for token in ("token1", "token2"):
+        requester = CachedGithubRequester(token, None, None, fake_github, DEFAULT_TIMEOUT,
+                                          "PyGithub/Python", DEFAULT_PER_PAGE, True, None, None)
+        requester.requestJsonAndCheck("GET", url)
+    # validators cached for a token are not sent with other tokens
+    assert all('If-None-Match' not in h for _, h in FakeGithubHandler.requests), \
+        "The first request of each token should not be conditional"
+    requester.requestJsonAndCheck("GET", url)
+    assert FakeGithubHandler.requests[2][1].get('If-None-Match') == FakeGithubHandler.etag, \
+        "Requests with the same token should be conditional"
@@ -0,0 +1,91 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import logging
+
+from git import Actor
+
+from lifemonitor.api.models.issues import IssueCheckEngine
+from lifemonitor.cache import Cache
+from lifemonitor.api.models.repositories.local import \
+    LocalGitWorkflowRepository
+
+logger = logging.getLogger(__name__)
+
+REMOTE_URL = "https://github.com/crs4/test-galaxy-wf-repo.git"
+
+
+def test_issue_graph_order():
+    engine = IssueCheckEngine.get_instance()
+    assert engine is IssueCheckEngine.get_instance(), "The issue graph should be compiled once"
+    assert len(engine.order) > 0, "No issue types found"
+    for i, issue_type in enumerate(engine.order):
+        for dependency in issue_type.depends_on:
+            assert engine.order.index(dependency) < i, f"{issue_type} checked before {dependency}"
+
+
+def test_issue_check_results_cache(app_context, redis_cache, simple_local_wf_repo, monkeypatch):
+    engine = IssueCheckEngine.get_instance()
+    calls = []
+    for issue_type in engine.order:
+        monkeypatch.setattr(issue_type, 'check',
+                            lambda self, repo, _check=issue_type.check: calls.append(type(self)) or _check(self, repo))
+
+    git_repo = simple_local_wf_repo._git_repo
+    if git_repo.is_dirty(untracked_files=True):
+        git_repo.git.add(A=True)
+        author = Actor("LifeMonitor", "lm@example.org")
+        git_repo.index.commit("Test commit", author=author, committer=author)
+
+    repo = LocalGitWorkflowRepository(simple_local_wf_repo.local_path, remote_url=REMOTE_URL)
+    assert repo.commit_sha == git_repo.head.commit.hexsha, "Unexpected commit SHA"
+    result = repo.check(fail_fast=False)
+    checks = len(calls)
+    assert checks > 0, "No issue checked"
+
+    # re-checking the same commit only restores the cached outcomes
+    repo = LocalGitWorkflowRepository(simple_local_wf_repo.local_path, remote_url=REMOTE_URL)
+    cached_result = repo.check(fail_fast=False)
+    assert len(calls) == checks, "Issues of an unchanged commit should not be checked again"
+    assert [i.get_identifier() for i in cached_result.checked] == [i.get_identifier() for i in result.checked]
+    assert [i.name for i in cached_result.issues] == [i.name for i in result.issues]
+    for cached, issue in zip(cached_result.issues, result.issues):
+        assert cached.get_messages() == issue.get_messages(), "Unexpected issue messages"
+        assert cached.has_changes() == issue.has_changes(), "Unexpected issue changes"
+
+    # uncommitted changes are always checked
+    with open(f"{repo.local_path}/NEW_FILE.md", "w") as f:
+        f.write("New file")
+    repo.check(fail_fast=False)
+    assert len(calls) == 2 * checks, "Issues of uncommitted changes should be checked"
+
+
+def test_issue_check_without_cache_backend(simple_local_wf_repo, monkeypatch):
+    # e.g., the `lm issues check` CLI, which never initializes the cache back-end
+    monkeypatch.setattr(Cache, '__cache__', None)
+    git_repo = simple_local_wf_repo._git_repo
+    if git_repo.is_dirty(untracked_files=True):
+        git_repo.git.add(A=True)
+        author = Actor("LifeMonitor", "lm@example.org")
+        git_repo.index.commit("Test commit", author=author, committer=author)
+    repo = LocalGitWorkflowRepository(simple_local_wf_repo.local_path, remote_url=REMOTE_URL)
+    assert repo.commit_sha, "The repository should be clean"
+    result = repo.check(fail_fast=False)
+    assert len(result.checked) > 0, "No issue checked"
@@ -0,0 +1,81 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import logging
+
+import lifemonitor.metrics.stats as stats
+from lifemonitor.auth.models import User
+from lifemonitor.db import db
+from lifemonitor.redis import get_connection
+
+logger = logging.getLogger(__name__)
+
+
+def test_count_rows(app_context):
+    counts = stats.count_rows()
+    assert set(counts.keys()) == set(stats.COUNTED_MODELS.keys()), "Unexpected counted entities"
+    for name, model in stats.COUNTED_MODELS.items():
+        assert counts[name] == model.query.count(), f"Unexpected number of {name}"
+
+
+def test_counts_incremental_update(app_context):
+    stats.init_stats()
+    counts = stats.recount()
+    # the new user is counted through the delta of the transaction
+    user = User("stats-test-user")
+    db.session.add(user)
+    db.session.commit()
+    try:
+        assert stats.get_counts()['users'] == counts['users'] + 1, "Unexpected number of users"
+        assert stats.get_counts()['users'] == User.query.count(), "Unexpected number of users"
+    finally:
+        db.session.delete(user)
+        db.session.commit()
+    assert stats.get_counts()['users'] == counts['users'], "Unexpected number of users"
+    # rolled back changes are not counted
+    db.session.add(User("stats-test-user"))
+    db.session.flush()
+    db.session.rollback()
+    assert stats.get_counts()['users'] == counts['users'], "Unexpected number of users"
+
+
+def test_counts_recount(app_context):
+    stats.recount()
+    get_connection().hincrby(stats.STATS_KEY, 'users', 100)
+    assert stats.get_counts(max_age=0)['users'] == User.query.count(), "Counts should be recomputed"
+
+
+def test_recount_with_concurrent_deltas(app_context, monkeypatch):
+    count_rows = stats.count_rows
+    calls = []
+
+    def _count_rows(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            # a delta published while counting discards the counts
+            get_connection().hincrby(stats.STATS_KEY, 'users', 100)
+        return count_rows(*args, **kwargs)
+
+    monkeypatch.setattr(stats, 'count_rows', _count_rows)
+    counts = stats.recount()
+    assert len(calls) == 2, "The entities should be counted again"
+    assert int(get_connection().hget(stats.STATS_KEY, 'users')) == counts['users'] == User.query.count(), \
+        "Unexpected number of users"
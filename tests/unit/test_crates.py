@@ -0,0 +1,186 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import hashlib
+import logging
+import os
+
+import pytest
+
+from lifemonitor.crates import INDEX_FILENAME, LocalCrateStore
+
+logger = logging.getLogger(__name__)
+
+
+def _write(path, content: bytes) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+@pytest.fixture
+def store(tmp_path) -> LocalCrateStore:
+    return LocalCrateStore(str(tmp_path / 'crates'))
+
+
+def test_publish(store: LocalCrateStore, tmp_path):
+    key = 'wf/crate.zip'
+    assert not store.contains(key)
+    assert store.get(key) is None
+
+    # archives are published through a staging file
+    staging_path = store.staging_path(key)
+    assert os.path.dirname(staging_path) == os.path.dirname(store.path(key))
+    _write(staging_path, b'crate')
+    path = store.publish(key, staging_path)
+    assert path == store.path(key)
+    assert not os.path.exists(staging_path)
+    assert store.get(key) == path
+    info = store.info(key)
+    assert info['size'] == 5
+    assert info['digest'] == hashlib.sha256(b'crate').hexdigest()
+
+    # archives from other filesystem locations are copied
+    source = _write(str(tmp_path / 'other.zip'), b'other crate')
+    store.publish(key, source)
+    with open(store.path(key), 'rb') as f:
+        assert f.read() == b'other crate'
+    assert store.info(key)['size'] == 11
+
+    # the index is persistent
+    assert LocalCrateStore(store.base_path).contains(key)
+
+    store.remove(key)
+    assert not store.contains(key)
+    assert not os.path.exists(path)
+
+
+def test_missing_archive(store: LocalCrateStore):
+    key = 'wf/crate.zip'
+    staging_path = _write(store.staging_path(key), b'crate')
+    store.publish(key, staging_path)
+    os.remove(store.path(key))
+    assert store.contains(key)
+    assert store.get(key) is None
+    assert not store.contains(key)
+
+
+def test_sync(tmp_path):
+    base_path = str(tmp_path / 'crates')
+    _write(os.path.join(base_path, 'wf1', 'crate.zip'), b'crate1')
+    _write(os.path.join(base_path, 'wf2', 'crate.zip'), b'crate2')
+    _write(os.path.join(base_path, 'wf2', '.staging.zip'), b'partial')
+    store = LocalCrateStore(base_path)
+    assert os.path.isfile(os.path.join(base_path, INDEX_FILENAME))
+    assert sorted(e['key'] for e in store.entries()) == ['wf1/crate.zip', 'wf2/crate.zip']
+    # digests of the indexed archives are computed lazily
+    assert store.info('wf1/crate.zip')['digest'] is None
+    assert store.digest('wf1/crate.zip') == hashlib.sha256(b'crate1').hexdigest()
+    assert store.info('wf1/crate.zip')['digest'] is not None
+
+
+def _publish(store: LocalCrateStore, key: str, size: int, uploaded: bool = True) -> str:
+    return store.publish(key, _write(store.staging_path(key), b'x' * size), uploaded=uploaded)
+
+
+def test_lru_eviction(store: LocalCrateStore):
+    store.quota = 25
+    for i in range(3):
+        _publish(store, f'wf/crate{i}.zip', 10)
+    # publishing the third archive evicts the least recently used one
+    assert not store.contains('wf/crate0.zip')
+    assert not os.path.exists(store.path('wf/crate0.zip'))
+    assert store.contains('wf/crate1.zip') and store.contains('wf/crate2.zip')
+
+    # accessing an archive refreshes its position
+    assert store.get('wf/crate1.zip')
+    _publish(store, 'wf/crate3.zip', 10)
+    assert not store.contains('wf/crate2.zip')
+    assert store.contains('wf/crate1.zip') and store.contains('wf/crate3.zip')
+
+    # the archive just published is never evicted
+    _publish(store, 'wf/big.zip', 30)
+    assert [e['key'] for e in store.entries()] == ['wf/big.zip']
+
+
+def test_eviction_requires_upload(store: LocalCrateStore):
+    store.quota = 25
+    _publish(store, 'wf/local.zip', 10, uploaded=False)
+    _publish(store, 'wf/crate1.zip', 10)
+    _publish(store, 'wf/crate2.zip', 10)
+    # archives without a remote copy are never evicted
+    assert store.contains('wf/local.zip')
+    assert not store.contains('wf/crate1.zip')
+    assert not store.info('wf/local.zip')['uploaded']
+
+    # archives become evictable once uploaded
+    assert store.mark_uploaded('wf/local.zip')
+    assert store.info('wf/local.zip')['uploaded']
+    _publish(store, 'wf/crate3.zip', 10)
+    assert not store.contains('wf/local.zip')
+    assert store.contains('wf/crate2.zip') and store.contains('wf/crate3.zip')
+    assert not store.mark_uploaded('wf/local.zip')
+
+
+def test_eviction_disabled(tmp_path):
+    store = LocalCrateStore(str(tmp_path / 'crates'), eviction=False)
+    store.quota = 15
+    for i in range(3):
+        _publish(store, f'wf/crate{i}.zip', 10)
+    assert len(store.entries()) == 3
+    assert store.evict() == []
+
+
+class _FakeStorage:
+
+    def __init__(self, objects):
+        self.objects = objects
+
+    def get_file_info(self, remote_path):
+        size = self.objects.get(remote_path, None)
+        return {'size': size, 'etag': 'etag'} if size is not None else None
+
+
+def test_sync_on_start(tmp_path):
+    base_path = str(tmp_path / 'crates')
+    store = LocalCrateStore(base_path)
+    _publish(store, 'wf1/crate.zip', 10, uploaded=False)
+    # archives written outside the store are indexed when a store is created
+    _write(os.path.join(base_path, 'wf2', 'crate.zip'), b'x' * 10)
+    _write(os.path.join(base_path, 'wf3', 'crate.zip'), b'x' * 10)
+    os.remove(store.path('wf1/crate.zip'))
+    storage = _FakeStorage({'wf1/crate.zip': 10, 'wf2/crate.zip': 10, 'wf3/crate.zip': 5})
+    store = LocalCrateStore(base_path, storage=storage)
+    assert sorted(e['key'] for e in store.entries()) == ['wf2/crate.zip', 'wf3/crate.zip']
+    # archives already on the remote storage are marked as uploaded
+    assert store.info('wf2/crate.zip')['uploaded']
+    assert not store.info('wf3/crate.zip')['uploaded'], "Partial remote copies should not count"
+
+    # indexed archives are marked as soon as their remote copy is found
+    _publish(store, 'wf4/crate.zip', 10, uploaded=False)
+    storage.objects['wf4/crate.zip'] = 10
+    store = LocalCrateStore(base_path, storage=storage)
+    assert store.info('wf4/crate.zip')['uploaded']
+
+    # the quota is enforced on start
+    store = LocalCrateStore(base_path, quota=0, storage=storage)
+    assert sorted(e['key'] for e in store.entries()) == ['wf3/crate.zip']
@@ -26,6 +26,7 @@ import tempfile
 from typing import Dict, Union
 
 import pytest
+import requests
 from lifemonitor.storage import RemoteStorage
 
 logger = logging.getLogger(__name__)
@@ -92,3 +93,33 @@ def test_get_file(app_context, storage: RemoteStorage, test_data_folder: str, fi
     # test folder deletion
     storage.delete_folder(test_data_folder)
     assert not storage.exists(test_data_folder), f"Data folder '{test_data_folder}' should not be there"
+
+
+@pytest.mark.skipif(not storage_config(), reason="Storage properly configured on environment")
+def test_presigned_url(app_context, storage: RemoteStorage, test_data_folder: str, filename: str):
+
+    remote_path = f"{test_data_folder}/test_presigned_file"
+    storage.put_file(filename, remote_path)
+    try:
+        # test file info
+        info = storage.get_file_info(remote_path)
+        assert info, "Unable to get info of the uploaded file"
+        assert info['size'] == os.path.getsize(filename), "Unexpected file size"
+        assert info['etag'], "ETag should be set"
+        assert storage.get_file_info(f"{test_data_folder}/missing_file") is None, "File should not exist"
+
+        # test file download through the presigned URL
+        url = storage.get_presigned_url(remote_path, expiration=60, filename="test.zip")
+        assert url, "Unable to get a presigned URL"
+        response = requests.get(url)
+        assert response.status_code == 200, "Unable to download the file through the presigned URL"
+        assert 'filename=test.zip' in response.headers.get('Content-Disposition', ''), "Unexpected content disposition"
+        with open(filename, 'rb') as f:
+            assert response.content == f.read(), "Unexpected file content"
+    finally:
+        storage.delete_folder(test_data_folder)
+
+
+def test_presigned_url_storage_not_enabled(app_context):
+    r = RemoteStorage(config={})
+    assert not r.get_presigned_url("data/test_file"), "URL should not be generated"
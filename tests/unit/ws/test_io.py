@@ -0,0 +1,93 @@
+# Copyright (c) 2020-2024 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import json
+import logging
+import time
+from unittest.mock import MagicMock
+
+from lifemonitor.ws.io import FanOutWorker
+
+logger = logging.getLogger(__name__)
+
+
+def _message(type='sync', data=None, delay=0, timestamp=None, target_ids=None, target_rooms=None):
+    return {
+        "timestamp": timestamp or time.time(),
+        "delay": delay,
+        "target_ids": target_ids,
+        "target_rooms": target_rooms,
+        "payload": {"type": type, "data": data or []}
+    }
+
+
+def _update(uuid, version="1.0", last_update=0):
+    return {"uuid": uuid, "version": version, "lastUpdate": last_update}
+
+
+def _worker(**kwargs):
+    app = MagicMock()
+    return app.socketIO, FanOutWorker(app, **kwargs)
+
+
+def test_delayed_messages_do_not_block_the_others():
+    socket, worker = _worker()
+    now = time.time()
+    worker.receive({"data": json.dumps(_message(type='delete', delay=10, timestamp=now))})
+    worker.receive({"data": json.dumps(_message(type='jobUpdate', timestamp=now))})
+    assert worker.deliver(now) == 1, "Only the message without delay should be delivered"
+    assert socket.emit.call_args[0][1]['payload']['type'] == 'jobUpdate'
+    assert worker.queue_size == 1, "The delayed message should be queued"
+    assert worker.deliver(now + 10) == 1, "The delayed message should be delivered"
+    assert worker.queue_size == 0, "Unexpected queued messages"
+
+
+def test_old_messages_are_dropped():
+    socket, worker = _worker(max_age=5)
+    now = time.time()
+    worker.push(_message(timestamp=now - 60))
+    assert worker.deliver(now) == 0, "Old messages should be dropped"
+    socket.emit.assert_not_called()
+
+
+def test_messages_sent_once_to_all_targets():
+    socket, worker = _worker()
+    now = time.time()
+    worker.push(_message(type='jobUpdate', timestamp=now, target_ids=['sid1'], target_rooms=['room1', 'room2']))
+    assert worker.deliver(now) == 1, "The message should be sent once"
+    assert socket.emit.call_args[1]['to'] == ['room1', 'room2', 'sid1'], "Unexpected targets"
+
+
+def test_sync_messages_coalesced_per_targets():
+    socket, worker = _worker()
+    now = time.time()
+    worker.push(_message(data=[_update("w1", last_update=1)], timestamp=now, target_rooms=['r1']))
+    worker.push(_message(data=[_update("w1", last_update=2), _update("w2")], timestamp=now, target_rooms=['r1']))
+    worker.push(_message(data=[_update("w3")], timestamp=now, target_rooms=['r2']))
+    worker.push(_message(type='delete', data=[_update("w2")], timestamp=now, target_rooms=['r1']))
+    worker.push(_message(data=[_update("w4")], timestamp=now, target_rooms=['r1']))
+    assert worker.deliver(now) == 4, "Unexpected number of delivered messages"
+    sent = [(c[1]['to'], c[0][1]['payload']) for c in socket.emit.call_args_list]
+    assert sent[0] == (['r1'], {"type": "sync", "data": [_update("w1", last_update=2), _update("w2")]})
+    assert sent[1] == (['r2'], {"type": "sync", "data": [_update("w3")]})
+    # the order of the messages of the same targets is preserved
+    assert sent[2] == (['r1'], {"type": "delete", "data": [_update("w2")]})
+    assert sent[3] == (['r1'], {"type": "sync", "data": [_update("w4")]})